@@ -1,6 +1,8 @@
 # backend/app.py
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
@@ -8,25 +10,54 @@ import os
 import json
 import re
 import asyncio
-from pathlib import Path
+import threading
 from datetime import datetime
-import PyPDF2
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import secrets
 import uuid
+import time
+from dataclasses import asdict
+from functools import lru_cache
+from itertools import islice
+from backend.chunking import count_tokens, iter_chunks, iter_pdf_pages, write_pages
+from backend.chunk_store import ChunkStore
+from backend.config import (
+    BATCH_MAX_ITEMS, CHUNK_STORE_DIR, COMPRESSION_MIN_BYTES, COMPACTION_TOMBSTONE_RATIO, COMPACTION_INTERVAL_SECONDS, DATA_DIR,
+    LLM_CONCURRENCY, MAX_UPLOAD_BYTES, MEMORY_BUDGET_MB, MEMORY_CHECK_SECONDS, MODEL_PROFILES, ADMIN_TOKEN, PREFETCH_BURST, PREFETCH_MATCH_THRESHOLD,
+    PREFETCH_RATE_PER_SECOND, PREFETCH_TTL_SECONDS, MODEL_REFRESH_SECONDS, OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, PROGRESS_DIR, PROGRESS_FLUSH_SECONDS,
+    PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE, REDIS_URL, SESSION_BACKEND,
+    RETRIEVAL_BATCH_WINDOW_MS, RETRIEVAL_MAX_BATCH, RETRIEVAL_POOL_SIZE, RETRIEVAL_SERVICE_URL, RETRIEVAL_TIMEOUT_SECONDS, ROUTE_QUEUE_DEPTH, SESSION_CACHE_TTL, SESSIONS_DIR, TIMING_HEADER, VECTOR_STORE_PATH, WARMUP, ensure_directories, print_banner
+)
+from backend.embeddings import get_embeddings, loaded_model_bytes
+from backend.filelock import LockTimeout
+from backend.index_store import CachedIndex, IndexWriter, maybe_compact, similarity_search_batch
+from backend import metrics
+from backend.metrics import span
+from backend.lifecycle import Lifecycle
+from backend.llm_models import ModelManager
+from backend.chat_context import MENTOR_SYSTEM, SessionContexts, history_prompt, stream_generate, usable_context
+from backend.singleflight import SingleFlight, normalize_text, scope_key
+from backend.session_store import CachedSessionStore, import_json_sessions, open_session_store
+from backend.progress_store import PROGRESS_DB, ProgressStore, ProgressWriter
+from backend.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler
+from backend.batch import pipelined
+from backend.model_router import ModelRouter, Route, load_profiles
+from backend.responses import CompressionMiddleware, FastJSONResponse
+from backend.uploads import UploadLimitMiddleware, UploadTooLarge, receive_upload
+from backend.retrieval import RetrievalBatcher
+from backend.retrieval_client import RemoteIndex, RetrievalClient
+from backend.profiling import ActiveProfile, Profiler, collapsed
+from backend.memory_budget import MemoryGovernor
+from backend.prefetch import MIN_WORDS, PREFETCH_REQUESTS, PrefetchCache, RateLimiter, words
+
+# Heavy libraries (LangChain, Ollama client, FAISS, sentence-transformers, PyPDF2)
+# are imported where they are used, so importing this module stays fast.
+# The startup warm-up below loads them before the worker reports ready.
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="AI Mentor API")
+app = FastAPI(title="AI Mentor API", default_response_class=FastJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -35,118 +66,170 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
 
-# Paths
-DATA_DIR = Path("backend/data")
-CHUNK_DIR = DATA_DIR / "chunks"
-VECTOR_STORE_PATH = DATA_DIR / "faiss_index"
-SESSIONS_DIR = Path("backend/sessions")
-PROGRESS_DIR = Path("backend/progress")
+# Oversized uploads are refused before Starlette spools them to disk
+app.add_middleware(UploadLimitMiddleware, paths=["/upload-pdf"], max_bytes=MAX_UPLOAD_BYTES)
+
+# gzip/brotli for larger responses (inside time_requests, so compression shows up in Server-Timing)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+def endpoint_label(request: Request) -> str:
+    """Route template (e.g. /session/{session_id}) so metric labels stay bounded."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+# Sampling CPU profiles of single requests, on X-Profile: <ADMIN_TOKEN> or at PROFILE_SAMPLE_RATE (see profiling.py)
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, ADMIN_TOKEN)
+
+def save_profile(profile: ActiveProfile, timing, request: Request, status: int):
+    """Stop a request's profile and write it from a worker thread."""
+    record = profiler.finish(profile, timing, request.method, request.url.path, status)
+    asyncio.get_running_loop().run_in_executor(None, profiler.save, record)
+
+async def profiled_body(body, profile: ActiveProfile, timing, request: Request, status: int):
+    """Pass the response body through, ending the profile once it has been sent."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        save_profile(profile, timing, request, status)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record request latency and, if asked for, return per-stage timings as Server-Timing."""
+    endpoint = endpoint_label(request)
+    timing = metrics.start_request(endpoint)
+    trigger = profiler.trigger(request.headers)
+    profile = profiler.start(trigger) if trigger else None
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    except BaseException:
+        if profile is not None:
+            save_profile(profile, timing, request, status)
+        raise
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - timing.start, endpoint=endpoint, method=request.method, status=str(status)
+        )
+    if TIMING_HEADER or request.headers.get("x-timing") == "1":
+        response.headers["Server-Timing"] = timing.server_timing()
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profile.id
+        response.body_iterator = profiled_body(response.body_iterator, profile, timing, request, status)
+    return response
 
-# Create directories
-SESSIONS_DIR.mkdir(exist_ok=True)
-PROGRESS_DIR.mkdir(exist_ok=True)
-DATA_DIR.mkdir(exist_ok=True)
-CHUNK_DIR.mkdir(exist_ok=True)
+# Packed per-document chunk files (replaces data/chunks/*.txt)
+chunk_store = ChunkStore(CHUNK_STORE_DIR)
+
+# Memory-mapped index, re-mapped only when an upload publishes a new version
+vector_index = CachedIndex(VECTOR_STORE_PATH, get_embeddings)
+
+# With RETRIEVAL_SERVICE_URL, embedding and search run in the retrieval service instead (see retrieval_service.py)
+remote_index = (
+    RemoteIndex(RetrievalClient(RETRIEVAL_SERVICE_URL, RETRIEVAL_POOL_SIZE, RETRIEVAL_TIMEOUT_SECONDS))
+    if RETRIEVAL_SERVICE_URL else None
+)
 
-# Store sessions in memory (in production, use Redis or database)
-sessions = {}
+# Chunks are embedded and added to the index in batches of this size
+EMBED_BATCH_SIZE = 256
 
-def get_llm():
-    """Get LLM instance (lazy initialization)."""
+# Uploads wait this long for the index lock (an offline ingest holds it for minutes), then get a 503
+INDEX_LOCK_TIMEOUT_SECONDS = 10
+
+# Warm-up / readiness of this worker (see /ready)
+lifecycle = Lifecycle()
+
+# Chosen Ollama model, preloaded and pinned in memory
+model_manager = ModelManager(OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, MODEL_REFRESH_SECONDS)
+
+# Ollama conversation context per chat session, so follow-up turns reuse the KV cache
+session_contexts = SessionContexts()
+
+# Identical concurrent /query and /generate-quiz requests share one retrieval + generation
+inflight = SingleFlight()
+
+# Bounded LLM concurrency; chat turns are started before batch work
+llm_scheduler = LLMScheduler(LLM_CONCURRENCY)
+
+# Model and generation settings per endpoint, adjusted to the load (see model_router.py)
+model_router = ModelRouter(model_manager, llm_scheduler, load_profiles(MODEL_PROFILES), ROUTE_QUEUE_DEPTH)
+# Models a profile routes to stay loaded when the default model is swapped
+model_manager.pin(model_router.profile_models())
+
+# Query encoding + FAISS search on a dedicated thread, concurrent queries batched together
+retriever = RetrievalBatcher(RETRIEVAL_BATCH_WINDOW_MS / 1000, RETRIEVAL_MAX_BATCH)
+
+# Context retrieved while the student types, per session (see prefetch.py)
+prefetch_cache = PrefetchCache(PREFETCH_TTL_SECONDS, PREFETCH_MATCH_THRESHOLD)
+prefetch_limiter = RateLimiter(PREFETCH_RATE_PER_SECOND, PREFETCH_BURST)
+
+# Byte accounting of the above against MEMORY_BUDGET_MB (see memory_budget.py)
+memory_governor = MemoryGovernor(MEMORY_BUDGET_MB * 1024 * 1024)
+
+def get_llm(route: Route):
+    """Get LLM instance for a routed request (model and settings from its endpoint profile, see model_router.py)."""
     # Use local Ollama LLM (no API needed!)
     # For slower systems, use smaller models like: llama3.2:1b, phi3:mini, or tinyllama
-    # Faster models: llama3.2:1b (1.3GB), phi3:mini (2.3GB), tinyllama (637MB)
-    # Slower but better: llama2 (3.8GB), llama3.2:3b (2GB), mistral (4.1GB)
-    
-    # Try smaller models first for speed, fallback to llama2 if not available
-    model_priority = [
-        "llama3.2:1b",      # Fastest, smallest (1.3GB) - Best for slow systems
-        "phi3:mini",        # Fast, small (2.3GB)
-        "tinyllama",        # Very fast, tiny (637MB) - Fastest option
-        "llama3.2:3b",      # Medium speed (2GB)
-        "llama2",           # Slower but good quality (3.8GB) - Fallback
-    ]
-    
     try:
-        import requests
-        # First check if Ollama is accessible
-        try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            if response.status_code != 200:
-                raise Exception(f"Ollama API returned status {response.status_code}")
-            
-            # Get available models
-            available_models = []
-            available_models_full = []
-            if response.status_code == 200:
-                models_data = response.json()
-                for model in models_data.get("models", []):
-                    model_name = model.get("name", "")
-                    available_models_full.append(model_name)
-                    # Also add base name (without tag)
-                    base_name = model_name.split(":")[0]
-                    if base_name not in available_models:
-                        available_models.append(base_name)
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Could not connect to Ollama at http://localhost:11434. Make sure Ollama is running. Error: {e}")
-        
-        # Try to find the best available model
-        model_to_use = None
-        for model in model_priority:
-            # Check if exact model name matches
-            if model in available_models_full:
-                model_to_use = model
-                break
-            # Check if base name matches (e.g., "llama3.2" matches "llama3.2:1b")
-            model_base = model.split(":")[0]
-            if model_base in available_models:
-                # Try to find the exact variant
-                for full_model in available_models_full:
-                    if full_model.startswith(model_base + ":"):
-                        model_to_use = full_model
-                        break
-                if model_to_use:
-                    break
-                # If no variant found, use the base name
-                model_to_use = model_base
-                break
-        
-        # Fallback to llama2 if nothing found
-        if not model_to_use:
-            model_to_use = "llama2"
-            print(f"Warning: Using default model {model_to_use}. For faster responses, install a smaller model:")
-            print(f"  ollama pull llama3.2:1b  # Fastest (1.3GB)")
-            print(f"  ollama pull phi3:mini    # Fast (2.3GB)")
-            print(f"  ollama pull tinyllama    # Very fast (637MB)")
-        else:
-            print(f"Using model: {model_to_use} for faster responses")
-        
+        from langchain_ollama import ChatOllama
         return ChatOllama(
-            model=model_to_use,
-            temperature=0.7,
-            base_url="http://localhost:11434",
+            model=route.model,
+            temperature=route.options["temperature"],
+            base_url=OLLAMA_BASE_URL,
+            keep_alive=OLLAMA_KEEP_ALIVE,  # keep the model resident between requests
             timeout=60.0,  # Increased timeout for slower systems
-            num_ctx=2048,  # Reduced context window for faster processing
-            num_predict=256,  # Limit response length for faster generation
+            num_ctx=route.options["num_ctx"],  # Small context window for faster processing
+            num_predict=route.options["num_predict"],  # Limit response length for faster generation
         )
     except Exception as e:
         raise Exception(f"Could not connect to Ollama. Make sure Ollama is installed and running. Error: {e}")
 
 # Pydantic models
+class DocumentScope(BaseModel):
+    """Restrict retrieval to these documents and/or collections (see /documents)."""
+    documents: List[str] = []
+    collections: List[str] = []
+
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
+
+class PrefetchRequest(BaseModel):
+    query: str
+    session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
 
 class QuizRequest(BaseModel):
     topic: str
     num_questions: int = 5
     session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
+
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
+
+class QuizBatchRequest(BaseModel):
+    topics: List[str]
+    num_questions: int = 5
+    session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
 
 class SummaryRequest(BaseModel):
     topic: str
     session_id: Optional[str] = None
+    scope: Optional[DocumentScope] = None
 
 class ProgressUpdate(BaseModel):
     session_id: str
@@ -154,81 +237,327 @@ class ProgressUpdate(BaseModel):
     score: Optional[float] = None
     activity: str
 
+class QuizQuestion(BaseModel):
+    question: str
+    options: List[str]
+    correct_answer: str
+    explanation: str = ""
+
+class QuizResponse(BaseModel):
+    quiz: List[QuizQuestion]
+    session_id: str
+    topic: str
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+    timestamp: Optional[str] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
+    created_at: str
+    progress: List[dict]
+    total_activities: int
+    chat_messages: List[ChatMessage]
+
+class SessionSummary(BaseModel):
+    session_id: str
+    created_at: str
+    message_count: int
+    activity_count: int
+
+class SessionsResponse(BaseModel):
+    sessions: List[SessionSummary]
+    total: int
+
 # Helper functions
+@lru_cache(maxsize=1)
+def get_session_store():
+    """Sessions shared by all workers (see session_store.py), opened on first use."""
+    return open_session_store(SESSION_BACKEND, SESSIONS_DIR, REDIS_URL, SESSION_CACHE_TTL)
+
+@lru_cache(maxsize=1)
+def get_progress_store():
+    """Progress rollups shared by all workers (see progress_store.py), opened on first use."""
+    return ProgressStore(PROGRESS_DIR / PROGRESS_DB)
+
+@lru_cache(maxsize=1)
+def get_progress_writer():
+    """Batches progress entries into the rollups from a background task."""
+    return ProgressWriter(get_progress_store(), PROGRESS_FLUSH_SECONDS)
+
+def track_progress(session_id: str, entry: dict):
+    get_progress_writer().submit(session_id, entry)
+
+def check_batch_size(items: List[str]):
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch has {len(items)} items; the limit is {BATCH_MAX_ITEMS}")
+
+def batch_response(items: List[str], retrieve_chunk, process, session_id: str) -> StreamingResponse:
+    """Stream one NDJSON line per item as it finishes ({"index": i, ...} or {"index": i, "error": ...}),
+    then a final {"done": true, ...} line."""
+    async def lines():
+        failed = 0
+        async for index, result, error in pipelined(items, retrieve_chunk, process):
+            if error is not None:
+                failed += 1
+                line = {"index": index, "error": str(getattr(error, "detail", error))}
+            else:
+                line = {"index": index, **result}
+            yield json.dumps(line) + "\n"
+        yield json.dumps({"done": True, "session_id": session_id, "total": len(items), "failed": failed}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 def get_or_create_session(session_id: Optional[str] = None):
-    """Get existing session or create new one."""
+    """Get existing session or create new one (blocking - call it via asyncio.to_thread)."""
+    store = get_session_store()
     if not session_id:
         session_id = str(uuid.uuid4())
+        return session_id, store.create(session_id)
     
-    if session_id not in sessions:
-        sessions[session_id] = {
-            "memory": ChatMessageHistory(),  # Simple chat history
-            "created_at": datetime.now().isoformat(),
-            "progress": []
-        }
-    
-    return session_id, sessions[session_id]
+    return session_id, store.get(session_id) or store.create(session_id)
+
+def chat_message(role: str, content: str) -> dict:
+    return {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
 
 def load_vector_store():
-    """Load FAISS vector store."""
-    if not VECTOR_STORE_PATH.exists():
-        return None
-    
-    # Use local embeddings (no API needed!)
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    vectorstore = FAISS.load_local(
-        str(VECTOR_STORE_PATH), 
-        embeddings, 
-        allow_dangerous_deserialization=True
-    )
-    return vectorstore
+    """Load FAISS vector store (memory-mapped, shared with other workers), or the retrieval service's."""
+    with span("load_index"):
+        if remote_index is not None:
+            return remote_index.get()
+        return vector_index.get()
 
-def save_session_to_disk(session_id: str, session_data: dict):
-    """Save session data to disk for persistence."""
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    
-    # Extract chat history from memory
-    chat_history = []
-    if "memory" in session_data and session_data["memory"]:
-        for message in session_data["memory"].messages:
-            role = "user" if "Human" in message.__class__.__name__ else "assistant"
-            chat_history.append({
-                "role": role,
-                "content": message.content,
-                "timestamp": getattr(message, "timestamp", datetime.now().isoformat())
-            })
-    
-    data = {
-        "created_at": session_data["created_at"],
-        "progress": session_data["progress"],
-        "chat_history": chat_history
-    }
-    
-    with open(session_file, "w") as f:
-        json.dump(data, f, indent=2)
-
-def load_session_from_disk(session_id: str):
-    """Load session data from disk."""
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    if session_file.exists():
-        with open(session_file, "r") as f:
-            data = json.load(f)
-            # Restore chat history to memory
-            if "chat_history" in data and data["chat_history"]:
-                memory = ChatMessageHistory()
-                from langchain_core.messages import HumanMessage, AIMessage
-                for msg in data["chat_history"]:
-                    if msg["role"] == "human":
-                        memory.add_user_message(msg["content"])
-                    elif msg["role"] == "ai":
-                        memory.add_ai_message(msg["content"])
-                data["memory"] = memory
-            return data
-    return None
+def index_version():
+    """Changes whenever the searched index does (part of cache keys)."""
+    return remote_index.version() if remote_index is not None else vector_index.version()
+
+def index_embeddings():
+    """Embedding model for uploads - the service's when there is one, so this worker never loads it."""
+    return remote_index.embedding_function if remote_index is not None else get_embeddings()
+
+async def retrieve(vectorstore, query: str, k: int, scope: Optional[DocumentScope] = None,
+                   background: bool = False):
+    """Top-k chunks for a query, searching only the requested scope (if any).
+
+    Runs off the event loop, batched with other queries arriving at the same time (see retrieval.py).
+    Background retrievals (prefetches) only use spare capacity.
+    """
+    start = time.perf_counter()
+    with span("retrieval"):
+        docs = await retriever.search(vectorstore, query, k,
+                                      documents=scope.documents if scope else None,
+                                      collections=scope.collections if scope else None,
+                                      background=background)
+    metrics.RETRIEVAL_LATENCY.observe(time.perf_counter() - start, endpoint=metrics.current_endpoint())
+    return docs
+
+def retrieve_batch(vectorstore, queries: List[str], k: int, scope: Optional[DocumentScope] = None):
+    """retrieve() for many queries at once (one embedding call, one FAISS search)."""
+    start = time.perf_counter()
+    with span("retrieval"):
+        if isinstance(vectorstore, RemoteIndex):
+            results = vectorstore.search_batch(queries, k, scope.documents if scope else None,
+                                               scope.collections if scope else None)
+        elif scope is None:
+            results = similarity_search_batch(vectorstore, queries, k=k)
+        else:
+            results = similarity_search_batch(vectorstore, queries, k=k,
+                                              documents=scope.documents, collections=scope.collections)
+    metrics.RETRIEVAL_LATENCY.observe(time.perf_counter() - start, endpoint=metrics.current_endpoint())
+    return results
+
+class GenerationAborted(Exception):
+    """The caller stopped waiting for a generation (see LLMScheduler.run)."""
+
+def generate(llm_instance, prompt: str, cancelled: Optional[threading.Event] = None) -> str:
+    """Run the LLM on a prompt, streaming so time-to-first-token and tokens/sec can be recorded.
+
+    Stops (closing the stream) at the next token once `cancelled` is set.
+    """
+    with span("generate"):
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        info = {}
+        for chunk in llm_instance.stream(prompt):
+            if cancelled is not None and cancelled.is_set():
+                raise GenerationAborted()
+            if first_token is None and chunk.content:
+                first_token = time.perf_counter() - start
+            parts.append(chunk.content)
+            # Ollama reports exact token counts and decode time on the last chunk
+            info.update(getattr(chunk, "response_metadata", None) or {})
+        elapsed = time.perf_counter() - start
+    text = "".join(parts)
+    record_llm_call(llm_instance.model, prompt, text, info, elapsed, first_token)
+    return text
+
+def generate_chat(route: Route, prompt: str, context: Optional[List[int]], history: Optional[List[dict]] = None,
+                  cancelled: Optional[threading.Event] = None):
+    """Generate a chat turn continuing an Ollama context, so earlier turns aren't re-evaluated.
+
+    Without a usable context the prompt starts with the recent exchanges of
+    `history` (the session's stored chat), so the conversation isn't lost.
+    Returns (answer, new context) - the caller stores the context for its session.
+    Stops at the next token once `cancelled` is set, like generate().
+    """
+    model = route.model
+    reserve = count_tokens(prompt) + route.options["num_predict"]
+    context = usable_context(context, reserve, route.options["num_ctx"])
+    if not context and history:
+        # Half the free window, as count_tokens is only an estimate
+        earlier = history_prompt(history, (route.options["num_ctx"] - reserve) // 2, count_tokens)
+        if earlier:
+            prompt = f"{earlier}\n\n{prompt}"
+    with span("generate"):
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        info = {}
+        for message in stream_generate(OLLAMA_BASE_URL, model, prompt, MENTOR_SYSTEM, context, OLLAMA_KEEP_ALIVE,
+                                       options=route.options):
+            if cancelled is not None and cancelled.is_set():
+                raise GenerationAborted()
+            if first_token is None and message.get("response"):
+                first_token = time.perf_counter() - start
+            parts.append(message.get("response", ""))
+            if message.get("done"):
+                info = message
+        elapsed = time.perf_counter() - start
+    text = "".join(parts)
+    new_context = info.get("context")
+    reused = None
+    if new_context and info.get("prompt_eval_count") is not None:
+        # The returned context is the whole conversation: everything before this answer was prompt
+        prompt_total = len(new_context) - (info.get("eval_count") or 0)
+        reused = max(0, prompt_total - info["prompt_eval_count"])
+    record_llm_call(model, prompt, text, info, elapsed, first_token, reused)
+    return text, new_context
+
+def record_llm_call(model: str, prompt: str, text: str, info: dict, elapsed: float,
+                    first_token: Optional[float], reused_tokens: Optional[int] = None):
+    """Token counts, time-to-first-token and tokens/sec of one LLM call (exact when Ollama reports them)."""
+    evaluated_tokens = info.get("prompt_eval_count")
+    prompt_tokens = (evaluated_tokens or count_tokens(prompt)) + (reused_tokens or 0)
+    completion_tokens = info.get("eval_count") or count_tokens(text)
+    if info.get("eval_duration"):
+        tokens_per_second = completion_tokens / (info["eval_duration"] / 1e9)
+    else:
+        tokens_per_second = completion_tokens / (elapsed - (first_token or 0)) if elapsed > (first_token or 0) else None
+    metrics.record_generation(prompt_tokens, completion_tokens, first_token, tokens_per_second,
+                              evaluated_tokens, reused_tokens)
+    if info.get("load_duration") is not None:
+        model_manager.record_response(model, info["load_duration"] / 1e9)
+
+def delete_document(document: str) -> int:
+    """Remove a document's vectors (tombstoned), chunks and extracted files.
+
+    Returns the number of index rows removed from search. Raises LockTimeout
+    like index_upload() while another process holds the index.
+    """
+    with IndexWriter(VECTOR_STORE_PATH, lock_timeout=INDEX_LOCK_TIMEOUT_SECONDS) as index_writer:
+        removed = index_writer.delete_source(document)
+    chunk_store.delete(document)
+    for suffix in (".pdf", ".txt"):
+        path = DATA_DIR / f"{document}{suffix}"
+        if path.exists():
+            path.unlink()
+    return removed
+
+async def compact_index_periodically():
+    """Drop tombstoned rows from the index once enough have piled up."""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+        try:
+            removed = await asyncio.to_thread(maybe_compact, VECTOR_STORE_PATH, COMPACTION_TOMBSTONE_RATIO)
+            if removed:
+                print(f"Compacted index: dropped {removed} deleted rows")
+        except Exception as e:
+            print(f"WARNING: Index compaction failed: {e}")
+
+def warm_embeddings():
+    get_embeddings().embed_query("warm up")
+
+def warm_index():
+    # Maps the index and docstore; nothing to do before the first upload
+    vector_index.get()
+
+def warm_libraries():
+    # Import cost of the per-request code paths
+    from langchain_core.documents import Document
+    from langchain_ollama import ChatOllama
+    import PyPDF2
+
+def warm_llm():
+    # Load the model into Ollama now rather than on the first student's question
+    model_manager.warm_up()
+    # and any other model an endpoint profile names (see model_router.py)
+    for model in model_router.profile_models():
+        if model != model_manager.active:
+            model_manager.load(model, "profile")
+
+def register_memory_components():
+    # Pinned: needed to serve at all
+    memory_governor.register("embedding_model", loaded_model_bytes)
+    memory_governor.register("vector_index", vector_index.nbytes)
+    memory_governor.register("chunk_store", chunk_store.nbytes)
+    # Evicted cheapest-to-rebuild first: prefetches are only a head start, scope rows are one
+    # SQLite query, cached sessions are re-read from the store, a dropped chat context means rebuilding the prompt from stored history
+    memory_governor.register("prefetch_cache", prefetch_cache.nbytes, prefetch_cache.evict, priority=0)
+    memory_governor.register("scope_rows", vector_index.scope_cache_nbytes, vector_index.evict_scope_cache, priority=0)
+    try:
+        store = get_session_store()
+    except Exception as e:
+        print(f"WARNING: Session cache not tracked in the memory budget: {e}")
+        store = None
+    if isinstance(store, CachedSessionStore):
+        memory_governor.register("session_cache", store.nbytes, store.evict, priority=1)
+    memory_governor.register("chat_contexts", session_contexts.nbytes, session_contexts.evict, priority=2)
+
+@app.on_event("startup")
+async def startup():
+    ensure_directories()
+    print_banner()
+    register_memory_components()
+    try:
+        imported = await asyncio.to_thread(
+            import_json_sessions, get_session_store(), SESSIONS_DIR, get_progress_store().record_many
+        )
+        if imported:
+            print(f"Imported {imported} sessions from JSON files into the session store")
+    except Exception as e:
+        print(f"WARNING: Could not import JSON sessions: {e}")
+    asyncio.create_task(compact_index_periodically())
+    asyncio.create_task(get_progress_writer().run())
+    asyncio.create_task(memory_governor.run(MEMORY_CHECK_SECONDS))
+    if remote_index is not None:
+        asyncio.create_task(remote_index.refresh_periodically())
+    if MODEL_REFRESH_SECONDS > 0:
+        asyncio.create_task(model_manager.refresh_periodically())
+    if WARMUP:
+        # Serve /health and /ready (503) while warming up
+        if remote_index is not None:
+            # The model and index live in the retrieval service; check it is reachable
+            retrieval_steps = [("retrieval_service", remote_index.refresh, False)]
+        else:
+            retrieval_steps = [("embeddings", warm_embeddings, True), ("index", warm_index, True)]
+        asyncio.create_task(lifecycle.warm_up([
+            ("libraries", warm_libraries, True),
+            *retrieval_steps,
+            ("llm", warm_llm, False),  # Ollama may come up later
+        ]))
+    else:
+        lifecycle.mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Write out queued progress entries
+    await get_progress_writer().flush()
+    retriever.shutdown()
+    if remote_index is not None:
+        remote_index.client.close()
 
 # API Endpoints
 @app.get("/")
@@ -238,9 +567,21 @@ async def root():
         "endpoints": {
             "upload": "/upload-pdf",
             "query": "/query",
+            "query_batch": "/query/batch",
+            "query_prefetch": "/query/prefetch",
             "quiz": "/generate-quiz",
+            "quiz_batch": "/generate-quiz/batch",
             "summary": "/generate-summary",
+            "documents": "/documents",
+            "delete_document": "/documents/{document}",
+            "ready": "/ready",
+            "metrics": "/metrics",
+            "routing": "/routing",
+            "profiles": "/admin/profiles",
+            "profile": "/admin/profiles/{profile_id}",
+            "memory": "/admin/memory",
             "progress": "/progress",
+            "progress_summary": "/progress/{session_id}/summary",
             "session": "/session/{session_id}"
         }
     }
@@ -250,7 +591,7 @@ async def health_check():
     """Check if Ollama is accessible."""
     try:
         import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
+        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=2)
         ollama_status = "connected" if response.status_code == 200 else "error"
         return {
             "status": "ok",
@@ -264,168 +605,349 @@ async def health_check():
             "message": f"Backend is running but Ollama is not accessible: {str(e)}"
     }
 
+@app.get("/ready")
+async def readiness():
+    """200 once startup warm-up has finished, 503 (with progress) until then."""
+    return JSONResponse(lifecycle.status(), status_code=200 if lifecycle.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus-style metrics of this worker (latency per endpoint and stage, LLM and ingestion stats)."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/routing")
+async def routing():
+    """Endpoint model profiles, the current load and recent routing decisions."""
+    return {
+        "profiles": {endpoint: asdict(profile) for endpoint, profile in model_router.profiles.items()},
+        "active_model": model_manager.active,
+        "resident_models": model_manager.resident_models(),
+        "queue_depth": llm_scheduler.queue_depth(),
+        "free_slots": llm_scheduler.free_slots(),
+        "recent": model_router.recent(),
+    }
+
+def require_admin(request: Request):
+    """The /admin endpoints need X-Admin-Token, and are off while ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not secrets.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required (X-Admin-Token)")
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """Stored request profiles, newest first (stage breakdown without the stacks)."""
+    require_admin(request)
+    return {"profiles": await asyncio.to_thread(profiler.list)}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "json"):
+    """One profile as JSON, or with ?format=collapsed as stacks for flamegraph.pl / speedscope."""
+    require_admin(request)
+    path = profiler.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    if format == "collapsed":
+        record = json.loads(await asyncio.to_thread(path.read_text))
+        return PlainTextResponse(collapsed(record))
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'collapsed'")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/admin/memory")
+async def memory_breakdown(request: Request):
+    """Tracked bytes per component (model, index, caches) against MEMORY_BUDGET_MB, and the process RSS."""
+    require_admin(request)
+    return await asyncio.to_thread(memory_governor.breakdown)
+
+@app.get("/documents")
+async def list_documents():
+    """List indexed documents and collections - the scopes a request can search."""
+    vectorstore = load_vector_store()
+    documents = await asyncio.to_thread(vectorstore.docstore.partitions) if vectorstore else []
+    collections = {}
+    for doc in documents:
+        if doc["collection"]:
+            collections.setdefault(doc["collection"], []).append(doc["document"])
+    return {
+        "documents": documents,
+        "collections": [{"collection": name, "documents": docs} for name, docs in sorted(collections.items())],
+        "total": len(documents)
+    }
+
+def duplicate_upload_response(filename: str, document: str, content_hash: str):
+    return {
+        "message": "PDF already indexed - nothing to do",
+        "filename": filename,
+        "document": document,
+        "content_hash": content_hash,
+        "duplicate": True,
+        "chunks_created": 0
+    }
+
+def index_upload(upload, filename: str, collection: Optional[str]) -> dict:
+    """Extract, chunk, embed and index a received upload (blocking - runs in a worker thread).
+
+    Returns the upload response. Raises LockTimeout if another writer (e.g.
+    backend/ingest.py) holds the index for longer than INDEX_LOCK_TIMEOUT_SECONDS.
+    """
+    from langchain_core.documents import Document
+
+    content_hash = upload.content_hash
+    pdf_path = DATA_DIR / filename
+    base_name = pdf_path.stem
+    txt_path = pdf_path.with_suffix(".txt")
+    txt_tmp = txt_path.with_suffix(".txt.tmp")
+    text_length = 0
+    chunks_created = 0
+    page_count = 0
+    
+    def counted_pages():
+        nonlocal text_length, page_count
+        for page_num, page_text in iter_pdf_pages(upload.path):
+            text_length += len(page_text)
+            page_count += 1
+            yield page_num, page_text
+    
+    # Stream pages -> .txt + structure-aware chunks -> chunk store -> index,
+    # so memory stays flat even for very large books
+    ingest_start = time.perf_counter()
+    # Parsed from the temporary upload, with the text and chunks written next to the
+    # old ones: the previous PDF, .txt and chunk files stay in place until the new
+    # version is committed to the index, so a failed upload changes nothing
+    chunk_writer = None
+    try:
+        with span("ingest"), IndexWriter(VECTOR_STORE_PATH, index_embeddings(),
+                                         lock_timeout=INDEX_LOCK_TIMEOUT_SECONDS) as index_writer:
+            # Re-check under the writer lock - another worker may have just indexed it
+            existing = index_writer.source_for_hash(content_hash)
+            if existing:
+                return duplicate_upload_response(filename, existing, content_hash)
+            
+            first_row = index_writer.ntotal
+            chunk_writer = chunk_store.writer(base_name)
+            with open(txt_tmp, "w", encoding="utf-8") as txt_file:
+                pages = write_pages(counted_pages(), txt_file)
+                extra = {"collection": collection} if collection else None
+                chunks = chunk_writer.extend(iter_chunks(pages, source=base_name, extra_metadata=extra))
+                while True:
+                    batch = list(islice(chunks, EMBED_BATCH_SIZE))
+                    if not batch:
+                        break
+                    index_writer.add_documents([Document(page_content=c.text, metadata=c.metadata) for c in batch])
+                    chunks_created += len(batch)
+                if not chunks_created:
+                    raise ValueError("No text could be extracted from the PDF")
+            
+            # A changed re-upload replaces the previous version's vectors
+            replaced = index_writer.replace_source(base_name, first_row, content_hash=content_hash, collection=collection)
+    except BaseException:
+        if chunk_writer is not None:
+            chunk_writer.abort()
+        txt_tmp.unlink(missing_ok=True)
+        raise
+    
+    # The index has committed: swap the new chunks, text and PDF in
+    chunk_writer.close()
+    os.replace(txt_tmp, txt_path)
+    upload.commit(pdf_path)
+    
+    metrics.INGEST_PAGES.inc(page_count)
+    metrics.INGEST_CHUNKS.inc(chunks_created)
+    metrics.INGEST_RATE.observe(page_count / max(time.perf_counter() - ingest_start, 1e-9))
+    
+    return {
+        "message": "PDF uploaded and processed successfully",
+        "filename": filename,
+        "document": base_name,
+        "collection": collection,
+        "content_hash": content_hash,
+        "size_bytes": upload.size,
+        "duplicate": False,
+        "replaced_chunks": replaced,
+        "chunks_created": chunks_created,
+        "text_length": text_length
+    }
+
+def index_busy() -> HTTPException:
+    """503 for index writes that gave up waiting for another writer's lock."""
+    return HTTPException(
+        status_code=503,
+        detail="The index is being written by another process (e.g. backend/ingest.py) - try again later",
+        headers={"Retry-After": "30"},
+    )
+
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload a PDF and process it for RAG."""
+async def upload_pdf(file: UploadFile = File(...), collection: Optional[str] = Form(None)):
+    """Upload a PDF and process it for RAG, optionally into a named collection (e.g. a course)."""
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     try:
-        # Save PDF
-        pdf_path = DATA_DIR / file.filename
-        with open(pdf_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Extract text
-        text = ""
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        
-        # Save as txt
-        txt_path = pdf_path.with_suffix(".txt")
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        
-        # Create chunks using RecursiveCharacterTextSplitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
-        )
-        chunks = text_splitter.split_text(text)
-        
-        # Save chunks
-        base_name = pdf_path.stem
-        for i, chunk in enumerate(chunks, start=1):
-            chunk_file = CHUNK_DIR / f"{base_name}_chunk{i}.txt"
-            with open(chunk_file, "w", encoding="utf-8") as f:
-                f.write(chunk)
-        
-        # Create embeddings and update vector store (using local embeddings)
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        documents = [Document(page_content=chunk, metadata={"source": base_name, "chunk": i}) 
-                    for i, chunk in enumerate(chunks)]
-        
-        # Load existing vector store or create new one
-        if VECTOR_STORE_PATH.exists():
-            vectorstore = FAISS.load_local(
-                str(VECTOR_STORE_PATH), 
-                embeddings, 
-                allow_dangerous_deserialization=True
-            )
-            vectorstore.add_documents(documents)
-        else:
-            vectorstore = FAISS.from_documents(documents, embeddings)
-        
-        # Save vector store
-        VECTOR_STORE_PATH.mkdir(exist_ok=True)
-        vectorstore.save_local(str(VECTOR_STORE_PATH))
+        # Streamed to a temporary file in DATA_DIR and hashed on the way
+        with span("receive"):
+            upload = await receive_upload(file, DATA_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error receiving PDF: {str(e)}")
+    
+    try:
+        # Documents are identified by content: re-uploading the same bytes is a no-op
+        content_hash = upload.content_hash
+        vectorstore = load_vector_store()
+        existing = await asyncio.to_thread(vectorstore.docstore.source_for_hash, content_hash) if vectorstore else None
+        if existing:
+            return duplicate_upload_response(file.filename, existing, content_hash)
         
-        return {
-            "message": "PDF uploaded and processed successfully",
-            "filename": file.filename,
-            "chunks_created": len(chunks),
-            "text_length": len(text)
-        }
+        # Parsing, embedding and waiting for the index lock all happen off the event loop
+        return await asyncio.to_thread(index_upload, upload, file.filename, collection)
     
+    except LockTimeout:
+        raise index_busy()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        # Duplicates and failures before the rename leave no temporary file behind
+        upload.discard()
+
+@app.delete("/documents/{document}")
+async def remove_document(document: str):
+    """Delete a document: its vectors leave search immediately, its chunks and files are removed."""
+    vectorstore = load_vector_store()
+    partitions = await asyncio.to_thread(vectorstore.docstore.partitions) if vectorstore else []
+    found = [d for d in partitions if d["document"] == document]
+    if not found and document not in chunk_store:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if found and remote_index is not None:
+        # Only VECTOR_STORE_PATH is written here; other shards are built with backend/ingest.py
+        writable = await asyncio.to_thread(remote_index.shard_name, VECTOR_STORE_PATH)
+        if not any(d.get("shard") == writable for d in found):
+            raise HTTPException(
+                status_code=409,
+                detail=(f"Document is on read-only shard {found[0].get('shard')!r}; remove its file from that shard's"
+                        " data directory and rebuild it with backend/ingest.py --rebuild"),
+            )
+    try:
+        removed = await asyncio.to_thread(delete_document, document)
+        return {"message": "Document deleted", "document": document, "chunks_removed": removed}
+    except LockTimeout:
+        raise index_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+
+async def answer_query(vectorstore, query: str, scope: Optional[DocumentScope], route: Route,
+                       context: Optional[List[int]], priority: int = INTERACTIVE, docs: Optional[list] = None,
+                       history: Optional[List[dict]] = None):
+    """Retrieval + generation for /query (shared by identical concurrent requests).
+
+    Batch callers pass the docs they already retrieved.
+    """
+    # The mentor instructions are the fixed system prompt (see chat_context.py);
+    # only this turn's text is new to Ollama, earlier turns come from the session's
+    # context (or, without one, from its stored history)
+    if not vectorstore:
+        # No documents uploaded yet, use basic conversation
+        turn_prompt = f"""Student: {query}
+AI Mentor:"""
+    else:
+        # Use RAG with uploaded documents
+        # Retrieve context (restricted to the requested documents, if any)
+        if docs is None:
+            docs = await retrieve(vectorstore, query, 3, scope)
+        passages = "\n\n".join(doc.page_content for doc in docs)
+        turn_prompt = f"""Context: {passages}
+
+Question: {query}
+
+Helpful Answer:"""
+    
+    # Add timeout wrapper for the LLM call (longer timeout for slower systems)
+    try:
+        return await llm_scheduler.run(generate_chat, route, turn_prompt, context, history, priority=priority,
+                                       timeout=90.0)  # 90 second timeout for slower systems
+    except asyncio.TimeoutError:
+        raise Exception("LLM call timed out after 90 seconds. Consider using a smaller model: ollama pull llama3.2:1b")
+
+@app.post("/query/prefetch")
+async def prefetch_query(request: PrefetchRequest):
+    """Retrieve context for a question that is still being typed; /query reuses it if the question matches."""
+    # Prefetches belong to a session: before it has one, students behind the same
+    # address would otherwise share a rate limit and a cache slot
+    key = request.session_id
+    vectorstore = load_vector_store()
+    if not key:
+        outcome = "no_session"
+    elif len(words(request.query)) < MIN_WORDS:
+        outcome = "too_short"
+    elif not vectorstore:
+        outcome = "no_documents"
+    elif not prefetch_limiter.allow(key):
+        PREFETCH_REQUESTS.inc(outcome="rate_limited")
+        return JSONResponse({"prefetched": False, "reason": "rate_limited"}, status_code=429)
+    elif llm_scheduler.queue_depth():
+        # Generations are waiting: leave the CPU to them
+        outcome = "busy"
+    else:
+        try:
+            docs = await retrieve(vectorstore, request.query, 3, request.scope, background=True)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error prefetching: {str(e)}")
+        prefetch_cache.put(key, request.query, scope_key(request.scope), index_version(), docs)
+        PREFETCH_REQUESTS.inc(outcome="prefetched")
+        return {"prefetched": True, "chunks": len(docs)}
+    PREFETCH_REQUESTS.inc(outcome=outcome)
+    return {"prefetched": False, "reason": outcome}
 
 @app.post("/query")
 async def query_ai_mentor(request: QueryRequest):
     """Query the AI mentor with context from uploaded documents."""
     try:
-        session_id, session = get_or_create_session(request.session_id)
+        # Context prefetched while the question was typed (None unless it still fits)
+        docs = None
         
         # Load vector store
         vectorstore = load_vector_store()
+        if vectorstore and request.session_id:
+            docs = prefetch_cache.take(request.session_id, request.query, scope_key(request.scope), index_version())
+        session_id, session = await asyncio.to_thread(get_or_create_session, request.session_id)
+        with span("get_llm"):
+            route = model_router.route("chat", count_tokens(request.query), session_contexts.model(session_id))
+        model = route.model
+        context = session_contexts.get(session_id, model, model_manager.epoch(model))
         
-        if not vectorstore:
-            # No documents uploaded yet, use basic conversation
-            prompt = PromptTemplate(
-                input_variables=["input"],
-                template="""You are a helpful AI mentor for college students. 
-                You help them understand concepts, provide summaries, and guide their learning.
-                
-                Student: {input}
-                AI Mentor:"""
-            )
-            
-            # Simple LLM call without memory for now
-            llm_instance = get_llm()
-            chain = prompt | llm_instance | StrOutputParser()
-            # Add timeout wrapper for the LLM call (longer timeout for slower systems)
-            import asyncio
-            try:
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(chain.invoke, {"input": request.query}),
-                    timeout=90.0  # 90 second timeout for slower systems
-                )
-            except asyncio.TimeoutError:
-                raise Exception("LLM call timed out after 90 seconds. Consider using a smaller model: ollama pull llama3.2:1b")
-        else:
-            # Use RAG with uploaded documents
-            qa_prompt = PromptTemplate(
-                template="""You are an AI mentor helping a college student learn. 
-                Use the following context from their course materials to answer their question.
-                If you can provide examples or clarifications, please do so.
-                If the context doesn't contain the answer, use your general knowledge but mention that.
-                
-                Context: {context}
-                
-                Question: {question}
-                
-                Helpful Answer:""",
-                input_variables=["context", "question"]
-            )
-            
-            # Create retriever
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-            
-            # Format documents
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-            
-            # Create RAG chain using LangChain 1.0 style
-            llm_instance = get_llm()
-            rag_chain = (
-                {"context": retriever | format_docs, "question": RunnablePassthrough()}
-                | qa_prompt
-                | llm_instance
-                | StrOutputParser()
+        # Students asking the same question at the same time share one answer; sessions
+        # in the middle of a different conversation (context or history) get their own
+        history = session.chat_history
+        key = ("query", normalize_text(request.query), scope_key(request.scope),
+               index_version() if vectorstore else None, model,
+               hash(tuple(context)) if context else session_id if history else None)
+        with model_router.measure(route):
+            response, new_context = await inflight.run(
+                key, lambda: answer_query(vectorstore, request.query, request.scope, route, context, docs=docs,
+                                          history=history)
             )
-            
-            # Add timeout wrapper for the LLM call (longer timeout for slower systems)
-            import asyncio
-            try:
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(rag_chain.invoke, request.query),
-                    timeout=90.0  # 90 second timeout for slower systems
+        if new_context:
+            # A cold load during the call bumps the model's epoch; the new context is still good for the next turn
+            session_contexts.put(session_id, model, model_manager.epoch(model), new_context)
+        
+        # Store the exchange (RAG answers only, as before)
+        if vectorstore:
+            with span("save_session"):
+                await asyncio.to_thread(
+                    get_session_store().append,
+                    session_id, [chat_message("user", request.query), chat_message("assistant", response)]
                 )
-            except asyncio.TimeoutError:
-                raise Exception("LLM call timed out after 90 seconds. Consider using a smaller model: ollama pull llama3.2:1b")
-            
-            # Store in memory
-            from langchain_core.messages import HumanMessage, AIMessage
-            session["memory"].add_user_message(request.query)
-            session["memory"].add_ai_message(response)
         
         # Track progress
-        session["progress"].append({
+        track_progress(session_id, {
             "timestamp": datetime.now().isoformat(),
             "activity": "query",
             "query": request.query
         })
         
-        # Save to disk
-        save_session_to_disk(session_id, session)
-        
         return {
             "response": response,
             "session_id": session_id,
@@ -440,21 +962,56 @@ async def query_ai_mentor(request: QueryRequest):
         print(f"Traceback: {traceback_str}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {error_details}")
 
-@app.post("/generate-quiz")
-async def generate_quiz(request: QuizRequest):
-    """Generate a mini-quiz on a specific topic."""
+@app.post("/query/batch")
+async def query_batch(request: QueryBatchRequest):
+    """Answer many questions (e.g. an FAQ list), streaming NDJSON results as each answer finishes."""
+    check_batch_size(request.queries)
     try:
-        session_id, session = get_or_create_session(request.session_id)
-        
-        # Load vector store for context
+        session_id, _ = await asyncio.to_thread(get_or_create_session, request.session_id)
         vectorstore = load_vector_store()
-        context = ""
-        
-        if vectorstore:
-            docs = vectorstore.similarity_search(request.topic, k=3)
-            context = "\n".join([doc.page_content for doc in docs])
-        
-        quiz_prompt = f"""You are a quiz generator. Generate EXACTLY {request.num_questions} multiple-choice questions about: {request.topic}
+        version = index_version() if vectorstore else None
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+    
+    async def retrieve_chunk(queries):
+        if not vectorstore:
+            return [None] * len(queries)
+        return await asyncio.to_thread(retrieve_batch, vectorstore, queries, 3, request.scope)
+    
+    async def answer(query, docs):
+        # Independent questions: no session context, so identical /query requests can share the answer
+        route = model_router.route("chat", count_tokens(query))
+        key = ("query", normalize_text(query), scope_key(request.scope), version, route.model, None)
+        with model_router.measure(route):
+            response, _ = await inflight.run(
+                key, lambda: answer_query(vectorstore, query, request.scope, route, None, BATCH, docs)
+            )
+        track_progress(session_id, {
+            "timestamp": datetime.now().isoformat(),
+            "activity": "query",
+            "query": query
+        })
+        return {"query": query, "response": response}
+    
+    return batch_response(request.queries, retrieve_chunk, answer, session_id)
+
+async def build_quiz(request: QuizRequest, route: Route, priority: int = INTERACTIVE,
+                     docs: Optional[list] = None) -> List[dict]:
+    """Retrieval, generation and JSON recovery for /generate-quiz (shared by identical
+    concurrent requests). Returns the validated questions.
+
+    Batch callers pass the docs they already retrieved.
+    """
+    # Load vector store for context
+    vectorstore = load_vector_store()
+    context = ""
+    
+    if vectorstore:
+        if docs is None:
+            docs = await retrieve(vectorstore, request.topic, 3, request.scope)
+        context = "\n".join([doc.page_content for doc in docs])
+    
+    quiz_prompt = f"""You are a quiz generator. Generate EXACTLY {request.num_questions} multiple-choice questions about: {request.topic}
 
         ⚠️ CRITICAL REQUIREMENT: You MUST generate exactly {request.num_questions} questions. 
         - The JSON array must contain exactly {request.num_questions} question objects
@@ -498,511 +1055,532 @@ async def generate_quiz(request: QuizRequest):
         ]
         
         ⚠️ FINAL REMINDER: Generate exactly {request.num_questions} questions. Count them carefully. The array must have exactly {request.num_questions} objects. Return ONLY the JSON array, nothing else."""
-        
-        # Use LangChain 1.0 style with async timeout
-        llm_instance = get_llm()
-        
-        # Wrap LLM call in async with timeout
-        try:
-            llm_response = await asyncio.wait_for(
-                asyncio.to_thread(llm_instance.invoke, quiz_prompt),
-                timeout=90.0  # 90 second timeout for slower systems
-            )
-            response = llm_response.content
-        except asyncio.TimeoutError:
-            raise HTTPException(
-                status_code=500,
-                detail="LLM call timed out after 90 seconds. Consider using a smaller model: ollama pull llama3.2:1b"
-            )
-        
-        # Clean the response - remove markdown code blocks and extra text
-        original_response = response
-        print(f"DEBUG: Original LLM response (first 1000 chars): {original_response[:1000]}")
-        
-        # Remove markdown code blocks (```json ... ``` or ``` ... ```)
-        cleaned = re.sub(r'```(?:json)?\s*\n?', '', response)
-        cleaned = re.sub(r'```\s*$', '', cleaned, flags=re.MULTILINE)
-        cleaned = cleaned.strip()
-        
-        # Try multiple extraction strategies
-        extracted_json = None
-        
-        # Strategy 1: Response already starts with [
-        if cleaned.startswith('['):
-            extracted_json = cleaned
+    
+    # Use LangChain 1.0 style with async timeout
+    with span("get_llm"):
+        llm_instance = get_llm(route)
+    
+    # Wrap LLM call in async with timeout
+    try:
+        response = await llm_scheduler.run(generate, llm_instance, quiz_prompt, priority=priority,
+                                           timeout=90.0)  # 90 second timeout for slower systems
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=500,
+            detail="LLM call timed out after 90 seconds. Consider using a smaller model: ollama pull llama3.2:1b"
+        )
+    
+    # Clean the response - remove markdown code blocks and extra text
+    parse_start = time.perf_counter()
+    parse_outcome = "parsed"
+    original_response = response
+    print(f"DEBUG: Original LLM response (first 1000 chars): {original_response[:1000]}")
+    
+    # Remove markdown code blocks (```json ... ``` or ``` ... ```)
+    cleaned = re.sub(r'```(?:json)?\s*\n?', '', response)
+    cleaned = re.sub(r'```\s*$', '', cleaned, flags=re.MULTILINE)
+    cleaned = cleaned.strip()
+    
+    # Try multiple extraction strategies
+    extracted_json = None
+    
+    # Strategy 1: Response already starts with [
+    if cleaned.startswith('['):
+        extracted_json = cleaned
+    else:
+        # Strategy 2: Remove text before the first [
+        if '[' in cleaned:
+            first_bracket = cleaned.find('[')
+            extracted_json = cleaned[first_bracket:]
         else:
-            # Strategy 2: Remove text before the first [
-            if '[' in cleaned:
-                first_bracket = cleaned.find('[')
-                extracted_json = cleaned[first_bracket:]
-            else:
-                # Strategy 3: Try to find JSON array pattern anywhere
-                json_match = re.search(r'\[[\s\S]*?\]', cleaned, re.DOTALL)
-                if json_match:
-                    extracted_json = json_match.group(0)
-        
-        # If we found something, extract the complete JSON array
-        if extracted_json:
-            # Find the matching closing bracket to get complete array
-            if extracted_json.startswith('['):
-                bracket_count = 0
-                end_pos = -1
-                for i, char in enumerate(extracted_json):
-                    if char == '[':
-                        bracket_count += 1
-                    elif char == ']':
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            end_pos = i + 1
-                            break
-                if end_pos > 0:
-                    response = extracted_json[:end_pos].strip()
-                else:
-                    # No matching closing bracket found
-                    response = extracted_json.strip()
+            # Strategy 3: Try to find JSON array pattern anywhere
+            json_match = re.search(r'\[[\s\S]*?\]', cleaned, re.DOTALL)
+            if json_match:
+                extracted_json = json_match.group(0)
+    
+    # If we found something, extract the complete JSON array
+    if extracted_json:
+        # Find the matching closing bracket to get complete array
+        if extracted_json.startswith('['):
+            bracket_count = 0
+            end_pos = -1
+            for i, char in enumerate(extracted_json):
+                if char == '[':
+                    bracket_count += 1
+                elif char == ']':
+                    bracket_count -= 1
+                    if bracket_count == 0:
+                        end_pos = i + 1
+                        break
+            if end_pos > 0:
+                response = extracted_json[:end_pos].strip()
             else:
+                # No matching closing bracket found
                 response = extracted_json.strip()
         else:
-            # No JSON array found - try to parse as-is or return error
-            response = cleaned.strip()
-            if not response or len(response) < 10:
-                raise ValueError(f"LLM response is empty or too short. Original response: {original_response[:200]}")
+            response = extracted_json.strip()
+    else:
+        # No JSON array found - try to parse as-is or return error
+        response = cleaned.strip()
+        if not response or len(response) < 10:
+            raise ValueError(f"LLM response is empty or too short. Original response: {original_response[:200]}")
+    
+    print(f"DEBUG: Extracted JSON (first 500 chars): {response[:500]}")
+    
+    # Final check - ensure we have something that looks like JSON
+    if not response or not (response.startswith('[') or response.startswith('{')):
+        raise ValueError(f"Could not extract valid JSON from LLM response. Extracted: {response[:200]}")
+    
+    # Try to repair common JSON syntax errors
+    def repair_json(json_str):
+        """Attempt to fix common JSON syntax errors that LLMs sometimes produce."""
+        repaired = json_str
         
-        print(f"DEBUG: Extracted JSON (first 500 chars): {response[:500]}")
+        # 1. Remove trailing commas before closing brackets/braces
+        repaired = re.sub(r',(\s*[}\]])', r'\1', repaired)
         
-        # Final check - ensure we have something that looks like JSON
-        if not response or not (response.startswith('[') or response.startswith('{')):
-            raise ValueError(f"Could not extract valid JSON from LLM response. Extracted: {response[:200]}")
+        # 2. Add missing commas between objects in arrays
+        repaired = re.sub(r'\}\s*\{', r'}, {', repaired)
         
-        # Try to repair common JSON syntax errors
-        def repair_json(json_str):
-            """Attempt to fix common JSON syntax errors that LLMs sometimes produce."""
-            repaired = json_str
-            
-            # 1. Remove trailing commas before closing brackets/braces
-            repaired = re.sub(r',(\s*[}\]])', r'\1', repaired)
-            
-            # 2. Add missing commas between objects in arrays
-            repaired = re.sub(r'\}\s*\{', r'}, {', repaired)
-            
-            # 3. Fix missing commas after closing braces before closing brackets
-            repaired = re.sub(r'\}\s*\]', r'}]', repaired)
-            
-            # 4. CRITICAL: Fix unterminated correct_answer fields specifically
-            # Pattern: "correct_answer": "  (missing closing quote and value)
-            # This is a common error - correct_answer should be A, B, C, or D
-            repaired = re.sub(
-                r'"correct_answer"\s*:\s*"\s*([,\n}])',
-                r'"correct_answer": "A"\1',
-                repaired
-            )
-            # Pattern: "correct_answer": "A  (missing closing quote)
-            repaired = re.sub(
-                r'"correct_answer"\s*:\s*"([A-D])\s*([,\n}])',
-                r'"correct_answer": "\1"\2',
-                repaired
-            )
-            # Pattern: "correct_answer": "  (just quote, no value, followed by comma/brace)
-            repaired = re.sub(
-                r'"correct_answer"\s*:\s*"\s*"([,\n}])',
-                r'"correct_answer": "A"\1',
-                repaired
-            )
+        # 3. Fix missing commas after closing braces before closing brackets
+        repaired = re.sub(r'\}\s*\]', r'}]', repaired)
+        
+        # 4. CRITICAL: Fix unterminated correct_answer fields specifically
+        # Pattern: "correct_answer": "  (missing closing quote and value)
+        # This is a common error - correct_answer should be A, B, C, or D
+        repaired = re.sub(
+            r'"correct_answer"\s*:\s*"\s*([,\n}])',
+            r'"correct_answer": "A"\1',
+            repaired
+        )
+        # Pattern: "correct_answer": "A  (missing closing quote)
+        repaired = re.sub(
+            r'"correct_answer"\s*:\s*"([A-D])\s*([,\n}])',
+            r'"correct_answer": "\1"\2',
+            repaired
+        )
+        # Pattern: "correct_answer": "  (just quote, no value, followed by comma/brace)
+        repaired = re.sub(
+            r'"correct_answer"\s*:\s*"\s*"([,\n}])',
+            r'"correct_answer": "A"\1',
+            repaired
+        )
+        
+        # 5. Try to fix other unterminated strings by finding and closing them
+        # This is a heuristic approach - look for patterns like "text without closing quote
+        lines = repaired.split('\n')
+        fixed_lines = []
+        in_string = False
+        string_start_line = -1
+        
+        for line_idx, line in enumerate(lines):
+            # Count unescaped quotes in this line
+            unescaped_quotes = len(re.findall(r'(?<!\\)"', line))
             
-            # 5. Try to fix other unterminated strings by finding and closing them
-            # This is a heuristic approach - look for patterns like "text without closing quote
-            lines = repaired.split('\n')
-            fixed_lines = []
-            in_string = False
-            string_start_line = -1
+            # Track if we're inside a string
+            if in_string:
+                # We're continuing a string from previous line
+                if unescaped_quotes > 0:
+                    # Found closing quote
+                    in_string = False
+                    string_start_line = -1
+            else:
+                # Not in a string, check if this line starts one
+                if unescaped_quotes % 2 == 1:
+                    # Odd number of quotes - string starts but doesn't end
+                    in_string = True
+                    string_start_line = line_idx
             
-            for line_idx, line in enumerate(lines):
-                # Count unescaped quotes in this line
-                unescaped_quotes = len(re.findall(r'(?<!\\)"', line))
-                
-                # Track if we're inside a string
-                if in_string:
-                    # We're continuing a string from previous line
-                    if unescaped_quotes > 0:
-                        # Found closing quote
-                        in_string = False
-                        string_start_line = -1
-                else:
-                    # Not in a string, check if this line starts one
-                    if unescaped_quotes % 2 == 1:
-                        # Odd number of quotes - string starts but doesn't end
-                        in_string = True
-                        string_start_line = line_idx
-                
-                # If we're at the end and still in a string, try to close it
-                if in_string and (line_idx == len(lines) - 1 or 
-                                 (line_idx < len(lines) - 1 and 
-                                  (lines[line_idx + 1].strip().startswith('"') or 
-                                   lines[line_idx + 1].strip().startswith('}') or
-                                   lines[line_idx + 1].strip().startswith(']')))):
-                    # Try to close the string before the next structural element
-                    if not line.rstrip().endswith('"') and not line.rstrip().endswith('\\'):
-                        # Find where the string value should end
-                        # Look for patterns like: "key": "value that needs closing
-                        if '":' in line:
-                            colon_pos = line.find('":')
-                            after_colon = line[colon_pos + 2:].strip()
-                            if after_colon.startswith('"') and not after_colon.endswith('"'):
-                                # This is a string value that needs closing
-                                # Find where it should end (before comma, }, or end of line)
-                                value_part = after_colon[1:]  # Skip opening quote
-                                
-                                # Special handling for correct_answer - should be single letter
-                                if '"correct_answer"' in line[:colon_pos]:
-                                    # For correct_answer, if we see a single letter, use it; otherwise default to A
-                                    letter_match = re.search(r'([A-D])', value_part)
-                                    if letter_match:
-                                        letter = letter_match.group(1)
-                                        # Close the string with the letter
-                                        line = line[:colon_pos + 2 + 1] + letter + '"'
-                                    else:
-                                        # No letter found, default to A
-                                        line = line[:colon_pos + 2 + 1] + 'A"'
-                                    in_string = False
+            # If we're at the end and still in a string, try to close it
+            if in_string and (line_idx == len(lines) - 1 or 
+                             (line_idx < len(lines) - 1 and 
+                              (lines[line_idx + 1].strip().startswith('"') or 
+                               lines[line_idx + 1].strip().startswith('}') or
+                               lines[line_idx + 1].strip().startswith(']')))):
+                # Try to close the string before the next structural element
+                if not line.rstrip().endswith('"') and not line.rstrip().endswith('\\'):
+                    # Find where the string value should end
+                    # Look for patterns like: "key": "value that needs closing
+                    if '":' in line:
+                        colon_pos = line.find('":')
+                        after_colon = line[colon_pos + 2:].strip()
+                        if after_colon.startswith('"') and not after_colon.endswith('"'):
+                            # This is a string value that needs closing
+                            # Find where it should end (before comma, }, or end of line)
+                            value_part = after_colon[1:]  # Skip opening quote
+                            
+                            # Special handling for correct_answer - should be single letter
+                            if '"correct_answer"' in line[:colon_pos]:
+                                # For correct_answer, if we see a single letter, use it; otherwise default to A
+                                letter_match = re.search(r'([A-D])', value_part)
+                                if letter_match:
+                                    letter = letter_match.group(1)
+                                    # Close the string with the letter
+                                    line = line[:colon_pos + 2 + 1] + letter + '"'
                                 else:
-                                    # For other fields, try to find a reasonable place to close
-                                    for end_marker in [',', '}', '\n']:
-                                        if end_marker in value_part:
-                                            # Close before the marker
-                                            marker_pos = value_part.find(end_marker)
-                                            line = line[:colon_pos + 2 + 1] + value_part[:marker_pos] + '"' + value_part[marker_pos:]
-                                            in_string = False
-                                            break
-                                    else:
-                                        # No marker found, close at end of line
-                                        line = line.rstrip() + '"'
+                                    # No letter found, default to A
+                                    line = line[:colon_pos + 2 + 1] + 'A"'
+                                in_string = False
+                            else:
+                                # For other fields, try to find a reasonable place to close
+                                for end_marker in [',', '}', '\n']:
+                                    if end_marker in value_part:
+                                        # Close before the marker
+                                        marker_pos = value_part.find(end_marker)
+                                        line = line[:colon_pos + 2 + 1] + value_part[:marker_pos] + '"' + value_part[marker_pos:]
                                         in_string = False
-                
-                fixed_lines.append(line)
-            repaired = '\n'.join(fixed_lines)
+                                        break
+                                else:
+                                    # No marker found, close at end of line
+                                    line = line.rstrip() + '"'
+                                    in_string = False
             
-            return repaired
+            fixed_lines.append(line)
+        repaired = '\n'.join(fixed_lines)
         
-        # Alternative: Try to extract valid questions from broken JSON using regex
-        def extract_questions_from_text(text):
-            """Fallback: Try to extract question objects using regex patterns."""
-            questions = []
-            # Pattern to match question objects
-            # Look for question: "...", options: [...], correct_answer: "...", explanation: "..."
-            pattern = r'"question"\s*:\s*"([^"]*(?:\\.[^"]*)*)"'
-            question_matches = list(re.finditer(pattern, text))
-            
-            for i, q_match in enumerate(question_matches):
-                try:
-                    start_pos = q_match.start()
-                    # Try to find the end of this question object (next } or end)
-                    end_pos = text.find('}', start_pos)
-                    if end_pos == -1:
-                        end_pos = len(text)
-                    
-                    question_block = text[start_pos:end_pos+1]
-                    # Try to extract fields using regex
-                    question_text = q_match.group(1).replace('\\"', '"')
-                    
-                    # Extract options
-                    options_match = re.search(r'"options"\s*:\s*\[(.*?)\]', question_block, re.DOTALL)
-                    if not options_match:
-                        continue
-                    options_str = options_match.group(1)
-                    options = []
-                    for opt_match in re.finditer(r'"([^"]*(?:\\.[^"]*)*)"', options_str):
-                        options.append(opt_match.group(1).replace('\\"', '"'))
-                    
-                    if len(options) < 2:
-                        continue
-                    
-                    # Extract correct answer - handle unterminated strings
-                    # Try strict match first
-                    correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])"', question_block)
+        return repaired
+    
+    # Alternative: Try to extract valid questions from broken JSON using regex
+    def extract_questions_from_text(text):
+        """Fallback: Try to extract question objects using regex patterns."""
+        questions = []
+        # Pattern to match question objects
+        # Look for question: "...", options: [...], correct_answer: "...", explanation: "..."
+        pattern = r'"question"\s*:\s*"([^"]*(?:\\.[^"]*)*)"'
+        question_matches = list(re.finditer(pattern, text))
+        
+        for i, q_match in enumerate(question_matches):
+            try:
+                start_pos = q_match.start()
+                # Try to find the end of this question object (next } or end)
+                end_pos = text.find('}', start_pos)
+                if end_pos == -1:
+                    end_pos = len(text)
+                
+                question_block = text[start_pos:end_pos+1]
+                # Try to extract fields using regex
+                question_text = q_match.group(1).replace('\\"', '"')
+                
+                # Extract options
+                options_match = re.search(r'"options"\s*:\s*\[(.*?)\]', question_block, re.DOTALL)
+                if not options_match:
+                    continue
+                options_str = options_match.group(1)
+                options = []
+                for opt_match in re.finditer(r'"([^"]*(?:\\.[^"]*)*)"', options_str):
+                    options.append(opt_match.group(1).replace('\\"', '"'))
+                
+                if len(options) < 2:
+                    continue
+                
+                # Extract correct answer - handle unterminated strings
+                # Try strict match first
+                correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])"', question_block)
+                if not correct_match:
+                    # Try to find unterminated correct_answer: "A or correct_answer: "A
+                    correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])(?:\s*[,\n}])', question_block)
                     if not correct_match:
-                        # Try to find unterminated correct_answer: "A or correct_answer: "A
-                        correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])(?:\s*[,\n}])', question_block)
+                        # Try to find just the pattern "correct_answer": " followed by A-D
+                        correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])', question_block)
                         if not correct_match:
-                            # Try to find just the pattern "correct_answer": " followed by A-D
-                            correct_match = re.search(r'"correct_answer"\s*:\s*"([A-D])', question_block)
+                            # Last resort: look for A-D near correct_answer
+                            correct_match = re.search(r'"correct_answer"[^}]*?([A-D])(?:\s*[,\n}])', question_block)
                             if not correct_match:
-                                # Last resort: look for A-D near correct_answer
-                                correct_match = re.search(r'"correct_answer"[^}]*?([A-D])(?:\s*[,\n}])', question_block)
-                                if not correct_match:
-                                    continue
-                    correct_answer = correct_match.group(1).upper()
-                    # Ensure it's valid
-                    if correct_answer not in ['A', 'B', 'C', 'D']:
-                        continue
-                    
-                    # Extract explanation (optional)
-                    explanation_match = re.search(r'"explanation"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', question_block)
-                    explanation = explanation_match.group(1).replace('\\"', '"') if explanation_match else ""
-                    
-                    questions.append({
-                        "question": question_text,
-                        "options": options,
-                        "correct_answer": correct_answer,
-                        "explanation": explanation
-                    })
-                except Exception as e:
-                    print(f"DEBUG: Failed to extract question {i+1} from text: {e}")
+                                continue
+                correct_answer = correct_match.group(1).upper()
+                # Ensure it's valid
+                if correct_answer not in ['A', 'B', 'C', 'D']:
                     continue
-            
-            return questions
+                
+                # Extract explanation (optional)
+                explanation_match = re.search(r'"explanation"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', question_block)
+                explanation = explanation_match.group(1).replace('\\"', '"') if explanation_match else ""
+                
+                questions.append({
+                    "question": question_text,
+                    "options": options,
+                    "correct_answer": correct_answer,
+                    "explanation": explanation
+                })
+            except Exception as e:
+                print(f"DEBUG: Failed to extract question {i+1} from text: {e}")
+                continue
         
-        # Validate it's valid JSON before returning
+        return questions
+    
+    # Validate it's valid JSON before returning
+    try:
+        # Try to parse the JSON
         try:
-            # Try to parse the JSON
+            parsed = json.loads(response)
+            print(f"DEBUG: Successfully parsed JSON on first attempt")
+        except json.JSONDecodeError as e:
+            print(f"DEBUG: Initial JSON parse failed: {e}")
+            print(f"DEBUG: Attempting to repair JSON...")
+            # Try to repair common issues
+            repaired = repair_json(response)
             try:
-                parsed = json.loads(response)
-                print(f"DEBUG: Successfully parsed JSON on first attempt")
-            except json.JSONDecodeError as e:
-                print(f"DEBUG: Initial JSON parse failed: {e}")
-                print(f"DEBUG: Attempting to repair JSON...")
-                # Try to repair common issues
-                repaired = repair_json(response)
+                parsed = json.loads(repaired)
+                print(f"DEBUG: Successfully parsed after repair")
+                response = repaired  # Update response to repaired version
+                parse_outcome = "repaired"
+            except json.JSONDecodeError as e2:
+                print(f"DEBUG: Repair attempt also failed: {e2}")
+                # Try fallback: extract questions using regex
+                print(f"DEBUG: Attempting fallback extraction using regex...")
                 try:
-                    parsed = json.loads(repaired)
-                    print(f"DEBUG: Successfully parsed after repair")
-                    response = repaired  # Update response to repaired version
-                except json.JSONDecodeError as e2:
-                    print(f"DEBUG: Repair attempt also failed: {e2}")
-                    # Try fallback: extract questions using regex
-                    print(f"DEBUG: Attempting fallback extraction using regex...")
-                    try:
-                        # Try extracting from original response first, then repaired
-                        extracted_questions = extract_questions_from_text(original_response)
-                        if len(extracted_questions) == 0:
-                            extracted_questions = extract_questions_from_text(repaired)
-                        
-                        if len(extracted_questions) > 0:
-                            print(f"DEBUG: Successfully extracted {len(extracted_questions)} questions using fallback method (requested {request.num_questions})")
-                            parsed = extracted_questions
-                        else:
-                            # Re-raise the original error - we'll handle it below
-                            raise e
-                    except Exception as fallback_error:
-                        print(f"DEBUG: Fallback extraction also failed: {fallback_error}")
+                    # Try extracting from original response first, then repaired
+                    extracted_questions = extract_questions_from_text(original_response)
+                    if len(extracted_questions) == 0:
+                        extracted_questions = extract_questions_from_text(repaired)
+                    
+                    if len(extracted_questions) > 0:
+                        print(f"DEBUG: Successfully extracted {len(extracted_questions)} questions using fallback method (requested {request.num_questions})")
+                        parsed = extracted_questions
+                        parse_outcome = "regex_fallback"
+                    else:
                         # Re-raise the original error - we'll handle it below
                         raise e
-            
-            print(f"DEBUG: Successfully parsed JSON, type: {type(parsed)}, length: {len(parsed) if isinstance(parsed, list) else 'N/A'}")
-            
-            if not isinstance(parsed, list):
-                parsed = [parsed]
-            
-            if len(parsed) == 0:
-                raise ValueError("LLM returned an empty array. No questions were generated.")
-            
-            print(f"DEBUG: LLM generated {len(parsed)} questions (requested {request.num_questions})")
-            if len(parsed) < request.num_questions:
-                print(f"WARNING: LLM only generated {len(parsed)} questions, but {request.num_questions} were requested!")
-            
-            print(f"DEBUG: Starting validation of {len(parsed)} questions")
-            
-            # Validate each question has required fields and clean data
-            seen_questions = set()
-            valid_questions = []
-            for i, q in enumerate(parsed):
-                try:
-                    if not isinstance(q, dict):
-                        print(f"WARNING: Question {i+1} is not a valid object, skipping")
-                        continue
-                    if 'question' not in q or not q['question']:
-                        print(f"WARNING: Question {i+1} missing 'question' field, skipping")
-                        continue
-                    if 'options' not in q or not isinstance(q['options'], list) or len(q['options']) < 2:
-                        print(f"WARNING: Question {i+1} missing or invalid 'options' field, skipping")
-                        continue
-                    if 'correct_answer' not in q:
-                        print(f"WARNING: Question {i+1} missing 'correct_answer' field, skipping")
-                        continue
-                    
-                    # Clean question text
-                    q['question'] = q['question'].strip()
-                    if not q['question']:
-                        print(f"WARNING: Question {i+1} has empty question text after cleaning, skipping")
-                        continue
-                    
-                    # Check for duplicate questions
-                    question_lower = q['question'].lower()
-                    if question_lower in seen_questions:
-                        print(f"WARNING: Question {i+1} is a duplicate, skipping")
-                        continue
-                    seen_questions.add(question_lower)
-                    
-                    # Clean options
-                    if isinstance(q['options'], list):
-                        q['options'] = [str(opt).strip() for opt in q['options'] if opt and str(opt).strip()]
-                        if len(q['options']) < 2:
-                            print(f"WARNING: Question {i+1} has less than 2 valid options after cleaning, skipping")
-                            continue
-                    
-                    # Clean explanation
-                    if 'explanation' in q:
-                        q['explanation'] = str(q['explanation']).strip()
-                    
-                    # Validate correct_answer is valid
-                    correct_ans = str(q['correct_answer']).strip().upper()
-                    if correct_ans not in ['A', 'B', 'C', 'D']:
-                        print(f"WARNING: Question {i+1} has invalid correct_answer: {correct_ans}, skipping")
+                except Exception as fallback_error:
+                    print(f"DEBUG: Fallback extraction also failed: {fallback_error}")
+                    # Re-raise the original error - we'll handle it below
+                    raise e
+        
+        print(f"DEBUG: Successfully parsed JSON, type: {type(parsed)}, length: {len(parsed) if isinstance(parsed, list) else 'N/A'}")
+        
+        if not isinstance(parsed, list):
+            parsed = [parsed]
+        
+        if len(parsed) == 0:
+            raise ValueError("LLM returned an empty array. No questions were generated.")
+        
+        print(f"DEBUG: LLM generated {len(parsed)} questions (requested {request.num_questions})")
+        if len(parsed) < request.num_questions:
+            print(f"WARNING: LLM only generated {len(parsed)} questions, but {request.num_questions} were requested!")
+        
+        print(f"DEBUG: Starting validation of {len(parsed)} questions")
+        
+        # Validate each question has required fields and clean data
+        seen_questions = set()
+        valid_questions = []
+        for i, q in enumerate(parsed):
+            try:
+                if not isinstance(q, dict):
+                    print(f"WARNING: Question {i+1} is not a valid object, skipping")
+                    continue
+                if 'question' not in q or not q['question']:
+                    print(f"WARNING: Question {i+1} missing 'question' field, skipping")
+                    continue
+                if 'options' not in q or not isinstance(q['options'], list) or len(q['options']) < 2:
+                    print(f"WARNING: Question {i+1} missing or invalid 'options' field, skipping")
+                    continue
+                if 'correct_answer' not in q:
+                    print(f"WARNING: Question {i+1} missing 'correct_answer' field, skipping")
+                    continue
+                
+                # Clean question text
+                q['question'] = q['question'].strip()
+                if not q['question']:
+                    print(f"WARNING: Question {i+1} has empty question text after cleaning, skipping")
+                    continue
+                
+                # Check for duplicate questions
+                question_lower = q['question'].lower()
+                if question_lower in seen_questions:
+                    print(f"WARNING: Question {i+1} is a duplicate, skipping")
+                    continue
+                seen_questions.add(question_lower)
+                
+                # Clean options
+                if isinstance(q['options'], list):
+                    q['options'] = [str(opt).strip() for opt in q['options'] if opt and str(opt).strip()]
+                    if len(q['options']) < 2:
+                        print(f"WARNING: Question {i+1} has less than 2 valid options after cleaning, skipping")
                         continue
-                    q['correct_answer'] = correct_ans
-                    
-                    # If we got here, the question is valid
-                    valid_questions.append(q)
-                    print(f"DEBUG: Question {i+1} validated successfully")
-                except Exception as e:
-                    print(f"WARNING: Error validating question {i+1}: {e}, skipping")
+                
+                # Clean explanation
+                if 'explanation' in q:
+                    q['explanation'] = str(q['explanation']).strip()
+                
+                # Validate correct_answer is valid
+                correct_ans = str(q['correct_answer']).strip().upper()
+                if correct_ans not in ['A', 'B', 'C', 'D']:
+                    print(f"WARNING: Question {i+1} has invalid correct_answer: {correct_ans}, skipping")
                     continue
-            
-            # Ensure we have at least one valid question
-            if len(valid_questions) == 0:
-                # Last resort: try to extract from original response using regex
-                print(f"DEBUG: No valid questions after validation, trying last-resort extraction...")
-                try:
-                    extracted_questions = extract_questions_from_text(original_response)
-                    if len(extracted_questions) > 0:
-                        print(f"DEBUG: Last-resort extraction found {len(extracted_questions)} questions")
-                        valid_questions = extracted_questions
-                    else:
-                        raise ValueError(f"No valid questions found after validation. Started with {len(parsed)} questions, but all were invalid (missing fields, duplicates, or invalid answers).")
-                except Exception as e:
-                    raise ValueError(f"No valid questions found after validation. Started with {len(parsed)} questions, but all were invalid (missing fields, duplicates, or invalid answers). Last-resort extraction also failed: {e}")
-            
-            # Check if we have fewer questions than requested
-            if len(valid_questions) < request.num_questions:
-                filtered_count = len(parsed) - len(valid_questions)
-                print(f"WARNING: Generated {len(valid_questions)} valid questions, but {request.num_questions} were requested.")
-                print(f"WARNING: LLM generated {len(parsed)} questions, but {filtered_count} were filtered out during validation.")
-                print(f"WARNING: This may be because:")
-                print(f"  - LLM generated fewer than {request.num_questions} questions ({len(parsed)} instead of {request.num_questions})")
-                print(f"  - {filtered_count} questions were filtered out during validation (invalid format, duplicates, missing fields, etc.)")
-                print(f"WARNING: Returning {len(valid_questions)} questions instead of {request.num_questions}")
+                q['correct_answer'] = correct_ans
                 
-                # If we have significantly fewer questions, try to be more lenient with validation
-                if len(valid_questions) < request.num_questions and len(parsed) >= request.num_questions:
-                    print(f"INFO: Attempting to recover filtered questions with more lenient validation...")
-                    # Try to recover questions that were filtered out
-                    recovered = []
-                    for i, q in enumerate(parsed):
-                        # Skip if already in valid_questions
-                        if any(vq.get('question', '').lower() == q.get('question', '').lower() for vq in valid_questions):
+                # If we got here, the question is valid
+                valid_questions.append(q)
+                print(f"DEBUG: Question {i+1} validated successfully")
+            except Exception as e:
+                print(f"WARNING: Error validating question {i+1}: {e}, skipping")
+                continue
+        
+        # Ensure we have at least one valid question
+        if len(valid_questions) == 0:
+            # Last resort: try to extract from original response using regex
+            print(f"DEBUG: No valid questions after validation, trying last-resort extraction...")
+            try:
+                extracted_questions = extract_questions_from_text(original_response)
+                if len(extracted_questions) > 0:
+                    print(f"DEBUG: Last-resort extraction found {len(extracted_questions)} questions")
+                    valid_questions = extracted_questions
+                    parse_outcome = "last_resort"
+                else:
+                    raise ValueError(f"No valid questions found after validation. Started with {len(parsed)} questions, but all were invalid (missing fields, duplicates, or invalid answers).")
+            except Exception as e:
+                raise ValueError(f"No valid questions found after validation. Started with {len(parsed)} questions, but all were invalid (missing fields, duplicates, or invalid answers). Last-resort extraction also failed: {e}")
+        
+        # Check if we have fewer questions than requested
+        if len(valid_questions) < request.num_questions:
+            filtered_count = len(parsed) - len(valid_questions)
+            print(f"WARNING: Generated {len(valid_questions)} valid questions, but {request.num_questions} were requested.")
+            print(f"WARNING: LLM generated {len(parsed)} questions, but {filtered_count} were filtered out during validation.")
+            print(f"WARNING: This may be because:")
+            print(f"  - LLM generated fewer than {request.num_questions} questions ({len(parsed)} instead of {request.num_questions})")
+            print(f"  - {filtered_count} questions were filtered out during validation (invalid format, duplicates, missing fields, etc.)")
+            print(f"WARNING: Returning {len(valid_questions)} questions instead of {request.num_questions}")
+            
+            # If we have significantly fewer questions, try to be more lenient with validation
+            if len(valid_questions) < request.num_questions and len(parsed) >= request.num_questions:
+                print(f"INFO: Attempting to recover filtered questions with more lenient validation...")
+                # Try to recover questions that were filtered out
+                recovered = []
+                for i, q in enumerate(parsed):
+                    # Skip if already in valid_questions
+                    if any(vq.get('question', '').lower() == q.get('question', '').lower() for vq in valid_questions):
+                        continue
+                    
+                    # More lenient validation - try to fix common issues
+                    try:
+                        fixed_q = {}
+                        
+                        # Fix question field
+                        if 'question' not in q or not q.get('question'):
+                            continue  # Can't fix missing question
+                        fixed_q['question'] = str(q['question']).strip()
+                        if not fixed_q['question']:
                             continue
                         
-                        # More lenient validation - try to fix common issues
-                        try:
-                            fixed_q = {}
-                            
-                            # Fix question field
-                            if 'question' not in q or not q.get('question'):
-                                continue  # Can't fix missing question
-                            fixed_q['question'] = str(q['question']).strip()
-                            if not fixed_q['question']:
+                        # Fix options field
+                        if 'options' not in q or not isinstance(q.get('options'), list):
+                            continue  # Can't fix missing options
+                        fixed_q['options'] = [str(opt).strip() for opt in q['options'] if opt and str(opt).strip()]
+                        if len(fixed_q['options']) < 2:
+                            # Try to pad with generic options if we have at least 1
+                            if len(fixed_q['options']) == 1:
+                                fixed_q['options'].extend(['B) Option B', 'C) Option C', 'D) Option D'])
+                            else:
                                 continue
-                            
-                            # Fix options field
-                            if 'options' not in q or not isinstance(q.get('options'), list):
-                                continue  # Can't fix missing options
-                            fixed_q['options'] = [str(opt).strip() for opt in q['options'] if opt and str(opt).strip()]
-                            if len(fixed_q['options']) < 2:
-                                # Try to pad with generic options if we have at least 1
-                                if len(fixed_q['options']) == 1:
-                                    fixed_q['options'].extend(['B) Option B', 'C) Option C', 'D) Option D'])
-                                else:
-                                    continue
-                            # Ensure we have exactly 4 options
-                            while len(fixed_q['options']) < 4:
-                                letter = chr(65 + len(fixed_q['options']))
-                                fixed_q['options'].append(f"{letter}) Option {letter}")
-                            fixed_q['options'] = fixed_q['options'][:4]  # Trim to 4
-                            
-                            # Fix correct_answer field
-                            if 'correct_answer' not in q:
-                                fixed_q['correct_answer'] = 'A'  # Default to A
+                        # Ensure we have exactly 4 options
+                        while len(fixed_q['options']) < 4:
+                            letter = chr(65 + len(fixed_q['options']))
+                            fixed_q['options'].append(f"{letter}) Option {letter}")
+                        fixed_q['options'] = fixed_q['options'][:4]  # Trim to 4
+                        
+                        # Fix correct_answer field
+                        if 'correct_answer' not in q:
+                            fixed_q['correct_answer'] = 'A'  # Default to A
+                        else:
+                            correct_ans = str(q['correct_answer']).strip().upper()
+                            # Try to extract letter from various formats
+                            letter_match = re.search(r'([A-D])', correct_ans)
+                            if letter_match:
+                                fixed_q['correct_answer'] = letter_match.group(1)
                             else:
-                                correct_ans = str(q['correct_answer']).strip().upper()
-                                # Try to extract letter from various formats
-                                letter_match = re.search(r'([A-D])', correct_ans)
-                                if letter_match:
-                                    fixed_q['correct_answer'] = letter_match.group(1)
-                                else:
-                                    fixed_q['correct_answer'] = 'A'  # Default
-                            
-                            # Fix explanation field
-                            fixed_q['explanation'] = str(q.get('explanation', 'No explanation provided')).strip()
-                            
-                            recovered.append(fixed_q)
-                            print(f"INFO: Recovered question {len(valid_questions) + len(recovered)}: {fixed_q['question'][:50]}...")
-                            
-                            if len(valid_questions) + len(recovered) >= request.num_questions:
-                                break
-                        except Exception as e:
-                            print(f"DEBUG: Could not recover question {i+1}: {e}")
-                            continue
-                    
-                    if recovered:
-                        valid_questions.extend(recovered[:request.num_questions - len(valid_questions)])
-                        print(f"INFO: Recovered {len(recovered)} questions. Now have {len(valid_questions)} total questions.")
-            
-            # If we have more questions than requested, trim to requested number
-            if len(valid_questions) > request.num_questions:
-                print(f"INFO: Generated {len(valid_questions)} questions, but only {request.num_questions} were requested. Trimming to {request.num_questions}.")
-                valid_questions = valid_questions[:request.num_questions]
-            
-            # Re-serialize to ensure clean JSON
-            response = json.dumps(valid_questions, ensure_ascii=False)
-            print(f"SUCCESS: Returning {len(valid_questions)} valid quiz questions (requested {request.num_questions}, started with {len(parsed)} from LLM)")
-        except (json.JSONDecodeError, ValueError) as e:
-            # Log the original response for debugging
-            print(f"ERROR: Failed to parse quiz JSON")
-            print(f"ERROR: Original response length: {len(original_response)} chars")
-            print(f"ERROR: Original response (first 1000 chars): {original_response[:1000]}")
-            print(f"ERROR: Extracted response length: {len(response)} chars")
-            print(f"ERROR: Extracted response (first 500 chars): {response[:500]}")
-            print(f"ERROR: Parse error: {str(e)}")
-            print(f"ERROR: Error type: {type(e).__name__}")
-            
-            # Provide more helpful error message with location info
-            error_detail = f"LLM returned invalid JSON format. Error: {str(e)}. "
-            
-            # Extract line/column info from error if available
-            if hasattr(e, 'lineno') and hasattr(e, 'colno'):
-                error_detail += f"Error at line {e.lineno}, column {e.colno}. "
-                # Try to show the problematic line and surrounding context
-                try:
-                    lines = response.split('\n')
-                    if e.lineno <= len(lines):
-                        problem_line = lines[e.lineno - 1]
-                        error_detail += f"Problematic line: {problem_line[:100]}. "
-                        # Show context (previous and next lines)
-                        if e.lineno > 1:
-                            error_detail += f"Previous line: {lines[e.lineno - 2][:80]}. "
-                        if e.lineno < len(lines):
-                            error_detail += f"Next line: {lines[e.lineno][:80]}. "
+                                fixed_q['correct_answer'] = 'A'  # Default
                         
-                        # Special handling for correct_answer errors
-                        if '"correct_answer"' in problem_line:
-                            error_detail += "Detected correct_answer field issue. Attempting automatic fix... "
-                except:
-                    pass
-            
-            if "Expecting value" in str(e) or "line 1" in str(e):
-                error_detail += "The response may be empty or not start with valid JSON. "
-            elif "delimiter" in str(e) or "Expecting" in str(e):
-                error_detail += "There may be a missing comma, bracket, or quote. "
-            
-            error_detail += "Please try: 1) Regenerating the quiz, 2) Using a simpler topic, 3) Checking backend logs for the actual LLM response."
-            
-            # If JSON parsing fails, return error with helpful message
-            raise HTTPException(
-                status_code=500, 
-                detail=error_detail
-            )
+                        # Fix explanation field
+                        fixed_q['explanation'] = str(q.get('explanation', 'No explanation provided')).strip()
+                        
+                        recovered.append(fixed_q)
+                        print(f"INFO: Recovered question {len(valid_questions) + len(recovered)}: {fixed_q['question'][:50]}...")
+                        
+                        if len(valid_questions) + len(recovered) >= request.num_questions:
+                            break
+                    except Exception as e:
+                        print(f"DEBUG: Could not recover question {i+1}: {e}")
+                        continue
+                
+                if recovered:
+                    valid_questions.extend(recovered[:request.num_questions - len(valid_questions)])
+                    print(f"INFO: Recovered {len(recovered)} questions. Now have {len(valid_questions)} total questions.")
+        
+        # If we have more questions than requested, trim to requested number
+        if len(valid_questions) > request.num_questions:
+            print(f"INFO: Generated {len(valid_questions)} questions, but only {request.num_questions} were requested. Trimming to {request.num_questions}.")
+            valid_questions = valid_questions[:request.num_questions]
+        
+        metrics.QUIZ_PARSE_OUTCOMES.inc(outcome=parse_outcome)
+        metrics.record_stage("parse", time.perf_counter() - parse_start)
+        print(f"SUCCESS: Returning {len(valid_questions)} valid quiz questions (requested {request.num_questions}, started with {len(parsed)} from LLM)")
+    except (json.JSONDecodeError, ValueError) as e:
+        metrics.QUIZ_PARSE_OUTCOMES.inc(outcome="failed")
+        metrics.record_stage("parse", time.perf_counter() - parse_start)
+        # Log the original response for debugging
+        print(f"ERROR: Failed to parse quiz JSON")
+        print(f"ERROR: Original response length: {len(original_response)} chars")
+        print(f"ERROR: Original response (first 1000 chars): {original_response[:1000]}")
+        print(f"ERROR: Extracted response length: {len(response)} chars")
+        print(f"ERROR: Extracted response (first 500 chars): {response[:500]}")
+        print(f"ERROR: Parse error: {str(e)}")
+        print(f"ERROR: Error type: {type(e).__name__}")
+        
+        # Provide more helpful error message with location info
+        error_detail = f"LLM returned invalid JSON format. Error: {str(e)}. "
+        
+        # Extract line/column info from error if available
+        if hasattr(e, 'lineno') and hasattr(e, 'colno'):
+            error_detail += f"Error at line {e.lineno}, column {e.colno}. "
+            # Try to show the problematic line and surrounding context
+            try:
+                lines = response.split('\n')
+                if e.lineno <= len(lines):
+                    problem_line = lines[e.lineno - 1]
+                    error_detail += f"Problematic line: {problem_line[:100]}. "
+                    # Show context (previous and next lines)
+                    if e.lineno > 1:
+                        error_detail += f"Previous line: {lines[e.lineno - 2][:80]}. "
+                    if e.lineno < len(lines):
+                        error_detail += f"Next line: {lines[e.lineno][:80]}. "
+                    
+                    # Special handling for correct_answer errors
+                    if '"correct_answer"' in problem_line:
+                        error_detail += "Detected correct_answer field issue. Attempting automatic fix... "
+            except:
+                pass
+        
+        if "Expecting value" in str(e) or "line 1" in str(e):
+            error_detail += "The response may be empty or not start with valid JSON. "
+        elif "delimiter" in str(e) or "Expecting" in str(e):
+            error_detail += "There may be a missing comma, bracket, or quote. "
+        
+        error_detail += "Please try: 1) Regenerating the quiz, 2) Using a simpler topic, 3) Checking backend logs for the actual LLM response."
+        
+        # If JSON parsing fails, return error with helpful message
+        raise HTTPException(
+            status_code=500, 
+            detail=error_detail
+        )
+    
+    return valid_questions
+
+@app.post("/generate-quiz", response_model=QuizResponse)
+async def generate_quiz(request: QuizRequest):
+    """Generate a mini-quiz on a specific topic."""
+    try:
+        session_id, _ = await asyncio.to_thread(get_or_create_session, request.session_id)
+        
+        # Students asking for the same quiz at the same time share one generation
+        with span("get_llm"):
+            route = model_router.route("quiz", count_tokens(request.topic))
+        key = ("quiz", normalize_text(request.topic), request.num_questions, scope_key(request.scope),
+               index_version(), route.model)
+        with model_router.measure(route):
+            response = await inflight.run(key, lambda: build_quiz(request, route))
         
         # Track progress
-        session["progress"].append({
+        track_progress(session_id, {
             "timestamp": datetime.now().isoformat(),
             "activity": "quiz_generated",
             "topic": request.topic,
@@ -1018,11 +1596,44 @@ async def generate_quiz(request: QuizRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
+@app.post("/generate-quiz/batch")
+async def generate_quiz_batch(request: QuizBatchRequest):
+    """Generate a quiz per topic (e.g. a syllabus), streaming NDJSON results as each quiz finishes."""
+    check_batch_size(request.topics)
+    try:
+        session_id, _ = await asyncio.to_thread(get_or_create_session, request.session_id)
+        vectorstore = load_vector_store()
+        version = index_version()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating quizzes: {str(e)}")
+    
+    async def retrieve_chunk(topics):
+        if not vectorstore:
+            return [None] * len(topics)
+        return await asyncio.to_thread(retrieve_batch, vectorstore, topics, 3, request.scope)
+    
+    async def quiz(topic, docs):
+        item = QuizRequest(topic=topic, num_questions=request.num_questions,
+                           session_id=session_id, scope=request.scope)
+        route = model_router.route("quiz", count_tokens(topic))
+        key = ("quiz", normalize_text(topic), request.num_questions, scope_key(request.scope), version, route.model)
+        with model_router.measure(route):
+            response = await inflight.run(key, lambda: build_quiz(item, route, BATCH, docs))
+        track_progress(session_id, {
+            "timestamp": datetime.now().isoformat(),
+            "activity": "quiz_generated",
+            "topic": topic,
+            "num_questions": request.num_questions
+        })
+        return {"topic": topic, "quiz": response}
+    
+    return batch_response(request.topics, retrieve_chunk, quiz, session_id)
+
 @app.post("/generate-summary")
 async def generate_summary(request: SummaryRequest):
     """Generate an intelligent summary of a topic."""
     try:
-        session_id, session = get_or_create_session(request.session_id)
+        session_id, _ = await asyncio.to_thread(get_or_create_session, request.session_id)
         
         # Load vector store
         vectorstore = load_vector_store()
@@ -1031,7 +1642,7 @@ async def generate_summary(request: SummaryRequest):
             raise HTTPException(status_code=400, detail="No documents uploaded yet")
         
         # Get relevant documents
-        docs = vectorstore.similarity_search(request.topic, k=5)
+        docs = await retrieve(vectorstore, request.topic, 5, request.scope)
         context = "\n\n".join([doc.page_content for doc in docs])
         
         summary_prompt = f"""You are an AI mentor creating a comprehensive summary for a student.
@@ -1050,11 +1661,14 @@ async def generate_summary(request: SummaryRequest):
         Make it easy to understand and study-friendly."""
         
         # Use LangChain 1.0 style
-        llm_instance = get_llm()
-        summary = llm_instance.invoke(summary_prompt).content
+        with span("get_llm"):
+            route = model_router.route("summary", count_tokens(summary_prompt))
+            llm_instance = get_llm(route)
+        with model_router.measure(route):
+            summary = await llm_scheduler.run(generate, llm_instance, summary_prompt)
         
         # Track progress
-        session["progress"].append({
+        track_progress(session_id, {
             "timestamp": datetime.now().isoformat(),
             "activity": "summary_generated",
             "topic": request.topic
@@ -1074,7 +1688,7 @@ async def generate_summary(request: SummaryRequest):
 async def update_progress(request: ProgressUpdate):
     """Update user progress."""
     try:
-        session_id, session = get_or_create_session(request.session_id)
+        session_id, _ = await asyncio.to_thread(get_or_create_session, request.session_id)
         
         progress_entry = {
             "timestamp": datetime.now().isoformat(),
@@ -1083,8 +1697,7 @@ async def update_progress(request: ProgressUpdate):
             "score": request.score
         }
         
-        session["progress"].append(progress_entry)
-        save_session_to_disk(session_id, session)
+        track_progress(session_id, progress_entry)
         
         return {
             "message": "Progress updated",
@@ -1095,92 +1708,54 @@ async def update_progress(request: ProgressUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating progress: {str(e)}")
 
-@app.get("/session/{session_id}")
+@app.get("/session/{session_id}", response_model=SessionResponse)
 async def get_session(session_id: str):
     """Get session information and progress."""
-    if session_id not in sessions:
-        # Try to load from disk
-        session_data = load_session_from_disk(session_id)
-        if not session_data:
-            raise HTTPException(status_code=404, detail="Session not found")
-        # Restore to memory sessions
-        sessions[session_id] = {
-            "memory": session_data.get("memory", ChatMessageHistory()),
-            "created_at": session_data["created_at"],
-            "progress": session_data.get("progress", [])
-        }
-        session = sessions[session_id]
-    else:
-        session = sessions[session_id]
+    session = await asyncio.to_thread(get_session_store().get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     
-    # Extract chat messages
-    chat_messages = []
-    if session.get("memory"):
-        for message in session["memory"].messages:
-            chat_messages.append({
-                "role": "user" if message.__class__.__name__ == "HumanMessage" else "assistant",
-                "content": message.content,
-                "timestamp": getattr(message, "timestamp", datetime.now().isoformat())
-            })
+    # Recent activity only - the full breakdown is /progress/{session_id}/summary
+    await get_progress_writer().flush()
+    progress_store = get_progress_store()
+    total_activities = (await asyncio.to_thread(progress_store.total_activities, [session_id])).get(session_id, 0)
     
-    return {
+    # Already plain JSON: serialize directly rather than validating every message
+    return FastJSONResponse({
         "session_id": session_id,
-        "created_at": session["created_at"],
-        "progress": session["progress"],
-        "total_activities": len(session["progress"]),
-        "chat_messages": chat_messages
-    }
+        "created_at": session.created_at,
+        "progress": session.progress + await asyncio.to_thread(progress_store.recent, session_id),
+        "total_activities": len(session.progress) + total_activities,
+        "chat_messages": session.chat_history
+    })
+
+@app.get("/progress/{session_id}/summary")
+async def get_progress_summary(session_id: str):
+    """Progress rollups of a session: activity counts, scores per topic, recent activity."""
+    await get_progress_writer().flush()
+    return await asyncio.to_thread(get_progress_store().summary, session_id)
 
-@app.get("/sessions")
+@app.get("/sessions", response_model=SessionsResponse)
 async def list_sessions():
-    """List all sessions (active and from disk)."""
-    # Get all session files from disk
-    session_files = list(SESSIONS_DIR.glob("*.json"))
-    all_sessions = []
+    """List all sessions (newest first)."""
+    all_sessions = await asyncio.to_thread(get_session_store().list)
+    await get_progress_writer().flush()
+    activity_counts = await asyncio.to_thread(get_progress_store().total_activities)
+    for summary in all_sessions:
+        summary["activity_count"] += activity_counts.get(summary["session_id"], 0)
     
-    # Add active sessions
-    for session_id in sessions.keys():
-        session = sessions[session_id]
-        all_sessions.append({
-            "session_id": session_id,
-            "created_at": session["created_at"],
-            "message_count": len(session.get("memory", ChatMessageHistory()).messages) if session.get("memory") else 0,
-            "activity_count": len(session.get("progress", []))
-        })
-    
-    # Add sessions from disk that aren't in memory
-    for session_file in session_files:
-        session_id = session_file.stem
-        if session_id not in sessions:
-            try:
-                with open(session_file, "r") as f:
-                    data = json.load(f)
-                    all_sessions.append({
-                        "session_id": session_id,
-                        "created_at": data.get("created_at", ""),
-                        "message_count": len(data.get("chat_history", [])),
-                        "activity_count": len(data.get("progress", []))
-                    })
-            except:
-                continue
-    
-    # Sort by created_at (newest first)
-    all_sessions.sort(key=lambda x: x["created_at"], reverse=True)
-    
-    return {
+    return FastJSONResponse({
         "sessions": all_sessions,
         "total": len(all_sessions)
-    }
+    })
 
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session."""
-    if session_id in sessions:
-        del sessions[session_id]
-    
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    if session_file.exists():
-        session_file.unlink()
+    await asyncio.to_thread(get_session_store().delete, session_id)
+    # Through the writer, so entries still queued for the session aren't flushed back in
+    await get_progress_writer().delete(session_id)
+    session_contexts.drop(session_id)
     
     return {"message": "Session deleted", "session_id": session_id}
 
@@ -0,0 +1,72 @@
+# backend/batch.py
+"""
+Pipelined processing for the batch endpoints (/query/batch, /generate-quiz/batch).
+
+Items are retrieved a chunk at a time - one embedding call and one FAISS
+search per chunk (index_store.similarity_search_batch) - and each item's
+generation starts as soon as its chunk is retrieved, so the next chunk
+is retrieved while earlier generations run. Generations are limited by
+the LLM scheduler, not here. Results come back in completion order, with
+the item's index; one item failing doesn't stop the others.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from backend import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Items retrieved per embedding call / FAISS search
+RETRIEVAL_CHUNK = 32
+
+BATCH_ITEMS = metrics.Counter("batch_items_total", "Batch items processed", ("endpoint", "outcome"))
+BATCH_SIZE = metrics.Histogram(
+    "batch_request_items", "Items per batch request", ("endpoint",), buckets=(1, 5, 10, 25, 50, 100, 250, 500))
+
+
+async def pipelined(items: Sequence[T],
+                    retrieve_chunk: Callable[[List[T]], Awaitable[list]],
+                    process: Callable[[T, object], Awaitable[R]],
+                    chunk_size: int = RETRIEVAL_CHUNK) -> AsyncIterator[Tuple[int, Optional[R], Optional[Exception]]]:
+    """Yield (index, result, error) for every item as it finishes.
+
+    retrieve_chunk(items) returns one retrieval result per item; process(item, retrieved)
+    does the rest. Leaving the loop early cancels the outstanding work.
+    """
+    endpoint = metrics.current_endpoint()
+    BATCH_SIZE.observe(len(items), endpoint=endpoint)
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+
+    async def run(index: int, item: T, retrieved):
+        try:
+            finished.put_nowait((index, await process(item, retrieved), None))
+        except Exception as e:
+            finished.put_nowait((index, None, e))
+
+    async def feed():
+        for start in range(0, len(items), chunk_size):
+            chunk = list(items[start:start + chunk_size])
+            try:
+                retrieved = await retrieve_chunk(chunk)
+            except Exception as e:
+                for offset in range(len(chunk)):
+                    finished.put_nowait((start + offset, None, e))
+                continue
+            for offset, (item, result) in enumerate(zip(chunk, retrieved)):
+                task = asyncio.create_task(run(start + offset, item, result))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        for _ in range(len(items)):
+            index, result, error = await finished.get()
+            BATCH_ITEMS.inc(endpoint=endpoint, outcome="failed" if error else "ok")
+            yield index, result, error
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
@@ -0,0 +1,130 @@
+# backend/benchmarks/corpus.py
+"""
+Synthetic, reproducible course material for benchmarks.
+
+Documents are lecture-note style text (chapters, numbered sections,
+paragraphs) generated from a seed and written as real PDFs, so uploads
+exercise the same PyPDF2 -> chunker -> embedding path as user files.
+"""
+
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+TOPICS = [
+    "gradient descent", "neural networks", "decision trees", "linear regression",
+    "probability distributions", "dynamic programming", "graph algorithms", "hash tables",
+    "operating systems", "database indexing", "computer networks", "cryptography",
+    "thermodynamics", "organic chemistry", "cell biology", "macroeconomics",
+]
+
+_VOCABULARY = (
+    "analysis approach assumption behaviour bound case complexity concept condition constraint "
+    "data definition derivation distribution effect error estimate example experiment function "
+    "hypothesis input iteration limit method model observation optimum output parameter principle "
+    "problem process property proof rate relation result sample solution structure system theorem "
+    "theory value variable variance"
+).split()
+
+_LINES_PER_PAGE = 46
+_CHARS_PER_LINE = 90
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 18))]
+    words.insert(rng.randrange(len(words)), topic)
+    return " ".join(words).capitalize() + "."
+
+
+def document_pages(doc_index: int, pages: int, seed: int = 0) -> List[List[str]]:
+    """Lines of text for each page of one synthetic document."""
+    rng = random.Random(seed * 7919 + doc_index)
+    topic = TOPICS[doc_index % len(TOPICS)]
+    lines: List[str] = []
+    section = 0
+    while len(lines) < pages * _LINES_PER_PAGE:
+        if section % 4 == 0:
+            lines.append(f"CHAPTER {section // 4 + 1}")
+        section += 1
+        lines.append(f"{section // 4 + 1}.{section % 4 + 1} {topic.title()} part {section}")
+        for _ in range(rng.randint(2, 4)):
+            paragraph = " ".join(_sentence(rng, topic) for _ in range(rng.randint(3, 6)))
+            # Wrap like a typeset page
+            line = ""
+            for word in paragraph.split():
+                if len(line) + len(word) + 1 > _CHARS_PER_LINE:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}" if line else word
+            lines.append(line)
+            lines.append("")
+    return [lines[i:i + _LINES_PER_PAGE] for i in range(0, pages * _LINES_PER_PAGE, _LINES_PER_PAGE)]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(pages: List[List[str]], path) -> Path:
+    """Write a minimal text-only PDF (Helvetica, one text object per page)."""
+    path = Path(path)
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 13 TL 50 760 Td\n" + "".join(f"({_pdf_escape(l)}) ' \n" for l in lines) + "ET"
+        data = stream.encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    kids = " ".join(f"{p} 0 R" for p in page_ids).encode()
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    path.write_bytes(bytes(out))
+    return path
+
+
+def build_corpus(out_dir, documents: int, pages: int, seed: int = 0) -> List[Path]:
+    """Write `documents` synthetic PDFs of `pages` pages each."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return [
+        write_pdf(document_pages(i, pages, seed), out_dir / f"synthetic_{seed}_{i:03d}.pdf")
+        for i in range(documents)
+    ]
+
+
+def questions(count: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(query, topic) pairs spread over the corpus topics."""
+    rng = random.Random(seed)
+    templates = [
+        "What is {t}?", "Explain {t} with an example.", "How does {t} work?",
+        "What are the main assumptions behind {t}?", "Compare {t} with {u}.",
+    ]
+    pairs = []
+    for _ in range(count):
+        topic = rng.choice(TOPICS)
+        query = rng.choice(templates).format(t=topic, u=rng.choice(TOPICS))
+        pairs.append((query, topic))
+    return pairs
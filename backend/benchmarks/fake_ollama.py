@@ -0,0 +1,340 @@
+# backend/benchmarks/fake_ollama.py
+"""
+Deterministic stand-in for the Ollama HTTP API, for benchmarks.
+
+Implements the endpoints the backend uses (/api/tags, /api/ps,
+/api/chat, /api/generate) with a simple cost model:
+
+    time to first token = [cold load] + load + prompt_tokens / prompt_rate
+    decode              = completion_tokens / tokens_per_second
+
+where the cold load is paid once by whichever request (or empty-prompt
+preload) first uses the model after start-up or an unload (keep_alive 0),
+and at most `parallel` generations at a time (like OLLAMA_NUM_PARALLEL),
+so queueing shows up under load. Quiz prompts get canned quiz JSON; a
+configurable share of them is malformed the ways real models get it wrong.
+
+Run on its own with:
+
+    python backend/benchmarks/fake_ollama.py --port 11435 --tokens-per-second 40
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+MODEL_NAME = "llama3.2:1b"
+
+_WORDS = (
+    "the model learns a function from data by minimising a loss over examples while gradient "
+    "descent updates each parameter in the direction that reduces the error on the training set"
+).split()
+
+_QUIZ_RE = re.compile(r"Generate EXACTLY (\d+) multiple-choice questions about: ([^\n]*)")
+
+
+@dataclass
+class FakeOllamaConfig:
+    load_seconds: float = 0.0           # model load / queue-independent overhead per request
+    cold_load_seconds: float = 0.0      # loading a model that isn't resident
+    prompt_rate: float = 2000.0         # prompt tokens evaluated per second
+    tokens_per_second: float = 50.0     # decode speed
+    response_tokens: int = 120          # length of non-quiz answers
+    parallel: int = 1                   # concurrent generations (OLLAMA_NUM_PARALLEL)
+    malformed_quiz_rate: float = 0.0    # share of quiz responses with broken JSON
+    seed: int = 0
+
+
+def _count_tokens(text: str) -> int:
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _quiz_questions(topic: str, count: int, rng: random.Random) -> List[dict]:
+    questions = []
+    for i in range(count):
+        answer = rng.choice("ABCD")
+        questions.append({
+            "question": f"Question {i + 1} about {topic}: which statement is correct?",
+            "options": [f"{letter}) Statement {letter} about {topic}" for letter in "ABCD"],
+            "correct_answer": answer,
+            "explanation": f"Statement {answer} matches the course material.",
+        })
+    return questions
+
+
+def _malform(text: str, rng: random.Random) -> str:
+    """Break quiz JSON the ways local models do (all but the last are recoverable by the backend)."""
+    kind = rng.choice(["fence", "trailing_comma", "missing_comma", "unterminated_answer", "preamble", "truncated"])
+    if kind == "fence":
+        return f"```json\n{text}\n```"
+    if kind == "trailing_comma":
+        return text[:-1] + ",]"
+    if kind == "missing_comma":
+        return text.replace("}, {", "} {")
+    if kind == "unterminated_answer":
+        return re.sub(r'"correct_answer": "([A-D])"', r'"correct_answer": "\1', text, count=1)
+    if kind == "preamble":
+        return "Sure! Here is your quiz:\n" + text
+    return text[: len(text) // 2]
+
+
+class FakeOllama:
+    """Response generator and cost model shared by all request threads."""
+
+    def __init__(self, config: FakeOllamaConfig):
+        self.config = config
+        self._slots = threading.Semaphore(max(1, config.parallel))
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._loaded = set()
+        self._load_lock = threading.Lock()
+
+    def ensure_loaded(self, model: str) -> float:
+        """Load a model if it isn't resident; returns the seconds spent loading."""
+        with self._load_lock:
+            if model in self._loaded:
+                return 0.0
+            time.sleep(self.config.cold_load_seconds)
+            self._loaded.add(model)
+            return self.config.cold_load_seconds
+
+    def unload(self, model: str):
+        with self._load_lock:
+            self._loaded.discard(model)
+
+    def loaded_models(self) -> List[str]:
+        with self._load_lock:
+            return sorted(self._loaded)
+
+    def _next_rng(self) -> random.Random:
+        with self._lock:
+            self._requests += 1
+            return random.Random(self.config.seed * 1_000_003 + self._requests)
+
+    def respond(self, prompt: str) -> str:
+        rng = self._next_rng()
+        quiz = _QUIZ_RE.search(prompt)
+        if quiz:
+            text = json.dumps(_quiz_questions(quiz.group(2).strip(), int(quiz.group(1)), rng), indent=2)
+            text = text.replace("},\n  {", "}, {")
+            if rng.random() < self.config.malformed_quiz_rate:
+                text = _malform(text, rng)
+            return text
+        return " ".join(rng.choice(_WORDS) for _ in range(self.config.response_tokens)) + "."
+
+    def generate(self, prompt: str, model: str = MODEL_NAME, system: str = "",
+                 context: Optional[List[int]] = None) -> Iterator[dict]:
+        """Yield streamed pieces ({"content"}) and finally the timing stats Ollama reports.
+
+        With a `context` from an earlier reply only the new prompt is evaluated
+        (its tokens are still in the KV cache), unless the model had to be loaded.
+        """
+        text = self.respond(prompt)
+        pieces = re.findall(r"\S+\s*", text) or [""]
+        context = context or []
+        new_tokens = _count_tokens(prompt) + (0 if context else _count_tokens(system))
+        start = time.perf_counter()
+        with self._slots:
+            cold = self.ensure_loaded(model)
+            prompt_tokens = new_tokens + (len(context) if cold else 0)
+            prompt_seconds = self.config.load_seconds + prompt_tokens / self.config.prompt_rate
+            time.sleep(prompt_seconds)
+            decode_start = time.perf_counter()
+            per_piece = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0
+            for i, piece in enumerate(pieces):
+                # Sleep against the schedule rather than per piece so timing doesn't drift
+                delay = decode_start + i * per_piece - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                yield {"content": piece}
+            eval_seconds = time.perf_counter() - decode_start
+        yield {
+            "done": True,
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "load_duration": int((cold + self.config.load_seconds) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": len(pieces),
+            "eval_duration": int(eval_seconds * 1e9),
+            # Conversation so far as (fake) token ids: earlier context, this prompt, this answer
+            "context": context + [0] * (new_tokens + len(pieces)),
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _make_handler(fake: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{
+                    "name": MODEL_NAME, "model": MODEL_NAME, "modified_at": _now(),
+                    "size": 1_300_000_000, "digest": "fake",
+                    "details": {"family": "llama", "parameter_size": "1B", "quantization_level": "Q8_0"},
+                }]})
+            elif self.path == "/api/ps":
+                self._send_json({"models": [{"name": m, "model": m} for m in fake.loaded_models()]})
+            elif self.path in ("/", "/api/version"):
+                self._send_json({"version": "0.0.0-fake"})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path not in ("/api/chat", "/api/generate"):
+                self._send_json({"error": "not found"}, 404)
+                return
+            request = self._read_json()
+            chat = self.path == "/api/chat"
+            system, context = "", None
+            if chat:
+                prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+            else:
+                prompt = request.get("prompt", "")
+                system, context = request.get("system", ""), request.get("context")
+            model = request.get("model", MODEL_NAME)
+
+            def wrap(piece: dict) -> dict:
+                content = piece.pop("content", "")
+                message = {"model": model, "created_at": _now(), "done": False}
+                if chat:
+                    piece.pop("context", None)  # /api/chat doesn't return a context
+                    message["message"] = {"role": "assistant", "content": content}
+                else:
+                    message["response"] = content
+                message.update(piece)
+                if piece.get("done"):
+                    message["done_reason"] = "stop"
+                return message
+
+            if not prompt and not chat:
+                # An empty generate request just loads (or, with keep_alive 0, unloads) the model
+                if request.get("keep_alive") == 0:
+                    fake.unload(model)
+                    reason = "unload"
+                else:
+                    fake.ensure_loaded(model)
+                    reason = "load"
+                self._send_json({"model": model, "created_at": _now(), "response": "", "done": True,
+                                 "done_reason": reason})
+                return
+
+            if request.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in fake.generate(prompt, model, system, context):
+                    line = json.dumps(wrap(piece)).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                text, stats = "", {}
+                for piece in fake.generate(prompt, model, system, context):
+                    text += piece.get("content", "")
+                    if piece.get("done"):
+                        stats = piece
+                stats["content"] = text
+                self._send_json(wrap(stats))
+
+    return Handler
+
+
+class FakeOllamaServer:
+    """Fake Ollama served from a background thread (port 0 picks a free port)."""
+
+    def __init__(self, config: Optional[FakeOllamaConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.fake = FakeOllama(config or FakeOllamaConfig())
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self.fake))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Cost-model options shared by the benchmark and load-test CLIs."""
+    defaults = FakeOllamaConfig()
+    parser.add_argument("--load-seconds", type=float, default=defaults.load_seconds)
+    parser.add_argument("--cold-load-seconds", type=float, default=defaults.cold_load_seconds,
+                        help="one-off load time of a model that isn't resident")
+    parser.add_argument("--prompt-rate", type=float, default=defaults.prompt_rate,
+                        help="prompt tokens evaluated per second")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--response-tokens", type=int, default=defaults.response_tokens)
+    parser.add_argument("--parallel", type=int, default=defaults.parallel,
+                        help="concurrent generations, like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--malformed-quiz-rate", type=float, default=defaults.malformed_quiz_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        load_seconds=args.load_seconds,
+        cold_load_seconds=args.cold_load_seconds,
+        prompt_rate=args.prompt_rate,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        parallel=args.parallel,
+        malformed_quiz_rate=args.malformed_quiz_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(config_from_args(args), args.host, args.port)
+    print(f"🤖 Fake Ollama listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
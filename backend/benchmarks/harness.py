@@ -0,0 +1,289 @@
+# backend/benchmarks/harness.py
+"""
+Shared plumbing for the benchmark and load-test tools: start the backend
+against a fake Ollama in a scratch directory, fire requests, summarise
+latencies and save/compare JSON results.
+"""
+
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """The FastAPI backend under uvicorn in a subprocess, with its own data directories."""
+
+    def __init__(self, ollama_url: str, workers: int = 1, port: Optional[int] = None,
+                 env: Optional[Dict[str, str]] = None, keep_data: bool = False):
+        self.port = port or free_port()
+        self.workers = workers
+        self.ollama_url = ollama_url
+        self.extra_env = env or {}
+        self.keep_data = keep_data
+        self._tmp = None
+        self._proc = None
+        self.data_root: Optional[Path] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 120.0) -> "AppServer":
+        self._tmp = tempfile.TemporaryDirectory(prefix="ai-mentor-bench-")
+        self.data_root = Path(self._tmp.name)
+        env = dict(os.environ)
+        env.update({
+            "OLLAMA_BASE_URL": self.ollama_url,
+            "DATA_DIR": str(self.data_root / "data"),
+            "SESSIONS_DIR": str(self.data_root / "sessions"),
+            "PROGRESS_DIR": str(self.data_root / "progress"),
+            "PYTHONUNBUFFERED": "1",
+        })
+        env.update(self.extra_env)
+        self._log = open(self.data_root / "server.log", "w")
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f"Backend exited with {self._proc.returncode}, see {self.data_root / 'server.log'}")
+            try:
+                # /ready turns 200 once startup warm-up (embeddings, index) is done
+                if requests.get(f"{self.url}/ready", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        self.stop()
+        raise TimeoutError(f"Backend was not ready within {timeout}s")
+
+    def stop(self):
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._tmp is not None:
+            self._log.close()
+            if not self.keep_data:
+                self._tmp.cleanup()
+            self._tmp = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+@dataclass
+class Sample:
+    """Outcome of one request."""
+    name: str
+    start: float
+    latency: float
+    status: int            # HTTP status, 0 for a connection error, -1 for a client timeout
+    error: Optional[str] = None
+    expected: bool = False  # a non-2xx status the client treats as normal (e.g. 404 for a new session)
+    bytes: Optional[int] = None       # response body size on the wire (compressed, if it was)
+    encoding: Optional[str] = None    # Content-Encoding of the response
+
+    @property
+    def ok(self) -> bool:
+        return self.expected or 200 <= self.status < 300
+
+
+def wire_size(response: requests.Response) -> Tuple[int, Optional[str]]:
+    """(bytes on the wire, content encoding) - requests decompresses, so prefer Content-Length."""
+    length = response.headers.get("Content-Length")
+    return (int(length) if length else len(response.content)), response.headers.get("Content-Encoding")
+
+
+def summarize(samples: List[Sample], wall_seconds: Optional[float] = None) -> dict:
+    """Latency percentiles (ms), throughput, error/timeout rates and response sizes."""
+    latencies = sorted(s.latency for s in samples if s.ok)
+    sizes = sorted(s.bytes for s in samples if s.ok and s.bytes is not None)
+    if wall_seconds is None and samples:
+        wall_seconds = max(s.start + s.latency for s in samples) - min(s.start for s in samples)
+    count = len(samples)
+    errors = [s for s in samples if not s.ok]
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "requests": count,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "timeouts": sum(1 for s in errors if s.status == -1),
+        "error_rate": round(len(errors) / count, 4) if count else 0.0,
+        "requests_per_second": round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "response_bytes": {
+            "mean": round(sum(sizes) / len(sizes)) if sizes else None,
+            "p95": round(percentile(sizes, 95)) if sizes else None,
+            "max": sizes[-1] if sizes else None,
+        },
+        "encodings": _count_by([s for s in samples if s.ok], lambda s: s.encoding or "identity"),
+        "status_codes": _count_by(samples, lambda s: str(s.status)),
+        "sample_errors": sorted({s.error for s in errors if s.error})[:5],
+    }
+
+
+def _count_by(samples: List[Sample], key: Callable[[Sample], str]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for s in samples:
+        counts[key(s)] = counts.get(key(s), 0) + 1
+    return counts
+
+
+def timed_request(session: requests.Session, name: str, method: str, url: str,
+                  timeout: float = 120.0, **kwargs) -> Sample:
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+        error = None if response.ok else response.text[:200]
+        size, encoding = wire_size(response)
+        return Sample(name, start, time.perf_counter() - start, response.status_code, error,
+                      bytes=size, encoding=encoding)
+    except requests.Timeout:
+        return Sample(name, start, time.perf_counter() - start, -1, "client timeout")
+    except requests.RequestException as e:
+        return Sample(name, start, time.perf_counter() - start, 0, type(e).__name__)
+
+
+def run_closed_loop(calls: List[Callable[[requests.Session], Sample]], concurrency: int):
+    """Run calls with `concurrency` clients, each sending its next request as soon as the last returns.
+
+    Returns (samples, wall_seconds).
+    """
+    local = threading.local()
+
+    def run(call):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return call(local.session)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(run, calls))
+    return samples, time.perf_counter() - start
+
+
+def scrape_counters(base_url: str, names: List[str]) -> Dict[str, float]:
+    """Read counter samples (e.g. quiz_parse_outcomes_total{...}) from /metrics."""
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    values = {}
+    for line in text.splitlines():
+        if line.startswith(tuple(names)):
+            key, _, value = line.rpartition(" ")
+            values[key] = float(value)
+    return values
+
+
+def scrape_stages(base_url: str, stages: List[str]) -> Dict[str, Dict[str, dict]]:
+    """Mean time (ms) and count of request stages (e.g. serialize, compress) per endpoint, from /metrics."""
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for line in text.splitlines():
+        if not line.startswith(("stage_duration_seconds_sum{", "stage_duration_seconds_count{")):
+            continue
+        key, _, value = line.rpartition(" ")
+        labels = dict(part.split("=", 1) for part in key[key.index("{") + 1:-1].split(","))
+        endpoint, stage = labels.get("endpoint", "").strip('"'), labels.get("stage", "").strip('"')
+        if stage in stages:
+            field = "sum" if key.startswith("stage_duration_seconds_sum") else "count"
+            totals.setdefault((endpoint, stage), {})[field] = float(value)
+    result: Dict[str, Dict[str, dict]] = {}
+    for (endpoint, stage), values in sorted(totals.items()):
+        count = values.get("count", 0)
+        result.setdefault(endpoint, {})[stage] = {
+            "count": int(count),
+            "mean_ms": round(values.get("sum", 0) / count * 1000, 3) if count else None,
+        }
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: dict, path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = {"commit": git_commit(), "timestamp": datetime.now().isoformat(), **results}
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.10) -> List[str]:
+    """Human-readable p50/p95/p99 and throughput changes; regressions beyond threshold are flagged."""
+    lines = []
+    for name, stats in current.get("results", {}).items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"].get(metric), stats["latency_ms"].get(metric)
+            if old and new:
+                change = (new - old) / old
+                flag = "  ⚠️ regression" if change > threshold else ""
+                lines.append(f"{name:22s} {metric}: {old:10.1f} -> {new:10.1f} ms ({change:+.1%}){flag}")
+        old, new = before.get("requests_per_second"), stats.get("requests_per_second")
+        if old and new:
+            change = (new - old) / old
+            flag = "  ⚠️ regression" if change < -threshold else ""
+            lines.append(f"{name:22s} rps: {old:10.2f} -> {new:10.2f}    ({change:+.1%}){flag}")
+        old, new = before.get("response_bytes", {}).get("mean"), stats.get("response_bytes", {}).get("mean")
+        if old and new:
+            lines.append(f"{name:22s} size: {old:9d} -> {new:9d} B  ({(new - old) / old:+.1%})")
+    return lines
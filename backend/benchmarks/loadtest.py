@@ -0,0 +1,348 @@
+# backend/benchmarks/loadtest.py
+"""
+Concurrent-user load generator that replays student sessions the way the
+React frontend drives the API.
+
+Every virtual student:
+  * polls GET / every 15s while the app is open (App.jsx status check, 3s timeout);
+  * loads GET /session/{id} when the chat mounts (ChatBox.jsx);
+  * then performs actions picked from the user mix, with think time between them:
+      chat     POST /query                                      (100s client timeout)
+      quiz     POST /generate-quiz, answer, POST /progress     (100s client timeout)
+      summary  POST /generate-summary
+      progress GET /session/{id}                                (ProgressTracker.jsx)
+      history  GET /sessions + GET /session/{id} for every row  (SessionHistory.jsx N+1)
+      upload   POST /upload-pdf                                 (FileUpload.jsx)
+
+Students arrive as a Poisson process. Each --rates step runs for --duration
+seconds so the arrival rate where latency or errors blow up (the saturation
+point) can be read off the report. --time-scale compresses think times and
+the poll interval to shorten runs.
+
+    python backend/benchmarks/loadtest.py --rates 0.5 1 2 4 --duration 60 --time-scale 0.2
+    python backend/benchmarks/loadtest.py --url http://localhost:8000 --rates 1   # existing backend
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+if __name__ == "__main__":
+    # Allow running as `python backend/benchmarks/loadtest.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import requests
+
+from backend.benchmarks import fake_ollama
+from backend.benchmarks.corpus import build_corpus, questions, TOPICS
+from backend.benchmarks.harness import AppServer, Sample, compare_results, save_results, summarize, wire_size
+
+DEFAULT_MIX = {"chat": 0.55, "quiz": 0.2, "summary": 0.1, "progress": 0.08, "history": 0.06, "upload": 0.01}
+
+# Client-side timeouts used by the frontend
+POLL_TIMEOUT = 3.0
+LLM_TIMEOUT = 100.0
+DEFAULT_TIMEOUT = 30.0
+
+
+@dataclass
+class LoadProfile:
+    rate: float                         # students arriving per second
+    duration: float                     # seconds of arrivals
+    mix: Dict[str, float]
+    actions_per_session: float = 6.0    # mean, geometric
+    think_seconds: float = 20.0         # mean, exponential
+    quiz_answer_seconds: float = 60.0
+    poll_interval: float = 15.0
+    time_scale: float = 1.0
+    seed: int = 0
+
+
+class Recorder:
+    """Thread-safe sample sink."""
+
+    def __init__(self):
+        self.samples: List[Sample] = []
+        self._lock = threading.Lock()
+
+    def add(self, sample: Sample):
+        with self._lock:
+            self.samples.append(sample)
+
+
+class Student:
+    """One browser tab: a background health poll plus a scripted sequence of actions."""
+
+    def __init__(self, base_url: str, profile: LoadProfile, recorder: Recorder, rng: random.Random,
+                 upload_pdfs: List[Path]):
+        self.base_url = base_url
+        self.profile = profile
+        self.recorder = recorder
+        self.rng = rng
+        self.upload_pdfs = upload_pdfs
+        self.session = requests.Session()
+        self.session_id = f"session_{int(time.time() * 1000)}_{rng.getrandbits(40):x}"
+        self.topic = rng.choice(TOPICS)
+        self._closed = threading.Event()
+
+    def _request(self, name: str, method: str, path: str, timeout: float, session=None,
+                 accept_404: bool = False, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = (session or self.session).request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+            expected = accept_404 and response.status_code == 404
+            size, encoding = wire_size(response)
+            sample = Sample(name, start, time.perf_counter() - start, response.status_code,
+                            None if response.status_code < 400 or expected else response.text[:200], expected,
+                            size, encoding)
+        except requests.Timeout:
+            response, sample = None, Sample(name, start, time.perf_counter() - start, -1, "client timeout")
+        except requests.RequestException as e:
+            response, sample = None, Sample(name, start, time.perf_counter() - start, 0, type(e).__name__)
+        self.recorder.add(sample)
+        return response
+
+    def _sleep(self, seconds: float):
+        self._closed.wait(seconds * self.profile.time_scale)
+
+    def _think(self):
+        self._sleep(self.rng.expovariate(1.0 / self.profile.think_seconds))
+
+    def _poll(self):
+        # Separate connection - the browser polls while a query is in flight
+        poll_session = requests.Session()
+        while not self._closed.is_set():
+            self._request("GET /", "GET", "/", POLL_TIMEOUT, session=poll_session)
+            self._sleep(self.profile.poll_interval)
+
+    # --- actions ---------------------------------------------------------
+
+    def chat(self):
+        query, _ = questions(1, seed=self.rng.getrandbits(32))[0]
+        self._request("POST /query", "POST", "/query", LLM_TIMEOUT,
+                      json={"query": query, "session_id": self.session_id})
+
+    def quiz(self):
+        response = self._request("POST /generate-quiz", "POST", "/generate-quiz", LLM_TIMEOUT,
+                                 json={"topic": self.topic, "num_questions": 5, "session_id": self.session_id})
+        if response is None or not response.ok:
+            return
+        self._sleep(self.rng.expovariate(1.0 / self.profile.quiz_answer_seconds))
+        self._request("POST /progress", "POST", "/progress", DEFAULT_TIMEOUT, json={
+            "session_id": self.session_id, "topic": self.topic,
+            "score": self.rng.choice([0, 20, 40, 60, 80, 100]), "activity": "quiz_completed",
+        })
+
+    def summary(self):
+        self._request("POST /generate-summary", "POST", "/generate-summary", LLM_TIMEOUT,
+                      json={"topic": self.topic, "session_id": self.session_id})
+
+    def progress(self):
+        # 404 until the session's first activity has been saved
+        self._request("GET /session/{id}", "GET", f"/session/{self.session_id}", DEFAULT_TIMEOUT, accept_404=True)
+
+    def history(self):
+        response = self._request("GET /sessions", "GET", "/sessions", DEFAULT_TIMEOUT)
+        if response is None or not response.ok:
+            return
+        # SessionHistory.jsx fetches every listed session to find its title (in parallel)
+        sessions = response.json().get("sessions", [])
+        threads = [
+            threading.Thread(target=self._request, args=(
+                "GET /session/{id} (history)", "GET", f"/session/{s['session_id']}", DEFAULT_TIMEOUT,
+                requests.Session()))
+            for s in sessions
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def upload(self):
+        if not self.upload_pdfs:
+            return
+        path = self.rng.choice(self.upload_pdfs)
+        with open(path, "rb") as f:
+            self._request("POST /upload-pdf", "POST", "/upload-pdf", 600.0,
+                          files={"file": (path.name, f, "application/pdf")})
+
+    def run(self):
+        poller = threading.Thread(target=self._poll, daemon=True)
+        poller.start()
+        try:
+            self._request("GET /session/{id}", "GET", f"/session/{self.session_id}", DEFAULT_TIMEOUT, accept_404=True)
+            actions, weights = zip(*self.profile.mix.items())
+            # Geometric number of actions with the configured mean (at least one)
+            keep_going = 1 - 1 / max(self.profile.actions_per_session, 1)
+            while True:
+                getattr(self, self.rng.choices(actions, weights)[0])()
+                if self.rng.random() >= keep_going:
+                    break
+                self._think()
+        finally:
+            self._closed.set()
+            poller.join()
+
+
+def run_step(base_url: str, profile: LoadProfile, upload_pdfs: List[Path], drain_timeout: float) -> dict:
+    """Run one arrival-rate step and summarise it."""
+    recorder = Recorder()
+    rng = random.Random(profile.seed)
+    students: List[threading.Thread] = []
+    start = time.perf_counter()
+    next_arrival = rng.expovariate(profile.rate)
+    while next_arrival < profile.duration:
+        delay = start + next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        student = Student(base_url, profile, recorder, random.Random(rng.getrandbits(64)), upload_pdfs)
+        thread = threading.Thread(target=student.run, daemon=True)
+        thread.start()
+        students.append(thread)
+        next_arrival += rng.expovariate(profile.rate)
+
+    deadline = time.perf_counter() + drain_timeout
+    for thread in students:
+        thread.join(max(0.0, deadline - time.perf_counter()))
+    unfinished = sum(t.is_alive() for t in students)
+    wall = time.perf_counter() - start
+
+    by_name: Dict[str, List[Sample]] = {}
+    for s in recorder.samples:
+        by_name.setdefault(s.name, []).append(s)
+    llm_samples = [s for s in recorder.samples if s.name in
+                   ("POST /query", "POST /generate-quiz", "POST /generate-summary")]
+    return {
+        "arrival_rate": profile.rate,
+        "students": len(students),
+        "unfinished_students": unfinished,
+        "wall_seconds": round(wall, 2),
+        "overall": summarize(recorder.samples, wall),
+        "llm": summarize(llm_samples, wall),
+        "results": {name: summarize(samples, wall) for name, samples in sorted(by_name.items())},
+    }
+
+
+def find_saturation(steps: List[dict], p95_slo_ms: float, max_error_rate: float) -> Optional[float]:
+    """First arrival rate whose LLM p95 or error rate breaks the limits."""
+    for step in steps:
+        llm = step["llm"]
+        p95 = llm["latency_ms"]["p95"]
+        if llm["error_rate"] > max_error_rate or (p95 is not None and p95 > p95_slo_ms) or step["unfinished_students"]:
+            return step["arrival_rate"]
+    return None
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unknown action {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def run_load_test(args) -> dict:
+    mix = parse_mix(args.mix)
+    steps = []
+    with tempfile.TemporaryDirectory(prefix="ai-mentor-load-") as corpus_dir:
+        corpus = build_corpus(corpus_dir, args.documents, args.pages, seed=args.seed)
+        upload_pdfs = build_corpus(Path(corpus_dir) / "uploads", 4, args.pages, seed=args.seed + 1)
+
+        if args.url:
+            base_url, ollama, app = args.url.rstrip("/"), None, None
+        else:
+            ollama = fake_ollama.FakeOllamaServer(fake_ollama.config_from_args(args)).start()
+            app = AppServer(ollama.url, workers=args.workers).start()
+            base_url = app.url
+        try:
+            print(f"🚀 Target {base_url}; uploading {len(corpus)} documents...")
+            for path in corpus:
+                with open(path, "rb") as f:
+                    requests.post(f"{base_url}/upload-pdf", files={"file": (path.name, f, "application/pdf")},
+                                  timeout=600).raise_for_status()
+
+            for i, rate in enumerate(args.rates):
+                profile = LoadProfile(
+                    rate=rate, duration=args.duration, mix=mix, actions_per_session=args.actions,
+                    think_seconds=args.think_seconds, quiz_answer_seconds=args.quiz_answer_seconds,
+                    time_scale=args.time_scale, seed=args.seed + i,
+                )
+                print(f"👥 {rate} students/s for {args.duration}s...")
+                step = run_step(base_url, profile, upload_pdfs, args.drain_timeout)
+                llm = step["llm"]
+                print(f"   {step['students']} students, {step['overall']['requests']} requests, "
+                      f"LLM p95 {llm['latency_ms']['p95']} ms, errors {llm['error_rate']:.1%}, "
+                      f"timeouts {llm['timeouts']}")
+                steps.append(step)
+        finally:
+            if app is not None:
+                app.stop()
+                ollama.stop()
+
+    return {
+        "config": vars(args),
+        "saturation_arrival_rate": find_saturation(steps, args.p95_slo_ms, args.max_error_rate),
+        "steps": steps,
+        # Last step in the results slot so runs can be compared with compare_results()
+        "results": steps[-1]["results"] if steps else {},
+    }
+
+
+def print_report(report: dict):
+    for step in report["steps"]:
+        print(f"\n=== {step['arrival_rate']} students/s ({step['students']} students) ===")
+        print(f"{'request':30s} {'n':>6s} {'err%':>6s} {'tmo':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>7s}")
+        for name, stats in step["results"].items():
+            lat = stats["latency_ms"]
+            fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9s}"
+            print(f"{name:30s} {stats['requests']:6d} {stats['error_rate'] * 100:6.1f} {stats['timeouts']:5d} "
+                  f"{fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {stats['requests_per_second'] or 0:7.2f}")
+    saturation = report["saturation_arrival_rate"]
+    print("\n" + (f"🔥 Saturated at {saturation} students/s" if saturation is not None
+                  else "✅ No saturation within the tested rates"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay concurrent student sessions against the backend")
+    parser.add_argument("--url", help="existing backend to load (default: start one against a fake Ollama)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.2, 0.5, 1.0],
+                        help="student arrival rates (per second), one step each")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of arrivals per step")
+    parser.add_argument("--drain-timeout", type=float, default=300.0,
+                        help="seconds to wait for students still active after a step")
+    parser.add_argument("--mix", help="action weights, e.g. chat=0.6,quiz=0.3,history=0.1")
+    parser.add_argument("--actions", type=float, default=6.0, help="mean actions per session")
+    parser.add_argument("--think-seconds", type=float, default=20.0)
+    parser.add_argument("--quiz-answer-seconds", type=float, default=60.0)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplier for think times and the 15s poll (e.g. 0.1 to compress)")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--p95-slo-ms", type=float, default=30000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare the last step against")
+    fake_ollama.add_arguments(parser)
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+    print_report(report)
+    path = save_results(report, args.output)
+    print(f"\n💾 Results saved to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare_results(baseline, report):
+            print("  " + line)
@@ -0,0 +1,160 @@
+# backend/benchmarks/run.py
+"""
+End-to-end benchmark of the backend against a deterministic fake Ollama.
+
+Uploads a synthetic corpus (timing /upload-pdf), then sends a fixed,
+seeded request mix to /query, /generate-quiz and /generate-summary and
+reports p50/p95/p99 latency and requests/sec per endpoint. The sessions
+step then reads back the histories those requests created (GET /sessions,
+GET /session/{id}); response sizes on the wire and the server's
+serialize/compress stage times are reported for every endpoint. Results
+are saved as JSON; pass --compare to diff against an earlier run:
+
+    python backend/benchmarks/run.py --documents 8 --pages 20 --requests 50 --concurrency 4
+    python backend/benchmarks/run.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import sys
+
+import requests
+import tempfile
+from pathlib import Path
+
+if __name__ == "__main__":
+    # Allow running as `python backend/benchmarks/run.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.benchmarks import fake_ollama
+from backend.benchmarks.corpus import build_corpus, questions
+from backend.benchmarks.harness import (
+    AppServer, compare_results, run_closed_loop, save_results, scrape_counters, scrape_stages, summarize,
+    timed_request,
+)
+
+ENDPOINTS = ("upload-pdf", "query", "generate-quiz", "generate-summary", "sessions")
+
+
+def upload_calls(base_url: str, pdfs):
+    def call(path):
+        def send(session):
+            with open(path, "rb") as f:
+                return timed_request(session, "/upload-pdf", "POST", f"{base_url}/upload-pdf",
+                                     files={"file": (path.name, f, "application/pdf")}, timeout=600)
+        return send
+    return [call(p) for p in pdfs]
+
+
+def json_calls(base_url: str, endpoint: str, payloads, timeout: float):
+    def call(payload):
+        return lambda session: timed_request(session, f"/{endpoint}", "POST", f"{base_url}/{endpoint}",
+                                             json=payload, timeout=timeout)
+    return [call(p) for p in payloads]
+
+
+def session_calls(base_url: str, limit: int, timeout: float):
+    """GET /sessions, then GET /session/{id} for the sessions the earlier steps created."""
+    listed = requests.get(f"{base_url}/sessions", timeout=timeout).json().get("sessions", [])
+    calls = [lambda session: timed_request(session, "/sessions", "GET", f"{base_url}/sessions", timeout=timeout)]
+    for entry in listed[:limit]:
+        url = f"{base_url}/session/{entry['session_id']}"
+        calls.append(lambda session, url=url: timed_request(session, "/session/{id}", "GET", url, timeout=timeout))
+    return calls
+
+
+def run_benchmark(args) -> dict:
+    endpoints = args.endpoints or list(ENDPOINTS)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ai-mentor-corpus-") as corpus_dir, \
+            fake_ollama.FakeOllamaServer(fake_ollama.config_from_args(args)) as ollama, \
+            AppServer(ollama.url, workers=args.workers) as app:
+        print(f"🚀 Backend on {app.url}, fake Ollama on {ollama.url}")
+
+        # The corpus is always uploaded - the other endpoints need an index
+        pdfs = build_corpus(corpus_dir, args.documents, args.pages, seed=args.seed)
+        print(f"📄 Uploading {len(pdfs)} synthetic PDFs x {args.pages} pages...")
+        samples, wall = run_closed_loop(upload_calls(app.url, pdfs), args.upload_concurrency)
+        if "upload-pdf" in endpoints:
+            results["/upload-pdf"] = summarize(samples, wall)
+        if not any(s.ok for s in samples):
+            raise RuntimeError(f"Every upload failed: {samples[0].error if samples else 'no documents'}")
+
+        mix = questions(args.requests, seed=args.seed)
+        payloads = {
+            "query": [{"query": q} for q, _ in mix],
+            "generate-quiz": [{"topic": t, "num_questions": args.quiz_questions} for _, t in mix],
+            "generate-summary": [{"topic": t} for _, t in mix],
+        }
+        for endpoint, endpoint_payloads in payloads.items():
+            if endpoint not in endpoints:
+                continue
+            calls = json_calls(app.url, endpoint, endpoint_payloads, args.timeout)
+            # Warm-up requests (model discovery, index mapping, embedding model load) are not measured
+            run_closed_loop(calls[:args.warmup], 1)
+            print(f"⏱️  /{endpoint}: {len(calls)} requests, concurrency {args.concurrency}")
+            samples, wall = run_closed_loop(calls, args.concurrency)
+            results[f"/{endpoint}"] = summarize(samples, wall)
+
+        if "sessions" in endpoints:
+            calls = session_calls(app.url, args.requests, args.timeout)
+            print(f"⏱️  /sessions, /session/{{id}}: {len(calls)} requests, concurrency {args.concurrency}")
+            samples, wall = run_closed_loop(calls, args.concurrency)
+            for name in ("/sessions", "/session/{id}"):
+                results[name] = summarize([s for s in samples if s.name == name], wall)
+
+        counters = scrape_counters(app.url, ["quiz_parse_outcomes_total", "ingest_pages_total"])
+        stages = scrape_stages(app.url, ["serialize", "compress"])
+
+    return {
+        "config": vars(args),
+        "results": results,
+        "counters": counters,
+        "stages": stages,
+    }
+
+
+def print_table(report: dict):
+    print(f"\n{'endpoint':22s} {'n':>5s} {'err':>5s} {'p50 ms':>10s} {'p95 ms':>10s} {'p99 ms':>10s} {'req/s':>8s} "
+          f"{'KB':>8s}")
+    for name, stats in report["results"].items():
+        lat = stats["latency_ms"]
+        fmt = lambda v: f"{v:10.1f}" if v is not None else f"{'-':>10s}"
+        rps = stats["requests_per_second"]
+        size = stats.get("response_bytes", {}).get("mean")
+        kb = f"{size / 1024:8.1f}" if size is not None else f"{'-':>8s}"
+        print(f"{name:22s} {stats['requests']:5d} {stats['errors']:5d} {fmt(lat['p50'])} {fmt(lat['p95'])} "
+              f"{fmt(lat['p99'])} {rps if rps is not None else '-':>8} {kb}")
+    for endpoint, stages in report.get("stages", {}).items():
+        timings = ", ".join(f"{stage} {v['mean_ms']} ms x{v['count']}" for stage, v in stages.items())
+        print(f"   {endpoint}: {timings}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the AI Mentor backend against a fake Ollama")
+    parser.add_argument("--documents", type=int, default=4, help="synthetic PDFs to upload")
+    parser.add_argument("--pages", type=int, default=10, help="pages per synthetic PDF")
+    parser.add_argument("--requests", type=int, default=30, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--upload-concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests per endpoint")
+    parser.add_argument("--quiz-questions", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request (s)")
+    parser.add_argument("--endpoints", nargs="*", choices=ENDPOINTS)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    fake_ollama.add_arguments(parser)
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_table(report)
+    path = save_results(report, args.output)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare} (commit {baseline.get('commit')}):")
+        for line in compare_results(baseline, json.loads(path.read_text())):
+            print("  " + line)
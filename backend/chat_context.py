@@ -0,0 +1,190 @@
+# backend/chat_context.py
+"""
+Multi-turn prompt reuse for chat sessions.
+
+Every /query used to send a fresh prompt with the mentor instructions.
+Chat turns now go to /api/generate with a fixed system prompt (the same
+bytes on every request, so Ollama's prompt cache can match it) plus the
+`context` Ollama returned for the session's previous turn, so only the
+new question and retrieved passages are evaluated.
+
+A session's context is valid only for the model load that produced it.
+It is dropped when:
+
+- the model changes;
+- Ollama reloads that model (the context no longer matches its KV cache);
+- the next turn would overflow num_ctx;
+- the session is evicted from this worker's LRU, or to stay within the
+  memory budget (see memory_budget.py).
+
+A dropped context takes the conversation with it, as does a turn that
+lands on another worker. Without a context the turn prompt is therefore
+rebuilt from the session's stored chat history (history_prompt), newest
+exchanges first up to a token budget, and the context Ollama returns for
+it carries the conversation on from there.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+from backend import metrics
+from backend.memory_budget import approx_size
+
+# Kept byte-for-byte stable: anything request-specific goes in the prompt
+MENTOR_SYSTEM = (
+    "You are an AI mentor helping a college student learn. "
+    "Use the context from their course materials to answer their questions. "
+    "If you can provide examples or clarifications, please do so. "
+    "If the context doesn't contain the answer, use your general knowledge but mention that."
+)
+
+# Small context window and answers for slower systems (the chat profile's defaults, see model_router.py)
+CHAT_OPTIONS = {"temperature": 0.7, "num_ctx": 2048, "num_predict": 256}
+
+CONTEXT_REUSE = metrics.Counter(
+    "llm_session_context_total", "Chat turns that continued (hit) or started (miss) a session context",
+    ("outcome",))
+CONTEXT_INVALIDATIONS = metrics.Counter(
+    "llm_session_context_invalidations_total",
+    "Session contexts dropped (model_change, model_reload, overflow, evicted, session_deleted, memory_budget)", ("reason",))
+
+CONTEXT_REBUILDS = metrics.Counter(
+    "llm_session_context_rebuilds_total",
+    "Turns without a session context whose prompt was rebuilt from chat history (rebuilt) or had none (empty)",
+    ("outcome",))
+
+
+@dataclass
+class SessionContext:
+    model: str
+    model_epoch: int     # ModelManager.epoch(model) when the context was produced
+    tokens: List[int]
+    nbytes: int = 0
+
+
+class SessionContexts:
+    """Ollama conversation contexts per chat session (in memory, LRU-bounded)."""
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self._contexts: "OrderedDict[str, SessionContext]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, session_id: str, reason: str) -> int:
+        state = self._contexts.pop(session_id, None)
+        if state is None:
+            return 0
+        self._bytes -= state.nbytes
+        CONTEXT_INVALIDATIONS.inc(reason=reason)
+        return state.nbytes
+
+    def get(self, session_id: str, model: str, model_epoch: int) -> Optional[List[int]]:
+        """The session's context if it is still valid for this model load, else None."""
+        with self._lock:
+            state = self._contexts.get(session_id)
+            if state is None:
+                return None
+            if state.model != model or state.model_epoch != model_epoch:
+                self._drop(session_id, "model_change" if state.model != model else "model_reload")
+                return None
+            self._contexts.move_to_end(session_id)
+            return state.tokens
+
+    def put(self, session_id: str, model: str, model_epoch: int, tokens: List[int]):
+        state = SessionContext(model, model_epoch, tokens, approx_size(tokens))
+        with self._lock:
+            old = self._contexts.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._contexts[session_id] = state
+            self._bytes += state.nbytes
+            while len(self._contexts) > self.max_sessions:
+                self._drop(next(iter(self._contexts)), "evicted")
+
+    def model(self, session_id: str) -> Optional[str]:
+        """Model the session's context belongs to (its next turn stays there if it can, see model_router.py)."""
+        with self._lock:
+            state = self._contexts.get(session_id)
+            return state.model if state else None
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._drop(session_id, "session_deleted")
+
+    def nbytes(self) -> int:
+        """Approximate size of the stored contexts (see memory_budget.py)."""
+        return self._bytes
+
+    def evict(self, nbytes: int) -> int:
+        """Drop the least recently used contexts until nbytes are freed; returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            while self._contexts and freed < nbytes:
+                freed += self._drop(next(iter(self._contexts)), "memory_budget")
+        return freed
+
+
+def usable_context(context: Optional[List[int]], reserve_tokens: int,
+                   num_ctx: int = CHAT_OPTIONS["num_ctx"]) -> Optional[List[int]]:
+    """The context to continue from, or None if there is none or the next turn
+    (reserve_tokens: new prompt + answer) wouldn't fit in num_ctx."""
+    if context and len(context) + reserve_tokens > num_ctx:
+        CONTEXT_INVALIDATIONS.inc(reason="overflow")
+        context = None
+    CONTEXT_REUSE.inc(outcome="hit" if context else "miss")
+    return context
+
+
+def history_prompt(messages: List[dict], budget_tokens: int, counter: Callable[[str], int]) -> str:
+    """The most recent stored exchanges that fit in budget_tokens, as prompt text (oldest first).
+
+    Used when a session has no usable context, so the model still sees the conversation.
+    """
+    lines: List[str] = []
+    used = 0
+    for message in reversed(messages):
+        speaker = "Student" if message.get("role") == "user" else "AI Mentor"
+        line = f"{speaker}: {message.get('content', '')}"
+        cost = counter(line)
+        if used + cost > budget_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if lines and lines[-1].startswith("AI Mentor:"):
+        lines.pop()  # don't start mid-exchange
+    CONTEXT_REBUILDS.inc(outcome="rebuilt" if lines else "empty")
+    return "\n\n".join(reversed(lines))
+
+
+def stream_generate(base_url: str, model: str, prompt: str, system: str, context: Optional[List[int]],
+                    keep_alive, timeout: float = 60.0, options: Optional[dict] = None) -> Iterator[dict]:
+    """Stream an Ollama /api/generate call, yielding each NDJSON message.
+
+    options default to CHAT_OPTIONS. The final message (done=True) carries
+    the timing stats and the new context.
+    """
+    import requests
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "system": system,
+        "options": options or CHAT_OPTIONS,
+        "keep_alive": keep_alive,
+        "stream": True,
+    }
+    if context:
+        payload["context"] = context
+    with requests.post(f"{base_url}/api/generate", json=payload, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise Exception(f"Ollama API returned status {response.status_code}: {response.text[:200]}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = json.loads(line)
+            if message.get("error"):
+                raise Exception(f"Ollama error: {message['error']}")
+            yield message
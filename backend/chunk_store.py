@@ -0,0 +1,237 @@
+# backend/chunk_store.py
+"""
+Packed chunk store: one append-only data file per document plus an
+offset index, both memory-mapped for reads.
+
+    {store}/{doc}.chunks   JSON records ({"text", "metadata"}) back to back
+    {store}/{doc}.idx      one little-endian (offset: u64, length: u32) per chunk id
+
+Replaces the per-chunk .txt files in data/chunks. Run this module to
+import an existing chunk directory:
+
+    python backend/chunk_store.py import [backend/data/chunks]
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+if __name__ == "__main__":
+    # Allow running as `python backend/chunk_store.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.chunking import Chunk, iter_chunk_files
+
+_INDEX_ENTRY = struct.Struct("<QI")
+DATA_SUFFIX = ".chunks"
+INDEX_SUFFIX = ".idx"
+_MAX_REMAP_ATTEMPTS = 50
+
+
+def _map(path: Path):
+    """Read-only mmap of a file (empty files map to b"")."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _DocumentReader:
+    """Memory-mapped view of one document's data and index files."""
+
+    def __init__(self, data_path: Path, index_path: Path):
+        self.inode = os.stat(data_path).st_ino
+        self.data = _map(data_path)
+        self.index = _map(index_path)
+
+    def consistent(self) -> bool:
+        """The index must end exactly where the data file ends."""
+        if not self.index:
+            return not self.data
+        offset, length = _INDEX_ENTRY.unpack_from(self.index, len(self.index) - _INDEX_ENTRY.size)
+        return offset + length == len(self.data)
+
+    def __len__(self):
+        return len(self.index) // _INDEX_ENTRY.size
+
+    def get(self, chunk_id: int) -> Chunk:
+        if chunk_id < 0 or chunk_id >= len(self):
+            raise KeyError(chunk_id)
+        offset, length = _INDEX_ENTRY.unpack_from(self.index, chunk_id * _INDEX_ENTRY.size)
+        record = json.loads(bytes(self.data[offset:offset + length]))
+        return Chunk(text=record["text"], metadata=record["metadata"])
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for chunk_id in range(len(self)):
+            yield self.get(chunk_id)
+
+
+class ChunkWriter:
+    """Appends chunks for one document; the files replace the old ones on close()."""
+
+    def __init__(self, store: "ChunkStore", doc: str):
+        self.store = store
+        self.doc = doc
+        self.count = 0
+        self._offset = 0
+        self._data_tmp = store.data_path(doc).with_suffix(DATA_SUFFIX + ".tmp")
+        self._index_tmp = store.index_path(doc).with_suffix(INDEX_SUFFIX + ".tmp")
+        self._data = open(self._data_tmp, "wb")
+        self._index = open(self._index_tmp, "wb")
+
+    def append(self, chunk: Chunk) -> int:
+        """Append a chunk and return its chunk id (its position in the document)."""
+        chunk.metadata["chunk"] = self.count
+        record = json.dumps(
+            {"text": chunk.text, "metadata": chunk.metadata}, ensure_ascii=False
+        ).encode("utf-8") + b"\n"
+        self._data.write(record)
+        self._index.write(_INDEX_ENTRY.pack(self._offset, len(record)))
+        self._offset += len(record)
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+        """Pass chunks through while appending them."""
+        for chunk in chunks:
+            self.append(chunk)
+            yield chunk
+
+    def close(self):
+        """Flush and atomically swap the new files in."""
+        for f in (self._data, self._index):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        # The pair is swapped one file at a time; readers re-map until they match
+        os.replace(self._data_tmp, self.store.data_path(self.doc))
+        os.replace(self._index_tmp, self.store.index_path(self.doc))
+        self.store._forget(self.doc)
+
+    def abort(self):
+        for f in (self._data, self._index):
+            f.close()
+        for tmp in (self._data_tmp, self._index_tmp):
+            if tmp.exists():
+                tmp.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkStore:
+    """Directory of packed per-document chunk files."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._readers: Dict[str, _DocumentReader] = {}
+        self._lock = threading.Lock()
+
+    def data_path(self, doc: str) -> Path:
+        return self.root / f"{doc}{DATA_SUFFIX}"
+
+    def index_path(self, doc: str) -> Path:
+        return self.root / f"{doc}{INDEX_SUFFIX}"
+
+    def writer(self, doc: str) -> ChunkWriter:
+        """Start (re)writing a document's chunks."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return ChunkWriter(self, doc)
+
+    def documents(self) -> List[str]:
+        return sorted(p.name[:-len(INDEX_SUFFIX)] for p in self.root.glob(f"*{INDEX_SUFFIX}"))
+
+    def __contains__(self, doc: str) -> bool:
+        return self.index_path(doc).exists()
+
+    def _forget(self, doc: str):
+        with self._lock:
+            self._readers.pop(doc, None)
+
+    def _reader(self, doc: str) -> _DocumentReader:
+        data_path = self.data_path(doc)
+        try:
+            inode = os.stat(data_path).st_ino
+        except FileNotFoundError:
+            self._forget(doc)
+            raise KeyError(doc)
+        with self._lock:
+            reader = self._readers.get(doc)
+            if reader is not None and reader.inode == inode:
+                return reader
+            # (Re-)map - the document is new here or was rewritten by a writer
+            for _ in range(_MAX_REMAP_ATTEMPTS):
+                reader = _DocumentReader(data_path, self.index_path(doc))
+                if reader.consistent():
+                    self._readers[doc] = reader
+                    return reader
+                time.sleep(0.01)
+        raise RuntimeError(f"Chunk store files for {doc!r} are inconsistent")
+
+    def nbytes(self) -> int:
+        """Size of the currently mapped chunk files (see memory_budget.py)."""
+        with self._lock:
+            readers = list(self._readers.values())
+        return sum(len(reader.data) + len(reader.index) for reader in readers)
+
+    def count(self, doc: str) -> int:
+        return len(self._reader(doc))
+
+    def get(self, doc: str, chunk_id: int) -> Chunk:
+        """Random access to a single chunk."""
+        return self._reader(doc).get(chunk_id)
+
+    def iter_chunks(self, docs: Optional[Iterable[str]] = None) -> Iterator[Chunk]:
+        """Stream every chunk (of the given documents, or all of them), e.g. for re-embedding."""
+        for doc in (self.documents() if docs is None else docs):
+            yield from self._reader(doc)
+
+    def delete(self, doc: str):
+        self._forget(doc)
+        for path in (self.index_path(doc), self.data_path(doc)):
+            if path.exists():
+                path.unlink()
+
+
+def import_chunk_dir(chunk_dir, store: ChunkStore) -> Dict[str, int]:
+    """Pack an old-style directory of {doc}_chunk{i}.txt files into the store."""
+    writers: Dict[str, ChunkWriter] = {}
+    try:
+        for chunk in iter_chunk_files(chunk_dir):
+            doc = chunk.metadata["source"]
+            if doc not in writers:
+                writers[doc] = store.writer(doc)
+            writers[doc].append(chunk)
+    except Exception:
+        for w in writers.values():
+            w.abort()
+        raise
+    for w in writers.values():
+        w.close()
+    return {doc: w.count for doc, w in writers.items()}
+
+
+if __name__ == "__main__":
+    from backend.config import CHUNK_DIR, CHUNK_STORE_DIR
+
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print("Usage: python backend/chunk_store.py import [chunk_dir]")
+        sys.exit(1)
+
+    source_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_DIR
+    counts = import_chunk_dir(source_dir, ChunkStore(CHUNK_STORE_DIR))
+    for doc, n in counts.items():
+        print(f"📦 {doc}: {n} chunks")
+    print(f"🎯 Imported {sum(counts.values())} chunks from {source_dir} into {CHUNK_STORE_DIR}")
@@ -0,0 +1,315 @@
+# backend/chunking.py
+"""
+Structure-aware streaming chunker shared by every ingestion path
+(upload_pdf and ingest.py).
+
+Text is consumed page by page as a generator, split on headings,
+paragraphs and sentences, and packed into chunks sized in tokens.
+Every chunk carries page, section and byte-offset metadata so that
+answers can be filtered and cited.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from backend.config import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Pages in extracted .txt files are separated by a form feed (pdftotext convention)
+PAGE_SEPARATOR = "\f"
+
+# Rough word/punctuation tokenizer - close enough to WordPiece for sizing chunks
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+_LINE_RE = re.compile(r"[^\n]*\n?")
+
+# Sentences end with . ! or ? followed by whitespace (or end of paragraph)
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?]+[\"')\]]*(?=\s)|$)", re.DOTALL)
+
+_HEADING_PATTERNS = [
+    re.compile(r"^#{1,6}\s+\S"),                                      # markdown
+    re.compile(r"^(chapter|section|part|appendix|unit|lecture)\s+[\w.]+", re.IGNORECASE),
+    re.compile(r"^\d+(\.\d+)*\.?\s+[A-Z]"),                           # 1.2 Title
+]
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of a piece of text."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def is_heading(line: str) -> bool:
+    """Heuristic check whether a single line looks like a section heading."""
+    line = line.strip()
+    if not line or len(line) > 80 or len(line.split()) > 12 or line.endswith((".", ",", ";", ":", "?", "!")):
+        return False
+    if any(p.match(line) for p in _HEADING_PATTERNS):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    # SHORT ALL-CAPS LINES are headings in most textbooks
+    return len(letters) >= 4 and all(c.isupper() for c in letters) and len(line.split()) <= 10
+
+
+@dataclass
+class Chunk:
+    """A chunk of text plus its citation metadata."""
+    text: str
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class _Piece:
+    text: str
+    page: int
+    byte_start: int
+    byte_end: int
+    tokens: int
+    new_paragraph: bool
+
+
+def iter_pdf_pages(pdf_path) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for each page of a PDF, one page at a time."""
+    import PyPDF2
+
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page_num, page in enumerate(reader.pages, start=1):
+            yield page_num, page.extract_text() or ""
+
+
+def iter_text_pages(txt_path, block_size: int = 1 << 16) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) from an extracted .txt file without reading it whole.
+
+    Pages are separated by form feeds; files without them are a single page.
+    """
+    page_num = 1
+    buffer = ""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            buffer += block
+            *pages, buffer = buffer.split(PAGE_SEPARATOR)
+            for page in pages:
+                yield page_num, page
+                page_num += 1
+    yield page_num, buffer
+
+
+def write_pages(pages: Iterable[Tuple[int, str]], out_file) -> Iterator[Tuple[int, str]]:
+    """Pass pages through while writing them to an open text file, separated by form feeds."""
+    first = True
+    for page_num, text in pages:
+        if not first:
+            out_file.write(PAGE_SEPARATOR)
+        out_file.write(text)
+        first = False
+        yield page_num, text
+
+
+def _split_long(text: str, max_tokens: int, counter: Callable[[str], int]) -> List[Tuple[int, int]]:
+    """Hard-split a sentence longer than a whole chunk on word boundaries.
+
+    Returns (char_start, char_end) spans relative to text.
+    """
+    spans = []
+    start = end = None
+    current_tokens = 0
+    for word in re.finditer(r"\S+", text):
+        word_tokens = counter(word.group(0))
+        if start is not None and current_tokens + word_tokens > max_tokens:
+            spans.append((start, end))
+            start, current_tokens = None, 0
+        if start is None:
+            start = word.start()
+        end = word.end()
+        current_tokens += word_tokens
+    if start is not None:
+        spans.append((start, end))
+    return spans
+
+
+def _iter_blocks(page_text: str) -> Iterator[Tuple[int, str, bool]]:
+    """Yield (char_start, text, is_heading) blocks of a page.
+
+    Paragraphs are runs of lines not separated by a blank line; a heading
+    line always forms a block of its own.
+    """
+    block_start = None
+    block_end = 0
+    for line in _LINE_RE.finditer(page_text):
+        text = line.group(0)
+        if not text:
+            break
+        if not text.strip() or is_heading(text):
+            if block_start is not None:
+                yield block_start, page_text[block_start:block_end], False
+                block_start = None
+            if text.strip():
+                yield line.start(), text, True
+            continue
+        if block_start is None:
+            block_start = line.start()
+        block_end = line.end()
+    if block_start is not None:
+        yield block_start, page_text[block_start:block_end], False
+
+
+def _iter_pieces(
+    pages: Iterable[Tuple[int, str]],
+    max_tokens: int,
+    counter: Callable[[str], int],
+) -> Iterator[Tuple[Optional[str], _Piece]]:
+    """Break pages into sentence pieces, yielding (new_section_title, piece).
+
+    new_section_title is set on the first piece following a heading.
+    Byte offsets are relative to the pages written out with write_pages().
+    """
+    page_base = 0
+    sep_bytes = len(PAGE_SEPARATOR.encode("utf-8"))
+    first_page = True
+    pending_heading = None
+
+    for page_num, page_text in pages:
+        if not first_page:
+            page_base += sep_bytes
+        first_page = False
+
+        # Incremental char -> byte offset conversion (units come in order)
+        last_char, last_byte = 0, page_base
+
+        def to_bytes(char_pos):
+            nonlocal last_char, last_byte
+            last_byte += len(page_text[last_char:char_pos].encode("utf-8"))
+            last_char = char_pos
+            return last_byte
+
+        for para_start, para_text, heading in _iter_blocks(page_text):
+            if heading:
+                pending_heading = " ".join(para_text.split()).lstrip("# ")
+                continue
+
+            new_paragraph = True
+            for sent in _SENTENCE_RE.finditer(para_text):
+                raw = sent.group(0)
+                if counter(raw) <= max_tokens:
+                    spans = [(0, len(raw))]
+                else:
+                    spans = _split_long(raw, max_tokens, counter)
+                for span_start, span_end in spans:
+                    text = " ".join(raw[span_start:span_end].split())
+                    if not text:
+                        continue
+                    start = to_bytes(para_start + sent.start() + span_start)
+                    end = to_bytes(para_start + sent.start() + span_end)
+                    yield pending_heading, _Piece(text, page_num, start, end, counter(text), new_paragraph)
+                    pending_heading = None
+                    new_paragraph = False
+
+        page_base = to_bytes(len(page_text))
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    source: str,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    token_counter: Callable[[str], int] = count_tokens,
+    extra_metadata: Optional[dict] = None,
+) -> Iterator[Chunk]:
+    """Stream chunks from (page_number, text) pairs.
+
+    Chunks never cross a heading. Within a section, paragraphs and sentences
+    are packed up to chunk_tokens, and the trailing sentences (up to
+    overlap_tokens) are repeated at the start of the next chunk.
+    token_counter can be swapped for the embedding model's tokenizer, and
+    extra_metadata (e.g. the collection) is added to every chunk.
+    """
+    chunk_id = 0
+    section = None
+    current: List[_Piece] = []
+    current_tokens = 0
+
+    def build(pieces: List[_Piece]) -> Chunk:
+        nonlocal chunk_id
+        text = ""
+        for i, p in enumerate(pieces):
+            if i:
+                text += "\n\n" if p.new_paragraph else " "
+            text += p.text
+        chunk = Chunk(text=text, metadata={
+            "source": source,
+            "chunk": chunk_id,
+            "page": pieces[0].page,
+            "page_end": pieces[-1].page,
+            "section": section,
+            "byte_start": pieces[0].byte_start,
+            "byte_end": pieces[-1].byte_end,
+            "tokens": sum(p.tokens for p in pieces),
+            **(extra_metadata or {}),
+        })
+        chunk_id += 1
+        return chunk
+
+    for heading, piece in _iter_pieces(pages, chunk_tokens, token_counter):
+        if heading is not None:
+            if current:
+                yield build(current)
+            current, current_tokens = [], 0
+            section = heading
+
+        if current and current_tokens + piece.tokens > chunk_tokens:
+            yield build(current)
+            # Carry trailing sentences over as overlap
+            carry, carry_tokens = [], 0
+            for p in reversed(current):
+                if carry_tokens + p.tokens > overlap_tokens or carry_tokens + p.tokens + piece.tokens > chunk_tokens:
+                    break
+                carry.insert(0, p)
+                carry_tokens += p.tokens
+            current, current_tokens = carry, carry_tokens
+
+        current.append(piece)
+        current_tokens += piece.tokens
+
+    if current:
+        yield build(current)
+
+
+def chunk_text_file(txt_path, source: Optional[str] = None, **kwargs) -> Iterator[Chunk]:
+    """Stream chunks from an extracted .txt file."""
+    txt_path = Path(txt_path)
+    return iter_chunks(iter_text_pages(txt_path), source or txt_path.stem, **kwargs)
+
+
+def iter_chunk_files(chunk_dir) -> Iterator[Chunk]:
+    """Stream chunks back from an old-style chunk directory (see chunk_store.import_chunk_dir).
+
+    Documents with a _chunks.jsonl manifest come back with their full metadata;
+    older chunk files without one fall back to source/chunk parsed from the name.
+    """
+    chunk_dir = Path(chunk_dir)
+    covered = set()
+    for manifest_path in sorted(chunk_dir.glob("*_chunks.jsonl")):
+        stem = manifest_path.name[:-len("_chunks.jsonl")]
+        covered.add(stem)
+        with open(manifest_path, "r", encoding="utf-8") as manifest:
+            for line in manifest:
+                if not line.strip():
+                    continue
+                metadata = json.loads(line)
+                chunk_file = chunk_dir / f"{stem}_chunk{metadata['chunk']}.txt"
+                if chunk_file.exists():
+                    yield Chunk(chunk_file.read_text(encoding="utf-8"), metadata)
+
+    legacy_re = re.compile(r"^(?P<stem>.+)_chunk(?P<idx>\d+)\.txt$")
+    legacy = []
+    for chunk_file in chunk_dir.glob("*_chunk*.txt"):
+        match = legacy_re.match(chunk_file.name)
+        if match and match.group("stem") not in covered:
+            legacy.append((match.group("stem"), int(match.group("idx")), chunk_file))
+    for stem, idx, chunk_file in sorted(legacy):
+        yield Chunk(chunk_file.read_text(encoding="utf-8"), {"source": stem, "chunk": idx})
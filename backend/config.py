@@ -14,33 +14,114 @@ load_dotenv()
 # For Ollama LLM - make sure Ollama is installed and running
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")  # Change to mistral, llama3, etc.
+# How long Ollama keeps the model loaded after a request: a duration ("30m") or seconds, -1 = pinned
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE) if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit() else OLLAMA_KEEP_ALIVE
+# Re-read the installed models this often and warm a better one before switching to it (0 = never)
+MODEL_REFRESH_SECONDS = int(os.getenv("MODEL_REFRESH_SECONDS", 60))
 
 # Paths
 BASE_DIR = Path(__file__).parent
-DATA_DIR = BASE_DIR / "data"
-CHUNK_DIR = DATA_DIR / "chunks"
+# Storage locations can be moved (e.g. to a scratch directory for benchmarks)
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
+CHUNK_DIR = DATA_DIR / "chunks"  # legacy per-chunk .txt files (see chunk_store.py import)
+CHUNK_STORE_DIR = DATA_DIR / "chunk_store"
 VECTOR_STORE_PATH = DATA_DIR / "faiss_index"
-SESSIONS_DIR = BASE_DIR / "sessions"
-PROGRESS_DIR = BASE_DIR / "progress"
+INGEST_STATE_DIR = DATA_DIR / "ingest_state"  # per-document checkpoints of backend/ingest.py
+RETRIEVAL_SHARDS = [s for s in os.getenv("RETRIEVAL_SHARDS", str(VECTOR_STORE_PATH)).split(",") if s]
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", DATA_DIR / "profiles"))
+SESSIONS_DIR = Path(os.getenv("SESSIONS_DIR", BASE_DIR / "sessions"))
+PROGRESS_DIR = Path(os.getenv("PROGRESS_DIR", BASE_DIR / "progress"))
 
-# Chunking parameters
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
+# Generations run at once per worker (match OLLAMA_NUM_PARALLEL); the rest wait, chat before batch work
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 2))
+# Per-endpoint model profiles as JSON, e.g. {"quiz": {"model": "llama3.2:3b"}} (see model_router.py)
+MODEL_PROFILES = os.getenv("MODEL_PROFILES", "")
+# Route to a smaller model once this many generations are waiting
+ROUTE_QUEUE_DEPTH = int(os.getenv("ROUTE_QUEUE_DEPTH", 4))
+# Retrieval: queries arriving within this window are encoded and searched as one batch (see retrieval.py)
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", 2))
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", 64))
+# Separate retrieval process (see retrieval_service.py): when RETRIEVAL_SERVICE_URL is set the API sends
+# queries there instead of loading the embedding model and index, over up to RETRIEVAL_POOL_SIZE connections
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "")
+RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", 16))
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", 10))
+# What the service listens on and the index directories ("[name=]path", comma-separated) it serves
+RETRIEVAL_SERVICE_HOST = os.getenv("RETRIEVAL_SERVICE_HOST", "127.0.0.1")
+RETRIEVAL_SERVICE_PORT = int(os.getenv("RETRIEVAL_SERVICE_PORT", 8100))
+# Prefetch while typing (/query/prefetch): per-session rate limit, how long the context is kept, and
+# how close (word overlap, 0-1) the sent question must be to the prefetched text to reuse it
+PREFETCH_RATE_PER_SECOND = float(os.getenv("PREFETCH_RATE_PER_SECOND", 1.0))
+PREFETCH_BURST = float(os.getenv("PREFETCH_BURST", 3))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", 30))
+PREFETCH_MATCH_THRESHOLD = float(os.getenv("PREFETCH_MATCH_THRESHOLD", 0.8))
+# Memory budget per worker for models, indexes and caches (0 = track only); checked this often.
+# Over budget, cached sessions, chat contexts and prefetches are evicted (see memory_budget.py)
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", 0))
+MEMORY_CHECK_SECONDS = float(os.getenv("MEMORY_CHECK_SECONDS", 2))
+# Most questions/topics accepted by /query/batch and /generate-quiz/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 200))
+
+# Sessions: sqlite (all workers on one host, in SESSIONS_DIR), redis (several nodes, REDIS_URL)
+# or memory (single process, tests). Each worker caches sessions for SESSION_CACHE_TTL seconds.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 2.0))
+# Progress entries are queued and written to the rollups (PROGRESS_DIR) in batches this often
+PROGRESS_FLUSH_SECONDS = float(os.getenv("PROGRESS_FLUSH_SECONDS", 0.5))
+
+# Embeddings (shared by indexing and querying - changing the model needs a re-index)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+# torch (sentence-transformers), onnx or onnx-int8 (ONNX Runtime, no torch - see onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR", DATA_DIR / "onnx" / EMBEDDING_MODEL.split("/")[-1]))
+
+# Chunking parameters (sizes are in tokens, see chunking.py)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 160))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 24))
+
+# Index compaction: rewrite the index once this share of rows are deleted/replaced
+COMPACTION_TOMBSTONE_RATIO = float(os.getenv("COMPACTION_TOMBSTONE_RATIO", 0.2))
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", 600))
+
+# Largest accepted upload; uploads are streamed to disk in 1 MB blocks, so this bounds disk, not memory
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", 200))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+# Metrics: always send a Server-Timing header (clients can also ask per request with X-Timing: 1)
+TIMING_HEADER = os.getenv("TIMING_HEADER", "false").lower() in ("1", "true", "yes")
+
+# Profiling (see profiling.py): share of requests profiled at random (0 = only on X-Profile: <ADMIN_TOKEN>),
+# sampling interval, and how many profiles PROFILE_DIR keeps
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 100))
+# Enables X-Profile (the header must carry this token) and /admin/* (token in X-Admin-Token); both are off while unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Responses of at least this many bytes are gzip/brotli-compressed for clients that accept it
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
 
 # API Settings
 BACKEND_HOST = os.getenv("BACKEND_HOST", "0.0.0.0")
 BACKEND_PORT = int(os.getenv("BACKEND_PORT", 8000))
 
-# Create necessary directories
-DATA_DIR.mkdir(exist_ok=True)
-CHUNK_DIR.mkdir(exist_ok=True)
-SESSIONS_DIR.mkdir(exist_ok=True)
-PROGRESS_DIR.mkdir(exist_ok=True)
+# Startup: load the embedding model, index and LLM client before reporting ready (see /ready).
+# Set to false to skip warm-up - components then load on first use.
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+
+
+def ensure_directories():
+    """Create the storage directories (called at app startup, not on import)."""
+    for path in (DATA_DIR, CHUNK_STORE_DIR, SESSIONS_DIR, PROGRESS_DIR):
+        path.mkdir(parents=True, exist_ok=True)
 
-# Validation
-print("✅ Using local models - no API keys needed!")
-print("   - Embeddings: sentence-transformers/all-MiniLM-L6-v2 (runs locally)")
-print("   - LLM: Ollama (make sure it's installed and running)")
-print("   - Download Ollama from: https://ollama.ai")
-print("   - Then run: ollama pull llama2")
 
+def print_banner():
+    print("✅ Using local models - no API keys needed!")
+    print(f"   - Embeddings: {EMBEDDING_MODEL} ({EMBEDDING_BACKEND}, runs locally)")
+    print("   - LLM: Ollama (make sure it's installed and running)")
+    print("   - Download Ollama from: https://ollama.ai")
+    print("   - Then run: ollama pull llama2")
@@ -0,0 +1,56 @@
+# backend/embeddings.py
+"""
+Shared embedding model for indexing and querying.
+
+The model is loaded once per process and reused - loading
+sentence-transformers on every request costs seconds.
+EMBEDDING_BACKEND picks PyTorch (torch) or ONNX Runtime
+(onnx, onnx-int8 - see onnx_embeddings.py).
+"""
+
+from functools import lru_cache
+
+from backend.config import EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_ONNX_DIR
+
+
+def load_embeddings(backend: str = "torch"):
+    """Load an embedding backend (get_embeddings() shares the configured one)."""
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={'device': EMBEDDING_DEVICE},  # change to 'cuda' if you have a GPU
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
+    from backend.onnx_embeddings import ONNX_BACKENDS, OnnxEmbeddings, parity_status
+    if backend not in ONNX_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; use torch, onnx or onnx-int8")
+    parity = parity_status(EMBEDDING_ONNX_DIR, backend)
+    if parity is None or not parity.get("passed"):
+        print(f"WARNING: {backend} embeddings have no passing parity check against the index's PyTorch vectors.")
+        print(f"  Run: python backend/onnx_embeddings.py parity {backend}")
+    return OnnxEmbeddings(EMBEDDING_ONNX_DIR, backend)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Get the local embedding model (loaded on first use)."""
+    return load_embeddings(EMBEDDING_BACKEND)
+
+
+def loaded_model_bytes() -> int:
+    """Weights of the shared embedding model, 0 if it isn't loaded (see memory_budget.py)."""
+    if get_embeddings.cache_info().currsize == 0:
+        return 0
+    embeddings = get_embeddings()
+    model = getattr(embeddings, "client", None)  # sentence-transformers behind HuggingFaceEmbeddings
+    if model is not None and hasattr(model, "parameters"):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if hasattr(embeddings, "session"):
+        # ONNX Runtime holds the exported model's weights
+        from backend.onnx_embeddings import ONNX_BACKENDS
+        return (embeddings.model_dir / ONNX_BACKENDS[embeddings.backend]).stat().st_size
+    return 0
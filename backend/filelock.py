@@ -0,0 +1,92 @@
+# backend/filelock.py
+"""
+Cross-process exclusive lock on a file (fcntl on POSIX, msvcrt on Windows).
+
+Used where several uvicorn workers may write the same files.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How often a lock with a timeout is retried
+_POLL_SECONDS = 0.05
+
+
+class LockTimeout(TimeoutError):
+    """The lock was still held when the timeout ran out."""
+
+
+class FileLock:
+    """Blocking, non-reentrant exclusive lock.
+
+    Also serialises threads of the same process, since OS file locks
+    are per process.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Wait for the lock (at most `timeout` seconds, then raise LockTimeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f"{self.path} is locked")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if deadline is None:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+            else:
+                while not self._try_lock():
+                    if time.monotonic() >= deadline:
+                        raise LockTimeout(f"{self.path} is locked by another process")
+                    time.sleep(_POLL_SECONDS)
+        except Exception:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def release(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+        finally:
+            self._fd = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
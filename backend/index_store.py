@@ -0,0 +1,743 @@
+# backend/index_store.py
+"""
+Pickle-free, memory-mapped FAISS index storage.
+
+    {index_dir}/index.faiss       FAISS vectors, memory-mapped read-only when serving
+    {index_dir}/docstore.sqlite   FAISS row -> Document (text + JSON metadata),
+                                  source/collection columns for scoped search,
+                                  tombstones and per-document content hashes
+    {index_dir}/CURRENT           which index/docstore pair is live (written by
+                                  rebuilds and compaction, which renumber rows)
+
+Every uvicorn worker maps the same files, so vectors and documents are
+shared through the OS page cache instead of being copied into each
+process, and nothing is unpickled (no allow_dangerous_deserialization).
+
+Deleted and replaced documents are tombstoned (excluded from search with a
+FAISS id selector) and physically removed by compact_index().
+
+Convert an index saved by FAISS.save_local (index.pkl) once with:
+
+    python backend/index_store.py migrate
+
+and compact it by hand with:
+
+    python backend/index_store.py compact
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+if __name__ == "__main__":
+    # Allow running as `python backend/index_store.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.filelock import FileLock
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".write.lock"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# SQLite reads go through mmap so pages are shared between workers
+_SQLITE_MMAP_SIZE = 1 << 30
+
+# Scopes whose FAISS rows each docstore keeps (least recently used are dropped first)
+SCOPE_CACHE_ENTRIES = 256
+
+# Vectors copied per step during compaction
+_COMPACT_BLOCK = 4096
+
+
+def _read_flags(faiss):
+    """Zero-copy mmap for flat indexes where this FAISS build supports it."""
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return mmap_flag | faiss.IO_FLAG_READ_ONLY
+
+
+def _current(index_dir: Path) -> dict:
+    """The live index/docstore file names (defaults until the first rebuild)."""
+    try:
+        with open(index_dir / CURRENT_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"index": INDEX_FILE, "docstore": DOCSTORE_FILE, "epoch": 0}
+
+
+def _publish(index_dir: Path, index_name: str, docstore_name: str, epoch: int):
+    """Atomically point readers at an index/docstore pair.
+
+    The epoch is bumped on every write so readers also notice tombstones.
+    """
+    tmp_path = index_dir / (CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"index": index_name, "docstore": docstore_name, "epoch": epoch}, f)
+    os.replace(tmp_path, index_dir / CURRENT_FILE)
+
+
+def _remove_stale_generations(index_dir: Path, current: dict):
+    """Delete index/docstore files no longer referenced by CURRENT.
+
+    Readers that still have them open keep working (POSIX); where the OS
+    refuses, the files are retried on the next rebuild.
+    """
+    live = {current["index"], current["docstore"]}
+    for pattern in ("index*.faiss", "docstore*.sqlite"):
+        for path in index_dir.glob(pattern):
+            if path.name not in live:
+                for stale in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        pass
+
+
+class RowIdMap(Mapping):
+    """FAISS row -> docstore id, without materialising a dict per worker.
+
+    Docstore ids are simply the row numbers as strings.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._size:
+            raise KeyError(row)
+        return str(row)
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self):
+        return self._size
+
+
+class SQLiteDocstore:
+    """Read-only docstore backed by one generation of docstore.sqlite.
+
+    The connection is opened up front so the instance keeps working after
+    compaction unlinks its file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._db.execute(f"PRAGMA mmap_size={_SQLITE_MMAP_SIZE}")
+        self._lock = threading.Lock()
+        # Scope -> FAISS rows, LRU; a new docstore is opened for every index version
+        self._scope_rows: "OrderedDict[tuple, object]" = OrderedDict()
+        self._scope_bytes = 0
+        self._deleted_rows = None
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def search(self, search: str):
+        """Return the Document stored under an id, or an error string like InMemoryDocstore."""
+        from langchain_core.documents import Document
+
+        rows = self._query("SELECT content, metadata FROM documents WHERE row = ?", (int(search),))
+        if not rows:
+            return f"ID {search} not found."
+        return Document(page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def partitions(self) -> List[dict]:
+        """Indexed (live) documents with their collection, chunk count and content hash."""
+        rows = self._query(
+            "SELECT d.source, d.collection, COUNT(*), s.content_hash, s.indexed_at"
+            " FROM documents d LEFT JOIN sources s ON s.source = d.source"
+            " WHERE d.deleted = 0 GROUP BY d.source, d.collection ORDER BY d.source"
+        )
+        return [
+            {"document": r[0], "collection": r[1], "chunks": r[2], "content_hash": r[3], "indexed_at": r[4]}
+            for r in rows
+        ]
+
+    def source_for_hash(self, content_hash: str) -> Optional[str]:
+        """Name of the live document with this content hash, if any."""
+        rows = self._query("SELECT source FROM sources WHERE content_hash = ?", (content_hash,))
+        return rows[0][0] if rows else None
+
+    def rows_in_scope(self, documents: Optional[List[str]] = None, collections: Optional[List[str]] = None):
+        """Sorted int64 array of the live FAISS rows belonging to any of the named documents/collections."""
+        import numpy as np
+
+        key = (tuple(sorted(documents or [])), tuple(sorted(collections or [])))
+        with self._lock:
+            rows = self._scope_rows.get(key)
+            if rows is not None:
+                self._scope_rows.move_to_end(key)
+        if rows is None:
+            clauses, params = [], []
+            if key[0]:
+                clauses.append(f"source IN ({','.join('?' * len(key[0]))})")
+                params.extend(key[0])
+            if key[1]:
+                clauses.append(f"collection IN ({','.join('?' * len(key[1]))})")
+                params.extend(key[1])
+            result = self._query(
+                f"SELECT row FROM documents WHERE deleted = 0 AND ({' OR '.join(clauses)}) ORDER BY row", params
+            )
+            rows = np.fromiter((r[0] for r in result), dtype="int64", count=len(result))
+            with self._lock:
+                old = self._scope_rows.pop(key, None)
+                if old is not None:
+                    self._scope_bytes -= old.nbytes
+                self._scope_rows[key] = rows
+                self._scope_bytes += rows.nbytes
+                while len(self._scope_rows) > SCOPE_CACHE_ENTRIES:
+                    self._scope_bytes -= self._scope_rows.popitem(last=False)[1].nbytes
+        return rows
+
+    def scope_cache_nbytes(self) -> int:
+        """Size of the cached scope rows (see memory_budget.py)."""
+        return self._scope_bytes
+
+    def evict_scope_cache(self, nbytes: int) -> int:
+        """Drop the least recently used scopes until nbytes are freed; returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            while self._scope_rows and freed < nbytes:
+                freed += self._scope_rows.popitem(last=False)[1].nbytes
+            self._scope_bytes -= freed
+        return freed
+
+    def deleted_rows(self):
+        """Sorted int64 array of tombstoned rows."""
+        import numpy as np
+
+        if self._deleted_rows is None:
+            result = self._query("SELECT row FROM documents WHERE deleted = 1 ORDER BY row")
+            self._deleted_rows = np.fromiter((r[0] for r in result), dtype="int64", count=len(result))
+        return self._deleted_rows
+
+    def add(self, texts: Dict[str, object]) -> None:
+        raise NotImplementedError("Memory-mapped indexes are read-only; use IndexWriter")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("Memory-mapped indexes are read-only; use IndexWriter")
+
+
+def _create_docstore(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        " row INTEGER PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL,"
+        " source TEXT, collection TEXT, deleted INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sources ("
+        " source TEXT PRIMARY KEY, content_hash TEXT, collection TEXT, indexed_at TEXT)"
+    )
+    # Docstores written before scoped search / tombstones lack these columns
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(documents)")}
+    for column in ("source", "collection"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE documents ADD COLUMN {column} TEXT")
+            conn.execute(f"UPDATE documents SET {column} = json_extract(metadata, '$.{column}')")
+    if "deleted" not in columns:
+        conn.execute("ALTER TABLE documents ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS documents_source ON documents (source)")
+    conn.execute("CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection)")
+    conn.execute("CREATE INDEX IF NOT EXISTS sources_hash ON sources (content_hash)")
+    conn.commit()
+    return conn
+
+
+def _document_row(row: int, doc) -> tuple:
+    return (
+        row,
+        doc.page_content,
+        json.dumps(doc.metadata, ensure_ascii=False),
+        doc.metadata.get("source"),
+        doc.metadata.get("collection"),
+    )
+
+
+_INSERT_DOCUMENT = (
+    "INSERT OR REPLACE INTO documents (row, content, metadata, source, collection) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+def _check_not_legacy(index_dir: Path):
+    if (
+        not (index_dir / CURRENT_FILE).exists()
+        and not (index_dir / DOCSTORE_FILE).exists()
+        and (index_dir / LEGACY_DOCSTORE_FILE).exists()
+    ):
+        raise FileNotFoundError(
+            f"{index_dir} uses the old pickle format. Convert it once with: "
+            f"python backend/index_store.py migrate"
+        )
+
+
+def load_index(index_dir, embeddings):
+    """Open an index read-only: vectors memory-mapped, documents served from SQLite."""
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_dir = Path(index_dir)
+    _check_not_legacy(index_dir)
+    current = _current(index_dir)
+    index = faiss.read_index(str(index_dir / current["index"]), _read_flags(faiss))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SQLiteDocstore(index_dir / current["docstore"]),
+        index_to_docstore_id=RowIdMap(index.ntotal),
+    )
+
+
+def _search_selector(vectorstore, documents: Optional[List[str]], collections: Optional[List[str]]):
+    """(selector, candidate rows) for a search restricted to a scope and to live rows.
+
+    The selector is None when nothing needs excluding.
+    """
+    import faiss
+
+    docstore = vectorstore.docstore
+    if documents or collections:
+        rows = docstore.rows_in_scope(documents, collections)
+        if not len(rows):
+            return None, 0
+        if rows[-1] - rows[0] + 1 == len(rows):
+            # A single upload occupies one contiguous block of rows
+            return faiss.IDSelectorRange(int(rows[0]), int(rows[-1]) + 1), len(rows)
+        return faiss.IDSelectorBatch(len(rows), faiss.swig_ptr(rows)), len(rows)
+    deleted = docstore.deleted_rows()
+    if not len(deleted):
+        return None, vectorstore.index.ntotal
+    excluded = faiss.IDSelectorBatch(len(deleted), faiss.swig_ptr(deleted))
+    return faiss.IDSelectorNot(excluded), vectorstore.index.ntotal - len(deleted)
+
+
+def _documents_for_rows(vectorstore, rows) -> List:
+    results = []
+    for row in rows:
+        if row == -1:
+            continue
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
+        if not isinstance(doc, str):
+            results.append(doc)
+    return results
+
+
+def similarity_search(vectorstore, query: str, k: int = 4,
+                      documents: Optional[List[str]] = None,
+                      collections: Optional[List[str]] = None) -> List:
+    """Top-k search over live rows, restricted to the given documents/collections when any are named.
+
+    Scope and tombstones are applied inside FAISS with an id selector, so
+    only the selected rows are scanned and all k results are usable.
+    """
+    import faiss
+    import numpy as np
+
+    selector, candidates = _search_selector(vectorstore, documents, collections)
+    if candidates <= 0:
+        return []
+    if selector is None:
+        return vectorstore.similarity_search(query, k=k)
+
+    query_vector = np.asarray([vectorstore.embedding_function.embed_query(query)], dtype="float32")
+    _, indices = vectorstore.index.search(
+        query_vector, min(k, candidates), params=faiss.SearchParameters(sel=selector)
+    )
+    return _documents_for_rows(vectorstore, indices[0])
+
+
+def similarity_search_batch(vectorstore, queries: List[str], k: int = 4,
+                            documents: Optional[List[str]] = None,
+                            collections: Optional[List[str]] = None) -> List[List]:
+    """similarity_search for many queries: one embedding call and one FAISS search for all of them."""
+    if not queries:
+        return []
+    return search_vectors(vectorstore, vectorstore.embedding_function.embed_documents(list(queries)),
+                          k, documents, collections)
+
+
+def search_vectors(vectorstore, query_vectors, k: int = 4,
+                   documents: Optional[List[str]] = None,
+                   collections: Optional[List[str]] = None) -> List[List]:
+    """Top-k documents for already-embedded queries, in one FAISS search."""
+    if not len(query_vectors):
+        return []
+    _, rows = search_rows(vectorstore, query_vectors, k, documents, collections)
+    return [_documents_for_rows(vectorstore, row_ids) for row_ids in rows]
+
+
+def search_rows(vectorstore, query_vectors, k: int = 4,
+                documents: Optional[List[str]] = None,
+                collections: Optional[List[str]] = None):
+    """(scores, rows) arrays of the top-k live rows per query, in one FAISS search.
+
+    Higher scores are closer whatever the index metric, so results from
+    several indexes can be merged by score. Rows of -1 are padding.
+    """
+    import faiss
+    import numpy as np
+
+    query_vectors = np.asarray(query_vectors, dtype="float32")
+    selector, candidates = _search_selector(vectorstore, documents, collections)
+    if candidates <= 0:
+        return np.empty((len(query_vectors), 0), dtype="float32"), np.empty((len(query_vectors), 0), dtype="int64")
+    if selector is None:
+        distances, rows = vectorstore.index.search(query_vectors, min(k, candidates))
+    else:
+        distances, rows = vectorstore.index.search(
+            query_vectors, min(k, candidates), params=faiss.SearchParameters(sel=selector)
+        )
+    if vectorstore.index.metric_type == faiss.METRIC_L2:
+        distances = -distances
+    return distances, rows
+
+
+class IndexWriter:
+    """Changes an index and atomically publishes the result.
+
+    With reset=True a fresh generation is built and swapped in on commit();
+    otherwise documents are appended to the live one. Readers that already
+    mapped the old files keep working; rows past their ntotal are simply
+    never looked up. Writers are serialised across processes by a lock file;
+    with lock_timeout, FileLock's LockTimeout is raised if it stays busy.
+    """
+
+    def __init__(self, index_dir, embeddings=None, reset: bool = False, lock_timeout: Optional[float] = None):
+        import faiss
+
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.embeddings = embeddings
+        self.reset = reset
+        self._faiss = faiss
+        self._lock = FileLock(self.index_dir / LOCK_FILE)
+        self._lock.acquire(lock_timeout)
+        try:
+            if not reset:
+                _check_not_legacy(self.index_dir)
+            self._current = _current(self.index_dir)
+            if reset:
+                generation = f"{int(time.time() * 1000)}"
+                self._index_name = f"index-{generation}.faiss"
+                self._docstore_name = f"docstore-{generation}.sqlite"
+            else:
+                self._index_name = self._current["index"]
+                self._docstore_name = self._current["docstore"]
+            self._index = None
+            self._index_loaded = reset
+            self._dirty = False
+            self._conn = _create_docstore(self.index_dir / self._docstore_name)
+        except Exception:
+            self._lock.release()
+            raise
+
+    @property
+    def index(self):
+        """The FAISS index, read in full (writable) on first use."""
+        if not self._index_loaded:
+            index_path = self.index_dir / self._index_name
+            if index_path.exists():
+                self._index = self._faiss.read_index(str(index_path))
+            self._index_loaded = True
+        return self._index
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def add_documents(self, documents: List, vectors: Optional[Iterable] = None) -> List[int]:
+        """Embed (unless vectors are given) and append documents; returns their rows."""
+        import numpy as np
+
+        if not documents:
+            return []
+        if vectors is None:
+            vectors = self.embeddings.embed_documents([d.page_content for d in documents])
+        matrix = np.asarray(vectors, dtype="float32")
+        if self.index is None:
+            self._index = self._faiss.IndexFlatL2(matrix.shape[1])
+        start = self._index.ntotal
+        self._index.add(matrix)
+        self._dirty = True
+        rows = list(range(start, start + len(documents)))
+        self._conn.executemany(_INSERT_DOCUMENT, [_document_row(row, d) for row, d in zip(rows, documents)])
+        return rows
+
+    def sources(self) -> List[dict]:
+        """Documents with live rows in the index being written."""
+        rows = self._conn.execute(
+            "SELECT DISTINCT source, collection FROM documents WHERE deleted = 0 ORDER BY source"
+        ).fetchall()
+        return [{"source": r[0], "collection": r[1]} for r in rows]
+
+    def source_for_hash(self, content_hash: str) -> Optional[str]:
+        row = self._conn.execute("SELECT source FROM sources WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def replace_source(self, source: str, first_row: int, content_hash: Optional[str] = None,
+                       collection: Optional[str] = None) -> int:
+        """Register a freshly added document and tombstone its previous version.
+
+        Rows of the same source below first_row are the old version.
+        Returns the number of rows tombstoned.
+        """
+        cursor = self._conn.execute(
+            "UPDATE documents SET deleted = 1 WHERE source = ? AND row < ? AND deleted = 0",
+            (source, first_row),
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sources (source, content_hash, collection, indexed_at) VALUES (?, ?, ?, ?)",
+            (source, content_hash, collection, datetime.now().isoformat()),
+        )
+        return cursor.rowcount
+
+    def delete_source(self, source: str) -> int:
+        """Tombstone every row of a document; returns the number of rows removed from search."""
+        cursor = self._conn.execute(
+            "UPDATE documents SET deleted = 1 WHERE source = ? AND deleted = 0", (source,)
+        )
+        self._conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+        return cursor.rowcount
+
+    def copy_sources(self, conn: sqlite3.Connection):
+        """Carry the document registry over from another docstore (used by compaction)."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO sources (source, content_hash, collection, indexed_at) VALUES (?, ?, ?, ?)",
+            conn.execute("SELECT source, content_hash, collection, indexed_at FROM sources").fetchall(),
+        )
+
+    def commit(self):
+        """Write the docstore, then swap the new index (and CURRENT) in atomically."""
+        try:
+            self._conn.commit()
+            self._conn.close()
+            if self._dirty or (self.reset and self._index is not None):
+                tmp_path = self.index_dir / (self._index_name + ".tmp")
+                self._faiss.write_index(self._index, str(tmp_path))
+                os.replace(tmp_path, self.index_dir / self._index_name)
+            if self.reset and self._index is None:
+                # Nothing was indexed - keep the current generation
+                _remove_stale_generations(self.index_dir, self._current)
+                return
+            _publish(self.index_dir, self._index_name, self._docstore_name, self._current["epoch"] + 1)
+            if self.reset:
+                _remove_stale_generations(self.index_dir, _current(self.index_dir))
+        finally:
+            self._lock.release()
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+            self._conn.close()
+            if self.reset:
+                _remove_stale_generations(self.index_dir, self._current)
+        finally:
+            self._lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def tombstone_stats(index_dir) -> dict:
+    """Live and tombstoned row counts of the current generation."""
+    index_dir = Path(index_dir)
+    docstore_path = index_dir / _current(index_dir)["docstore"]
+    if not docstore_path.exists():
+        return {"live": 0, "deleted": 0, "ratio": 0.0}
+    conn = sqlite3.connect(f"file:{docstore_path}?mode=ro", uri=True)
+    try:
+        live, deleted = conn.execute(
+            "SELECT COALESCE(SUM(deleted = 0), 0), COALESCE(SUM(deleted = 1), 0) FROM documents"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        live, deleted = 0, 0  # pre-tombstone docstore
+    finally:
+        conn.close()
+    total = live + deleted
+    return {"live": live, "deleted": deleted, "ratio": deleted / total if total else 0.0}
+
+
+def registered_sources(index_dir) -> Dict[str, dict]:
+    """source -> {content_hash, collection} of the documents in the current generation."""
+    index_dir = Path(index_dir)
+    docstore_path = index_dir / _current(index_dir)["docstore"]
+    if not docstore_path.exists():
+        return {}
+    conn = sqlite3.connect(f"file:{docstore_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT source, content_hash, collection FROM sources").fetchall()
+    except sqlite3.OperationalError:
+        rows = []  # pre-registry docstore
+    finally:
+        conn.close()
+    return {source: {"content_hash": content_hash, "collection": collection}
+            for source, content_hash, collection in rows}
+
+
+def compact_index(index_dir) -> int:
+    """Rewrite the index without tombstoned rows; returns the number of rows dropped.
+
+    Vectors are copied out of the old index, so nothing is re-embedded.
+    """
+    import numpy as np
+    from langchain_core.documents import Document
+
+    index_dir = Path(index_dir)
+    with IndexWriter(index_dir, reset=True) as writer:
+        current = writer._current
+        old = sqlite3.connect(str(index_dir / current["docstore"]))
+        try:
+            deleted = old.execute("SELECT COUNT(*) FROM documents WHERE deleted = 1").fetchone()[0]
+            if not deleted:
+                return 0
+            old_index = writer._faiss.read_index(str(index_dir / current["index"]))
+            cursor = old.execute(
+                "SELECT row, content, metadata FROM documents WHERE deleted = 0 AND row < ? ORDER BY row",
+                (old_index.ntotal,),
+            )
+            while True:
+                block = cursor.fetchmany(_COMPACT_BLOCK)
+                if not block:
+                    break
+                rows = np.asarray([r[0] for r in block], dtype="int64")
+                vectors = old_index.reconstruct_batch(rows)
+                docs = [Document(page_content=r[1], metadata=json.loads(r[2])) for r in block]
+                writer.add_documents(docs, vectors=vectors)
+            if writer._index is None:
+                # Every row was deleted - start from an empty index of the same dimension
+                writer._index = writer._faiss.IndexFlatL2(old_index.d)
+            writer.copy_sources(old)
+        finally:
+            old.close()
+    return deleted
+
+
+def maybe_compact(index_dir, min_ratio: float) -> int:
+    """Compact when at least min_ratio of the rows are tombstones."""
+    stats = tombstone_stats(index_dir)
+    if not stats["deleted"] or stats["ratio"] < min_ratio:
+        return 0
+    return compact_index(index_dir)
+
+
+class CachedIndex:
+    """Per-process handle that re-maps the index only when a writer published a new version."""
+
+    def __init__(self, index_dir, embeddings_factory):
+        self.index_dir = Path(index_dir)
+        self._embeddings_factory = embeddings_factory
+        self._lock = threading.Lock()
+        self._version = None
+        self._vectorstore = None
+        self._files = []
+
+    def version(self):
+        """Identity of the published index (changes on every commit)."""
+        try:
+            current = os.stat(self.index_dir / CURRENT_FILE)
+            current_id = (current.st_ino, current.st_mtime_ns)
+        except FileNotFoundError:
+            current_id = None
+        try:
+            st = os.stat(self.index_dir / _current(self.index_dir)["index"])
+        except FileNotFoundError:
+            return None
+        return (current_id, st.st_ino, st.st_mtime_ns)
+
+    def get(self):
+        """Return the current vector store, or None if nothing has been indexed yet."""
+        version = self.version()
+        if version is None:
+            return None
+        if not (self.index_dir / _current(self.index_dir)["docstore"]).exists():
+            if not (self.index_dir / LEGACY_DOCSTORE_FILE).exists():
+                return None
+        with self._lock:
+            if self._vectorstore is None or version != self._version:
+                self._vectorstore = load_index(self.index_dir, self._embeddings_factory())
+                self._version = version
+                current = _current(self.index_dir)
+                self._files = [self.index_dir / current["index"], self.index_dir / current["docstore"]]
+            return self._vectorstore
+
+    def nbytes(self) -> int:
+        """Size of the mapped index and docstore (0 until loaded; see memory_budget.py)."""
+        total = 0
+        for path, limit in zip(self._files, (None, _SQLITE_MMAP_SIZE)):
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue  # replaced by a newer version, mapped on the next get()
+            total += min(size, limit) if limit else size
+        return total
+
+    def scope_cache_nbytes(self) -> int:
+        """Size of the current docstore's cached scope rows."""
+        vectorstore = self._vectorstore
+        return vectorstore.docstore.scope_cache_nbytes() if vectorstore is not None else 0
+
+    def evict_scope_cache(self, nbytes: int) -> int:
+        vectorstore = self._vectorstore
+        return vectorstore.docstore.evict_scope_cache(nbytes) if vectorstore is not None else 0
+
+
+def migrate_legacy_index(index_dir, embeddings) -> int:
+    """Convert a FAISS.save_local index (index.pkl) to docstore.sqlite.
+
+    This is the only place that unpickles - run it once on an index you created.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    index_dir = Path(index_dir)
+    legacy = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True)
+    tmp_path = index_dir / (DOCSTORE_FILE + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    conn = _create_docstore(tmp_path)
+    rows = []
+    for row in range(legacy.index.ntotal):
+        doc = legacy.docstore.search(legacy.index_to_docstore_id[row])
+        rows.append(_document_row(row, doc))
+    conn.executemany(_INSERT_DOCUMENT, rows)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_dir / DOCSTORE_FILE)
+    (index_dir / LEGACY_DOCSTORE_FILE).rename(index_dir / (LEGACY_DOCSTORE_FILE + ".bak"))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from backend.config import VECTOR_STORE_PATH
+    from backend.embeddings import get_embeddings
+
+    commands = ("migrate", "compact")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python backend/index_store.py {migrate|compact} [index_dir]")
+        sys.exit(1)
+
+    target = Path(sys.argv[2]) if len(sys.argv) > 2 else VECTOR_STORE_PATH
+    if sys.argv[1] == "migrate":
+        count = migrate_legacy_index(target, get_embeddings())
+        print(f"🎯 Migrated {count} documents in {target} to {DOCSTORE_FILE}")
+    else:
+        removed = compact_index(target)
+        print(f"🧹 Compacted {target}: dropped {removed} deleted rows")
@@ -1,44 +1,449 @@
+# backend/ingest.py
+"""
+Offline ingestion: PDFs (and plain .txt files) in DATA_DIR -> chunk store -> FAISS index.
+
+One resumable command replaces the three hand-run scripts (ingest.py for
+PDF -> .txt, chunker.py, embed_and_index.py):
+
+    python backend/ingest.py                  # index new and changed documents
+    python backend/ingest.py --rebuild        # re-embed everything into a fresh index
+    python backend/ingest.py --chunk-only     # extract and chunk, no embedding
+
+The stages stream into each other:
+
+    extract+chunk  --extract-workers processes, one document each; pages go
+                   from PyPDF2 straight to the .txt file and the chunk store
+    embed          chunks read back in --batch-size batches and embedded by
+                   --embed-workers threads, at most --prefetch batches ahead
+    index          one IndexWriter at a time, opened when the first embedded batch
+                   arrives and committed every --checkpoint-seconds
+
+Every document has a checkpoint manifest in INGEST_STATE_DIR: its content
+hash, chunk settings, embedding model and the stage it reached. Rerunning
+after a crash skips documents that are already indexed, sends chunked ones
+straight to embedding, and repeats at most one checkpoint interval of
+embedding work. Documents the index already holds with the same content
+(e.g. uploaded through the API) are skipped as well. --rebuild publishes
+the new index once, at the end, so only extraction and chunking resume.
+
+The run ends with a throughput report per stage (--report saves it as JSON).
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
-import PyPDF2
-
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a given PDF file."""
-    text = ""
-    with open(pdf_path, "rb") as file:
-        reader = PyPDF2.PdfReader(file)
-        for page_num, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Allow running as `python backend/ingest.py` from the project root (worker processes import this too)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.chunk_store import ChunkStore
+from backend.chunking import iter_chunks, iter_pdf_pages, iter_text_pages, write_pages
+from backend.config import (
+    CHUNK_OVERLAP_TOKENS, CHUNK_STORE_DIR, CHUNK_TOKENS, DATA_DIR, EMBEDDING_MODEL, INGEST_STATE_DIR,
+    VECTOR_STORE_PATH,
+)
+
+EMBED_BATCH_SIZE = 256
+
+
+@dataclass
+class Source:
+    document: str
+    path: Optional[Path]            # None for chunk-store documents with no source file (--rebuild)
+    content_hash: Optional[str] = None
+    collection: Optional[str] = None
+
+
+def file_hash(path: Path) -> str:
+    """sha256 of a source file (the same key /upload-pdf deduplicates on)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover(data_dir: Path) -> Dict[str, Path]:
+    """Source files by document name: PDFs, and .txt files that aren't a PDF's extracted text."""
+    pdfs = {p.stem: p for p in data_dir.glob("*.pdf")}
+    texts = {p.stem: p for p in data_dir.glob("*.txt") if p.stem not in pdfs}
+    return dict(sorted({**texts, **pdfs}.items()))
+
+
+class Manifest:
+    """One JSON checkpoint per document, each replaced atomically."""
+
+    def __init__(self, state_dir):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, document: str) -> Path:
+        return self.state_dir / f"{document}.json"
+
+    def get(self, document: str) -> dict:
+        try:
+            return json.loads(self._path(document).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def update(self, document: str, **fields) -> dict:
+        entry = {**self.get(document), **fields, "document": document, "updated_at": datetime.now().isoformat()}
+        tmp_path = self._path(document).with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(entry, indent=2))
+        os.replace(tmp_path, self._path(document))
+        return entry
+
+    def file_hash(self, document: str, path: Path) -> str:
+        """The file's hash, reused from the manifest while its size and mtime are unchanged."""
+        cached = self.get(document).get("file", {})
+        stat = path.stat()
+        if cached.get("size") == stat.st_size and cached.get("mtime") == stat.st_mtime:
+            return cached["sha256"]
+        content_hash = file_hash(path)
+        self.update(document, file={"size": stat.st_size, "mtime": stat.st_mtime, "sha256": content_hash})
+        return content_hash
+
+
+def extract_and_chunk(path: str, document: str, chunk_dir: str, collection: Optional[str],
+                      chunk_tokens: int, overlap_tokens: int) -> dict:
+    """Stream one document's pages into its .txt file and the chunk store (runs in a worker process)."""
+    start = time.perf_counter()
+    path = Path(path)
+    page_count = 0
+
+    def counted(pages):
+        nonlocal page_count
+        for page in pages:
+            page_count += 1
+            yield page
+
+    extra = {"collection": collection} if collection else None
+    store = ChunkStore(chunk_dir)
+    txt_tmp = path.with_suffix(".txt.tmp")
+    try:
+        with store.writer(document) as writer:
+            if path.suffix == ".pdf":
+                with open(txt_tmp, "w", encoding="utf-8") as txt_file:
+                    pages = write_pages(counted(iter_pdf_pages(path)), txt_file)
+                    for chunk in iter_chunks(pages, document, chunk_tokens, overlap_tokens, extra_metadata=extra):
+                        writer.append(chunk)
             else:
-                print(f"⚠️ No text found on page {page_num + 1} of {pdf_path}")
-    return text
-
-def save_text_to_file(text, output_path):
-    """Save extracted text into a .txt file."""
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(text)
-
-def process_all_pdfs(data_folder="backend/data"):
-    """Process all PDFs in the folder."""
-    print("🔍 Looking for PDFs in:", os.path.abspath(data_folder))
-
-    files = os.listdir(data_folder)
-    print("📂 Found files:", files)
-
-    for filename in files:
-        if filename.endswith(".pdf"):
-            pdf_path = os.path.join(data_folder, filename)
-            txt_path = os.path.splitext(pdf_path)[0] + ".txt"
-
-            print(f"\n📘 Processing: {filename} ...")
-            try:
-                text = extract_text_from_pdf(pdf_path)
-                save_text_to_file(text, txt_path)
-                print(f"✅ Saved extracted text to {txt_path}")
-            except Exception as e:
-                print(f"❌ Error processing {filename}: {e}")
-
-if __name__== "__main__":
-    process_all_pdfs()
-    print("\n🎯 Done extracting all PDFs!")
+                pages = counted(iter_text_pages(path))
+                for chunk in iter_chunks(pages, document, chunk_tokens, overlap_tokens, extra_metadata=extra):
+                    writer.append(chunk)
+            if not writer.count:
+                raise ValueError("No text could be extracted")
+            chunks = writer.count
+        if path.suffix == ".pdf":
+            os.replace(txt_tmp, path.with_suffix(".txt"))
+    finally:
+        txt_tmp.unlink(missing_ok=True)
+    return {"pages": page_count, "chunks": chunks, "seconds": time.perf_counter() - start}
+
+
+class Stats:
+    """Per-stage counters for the throughput report (updated from several threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {
+            "extract": {"documents": 0, "pages": 0, "chunks": 0, "failed": 0, "busy_seconds": 0.0},
+            "embed": {"batches": 0, "chunks": 0, "busy_seconds": 0.0},
+            "index": {"documents": 0, "rows": 0, "commits": 0, "busy_seconds": 0.0},
+        }
+
+    def add(self, stage: str, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stages[stage][key] += value
+
+    def report(self, plan: dict) -> dict:
+        wall = time.perf_counter() - self.started
+        extract, embed, index = self.stages["extract"], self.stages["embed"], self.stages["index"]
+        rate = lambda n, seconds: round(n / seconds, 1) if seconds else None
+        extract["pages_per_second"] = rate(extract["pages"], extract["busy_seconds"])
+        embed["chunks_per_second"] = rate(embed["chunks"], embed["busy_seconds"])
+        index["rows_per_second"] = rate(index["rows"], index["busy_seconds"])
+        for stage in self.stages.values():
+            stage["busy_seconds"] = round(stage["busy_seconds"], 2)
+        return {
+            "plan": plan,
+            "stages": self.stages,
+            "wall_seconds": round(wall, 2),
+            "chunks_per_second": rate(index["rows"] or extract["chunks"], wall),
+        }
+
+
+def plan_sources(args, manifest: Manifest, chunk_store: ChunkStore, registry: Dict[str, dict]):
+    """Split the sources into (to extract, already chunked, skipped)."""
+    chunking = {"chunk_tokens": args.chunk_tokens, "overlap_tokens": args.overlap_tokens}
+    upload_chunking = {"chunk_tokens": CHUNK_TOKENS, "overlap_tokens": CHUNK_OVERLAP_TOKENS}
+    to_extract, chunked, skipped = [], [], []
+    files = discover(args.data_dir)
+    for document, path in files.items():
+        content_hash = manifest.file_hash(document, path)
+        entry = manifest.get(document)
+        registered = registry.get(document, {})
+        collection = args.collection or entry.get("collection") or registered.get("collection")
+        source = Source(document, path, content_hash, collection)
+        # The index already has this content (indexed by an earlier run or uploaded through the API)
+        indexed = registered.get("content_hash") == content_hash and registered.get("collection") == collection
+        if indexed and not args.rebuild and not args.chunk_only:
+            skipped.append(source)
+            continue
+        if document in chunk_store and (
+                (entry.get("stage") in ("chunked", "indexed") and entry.get("content_hash") == content_hash
+                 and entry.get("chunking") == chunking and entry.get("collection") == collection)
+                or (not entry.get("stage") and indexed and chunking == upload_chunking)):
+            chunked.append(source)
+        else:
+            to_extract.append(source)
+    if args.rebuild:
+        # A rebuild keeps every document in the chunk store, with or without a source file
+        for document in chunk_store.documents():
+            if document not in files:
+                registered = registry.get(document, {})
+                chunked.append(Source(document, None, registered.get("content_hash"), registered.get("collection")))
+    return to_extract, chunked, skipped
+
+
+def run(args) -> dict:
+    from backend.index_store import registered_sources
+
+    stats = Stats()
+    manifest = Manifest(args.state_dir)
+    chunk_store = ChunkStore(args.chunk_dir)
+    registry = registered_sources(args.index_dir)
+    to_extract, chunked, skipped = plan_sources(args, manifest, chunk_store, registry)
+    plan = {"extract": len(to_extract), "embed_only": len(chunked), "skipped": len(skipped)}
+    print(f"📂 {len(to_extract) + len(chunked) + len(skipped)} documents in {args.data_dir}: "
+          f"{len(to_extract)} to extract, {len(chunked)} already chunked, {len(skipped)} already indexed")
+
+    stale = sorted({e.get("embedding_model") for s in skipped + chunked
+                    for e in [manifest.get(s.document)] if e.get("stage") == "indexed"} - {None, EMBEDDING_MODEL})
+    if stale and not args.rebuild and not args.chunk_only:
+        raise SystemExit(f"❌ The index was built with {', '.join(stale)}, not {EMBEDDING_MODEL}. "
+                         f"Vectors from different models can't be mixed: run with --rebuild")
+
+    ready: queue.Queue = queue.Queue()   # Sources whose chunks are in the chunk store, then None
+    embedded: queue.Queue = queue.Queue(maxsize=max(1, args.prefetch))
+    for source in chunked:
+        ready.put(source)
+
+    errors: List[BaseException] = []
+
+    def extract_all():
+        try:
+            extract_documents()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            ready.put(None)
+
+    def extract_documents():
+        if not to_extract:
+            return
+        chunking = {"chunk_tokens": args.chunk_tokens, "overlap_tokens": args.overlap_tokens}
+        # spawn: worker processes mustn't inherit the embedding model's threads
+        with ProcessPoolExecutor(max_workers=args.extract_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                pool.submit(extract_and_chunk, str(s.path), s.document, str(args.chunk_dir), s.collection,
+                            args.chunk_tokens, args.overlap_tokens): s
+                for s in to_extract
+            }
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats.add("extract", failed=1)
+                    manifest.update(source.document, stage="failed", error=str(e))
+                    print(f"❌ {source.document}: {e}")
+                    continue
+                stats.add("extract", documents=1, pages=result["pages"], chunks=result["chunks"],
+                          busy_seconds=result["seconds"])
+                manifest.update(source.document, stage="chunked", content_hash=source.content_hash,
+                                chunking=chunking, collection=source.collection,
+                                pages=result["pages"], chunks=result["chunks"], error=None)
+                print(f"📄 {source.document}: {result['pages']} pages → {result['chunks']} chunks")
+                ready.put(source)
+
+    if args.chunk_only:
+        extract_all()
+        if errors:
+            raise errors[0]
+        return stats.report(plan)
+
+    from langchain_core.documents import Document
+    from backend.embeddings import get_embeddings
+    from backend.index_store import IndexWriter
+
+    print("Loading embedding model...")
+    embeddings = get_embeddings()
+
+    def embed(texts: List[str]):
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        stats.add("embed", batches=1, chunks=len(texts), busy_seconds=time.perf_counter() - start)
+        return vectors
+
+    def embed_all(pool: ThreadPoolExecutor):
+        try:
+            while True:
+                source = ready.get()
+                if source is None:
+                    break
+                count = 0
+                chunks = chunk_store.iter_chunks([source.document])
+                while True:
+                    batch = [Document(page_content=c.text, metadata=c.metadata)
+                             for c in islice(chunks, args.batch_size)]
+                    if not batch:
+                        break
+                    count += len(batch)
+                    # Bounded queue: embedding stays at most --prefetch batches ahead of the index
+                    embedded.put(("batch", source, batch, pool.submit(embed, [d.page_content for d in batch])))
+                embedded.put(("done", source, count))
+            embedded.put(None)
+        except Exception as e:
+            embedded.put(("error", e))
+
+    # The index lock is only held while there is something to write: the writer is opened
+    # when the first embedded batch arrives (and again after each checkpoint), so API
+    # uploads and deletes aren't locked out while documents are extracted and embedded
+    writer = None
+
+    def open_writer():
+        nonlocal writer
+        if writer is None:
+            writer = IndexWriter(args.index_dir, embeddings, reset=args.rebuild)
+        return writer
+
+    extractor = threading.Thread(target=extract_all, name="ingest-extract", daemon=True)
+    extractor.start()
+    embed_pool = ThreadPoolExecutor(max_workers=args.embed_workers, thread_name_prefix="ingest-embed")
+    embedder = threading.Thread(target=embed_all, args=(embed_pool,), name="ingest-embed-feed", daemon=True)
+    embedder.start()
+    pending: List[Source] = []
+    first_rows: Dict[str, int] = {}
+    last_commit = time.perf_counter()
+
+    def checkpoint():
+        nonlocal writer, last_commit
+        if writer is None:
+            return  # nothing written since the last commit
+        start = time.perf_counter()
+        # commit() unlocks the writer even if it fails, so it must not be rolled back afterwards
+        committing, writer = writer, None
+        committing.commit()
+        stats.add("index", commits=1, busy_seconds=time.perf_counter() - start)
+        for source in pending:
+            manifest.update(source.document, stage="indexed", embedding_model=EMBEDDING_MODEL)
+        if pending:
+            print(f"💾 Checkpoint: {len(pending)} documents committed to the index")
+        pending.clear()
+        last_commit = time.perf_counter()
+
+    try:
+        while True:
+            item = embedded.get()
+            if item is None:
+                break
+            if item[0] == "error":
+                raise item[1]
+            if item[0] == "batch":
+                _, source, batch, future = item
+                vectors = future.result()
+                start = time.perf_counter()
+                index_writer = open_writer()
+                first_rows.setdefault(source.document, index_writer.ntotal)
+                index_writer.add_documents(batch, vectors)
+                stats.add("index", rows=len(batch), busy_seconds=time.perf_counter() - start)
+                continue
+            _, source, count = item
+            if not count:
+                print(f"⚠️ {source.document}: no chunks in the chunk store, skipped")
+                continue
+            # Tombstones the previous version's rows and registers the hash for upload dedup
+            writer.replace_source(source.document, first_rows.pop(source.document),
+                                  content_hash=source.content_hash, collection=source.collection)
+            stats.add("index", documents=1)
+            pending.append(source)
+            # A rebuild is published once, when complete
+            if not args.rebuild and time.perf_counter() - last_commit >= args.checkpoint_seconds:
+                checkpoint()
+        if args.rebuild:
+            open_writer()  # publish the fresh index even if nothing was embedded
+        checkpoint()
+        if errors:
+            raise errors[0]
+    except BaseException:
+        if writer is not None:
+            writer.rollback()
+        print(f"❌ Interrupted - {len(pending)} uncommitted documents will be re-embedded on the next run")
+        raise
+    finally:
+        embed_pool.shutdown(wait=False, cancel_futures=True)
+    return stats.report(plan)
+
+
+def print_report(report: dict):
+    extract, embed, index = (report["stages"][s] for s in ("extract", "embed", "index"))
+    rate = lambda value, unit: f"{value} {unit}" if value is not None else "-"
+    print(f"\n{'stage':10s} {'docs':>6s} {'pages':>8s} {'chunks':>8s} {'busy s':>9s} {'rate':>16s}")
+    print(f"{'extract':10s} {extract['documents']:6d} {extract['pages']:8d} {extract['chunks']:8d} "
+          f"{extract['busy_seconds']:9.1f} {rate(extract['pages_per_second'], 'pages/s'):>16s}")
+    print(f"{'embed':10s} {'':6s} {'':8s} {embed['chunks']:8d} "
+          f"{embed['busy_seconds']:9.1f} {rate(embed['chunks_per_second'], 'chunks/s'):>16s}")
+    print(f"{'index':10s} {index['documents']:6d} {'':8s} {index['rows']:8d} "
+          f"{index['busy_seconds']:9.1f} {rate(index['rows_per_second'], 'rows/s'):>16s}")
+    print(f"\n⏱️  {report['wall_seconds']}s wall, {rate(report['chunks_per_second'], 'chunks/s')} end to end")
+    if extract["failed"]:
+        print(f"❌ {extract['failed']} documents failed - fix them and run again")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Extract, chunk, embed and index the documents in DATA_DIR")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed everything into a fresh index")
+    parser.add_argument("--chunk-only", action="store_true", help="extract and chunk, skip embedding")
+    parser.add_argument("--collection", help="collection (e.g. a course) for the documents processed")
+    parser.add_argument("--extract-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="processes extracting and chunking documents")
+    parser.add_argument("--embed-workers", type=int, default=1, help="threads embedding batches")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks per embedding call")
+    parser.add_argument("--prefetch", type=int, default=4, help="embedded batches buffered ahead of the index")
+    parser.add_argument("--checkpoint-seconds", type=float, default=120.0, help="index commit interval")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--chunk-dir", type=Path, default=CHUNK_STORE_DIR)
+    parser.add_argument("--index-dir", type=Path, default=VECTOR_STORE_PATH)
+    parser.add_argument("--state-dir", type=Path, default=INGEST_STATE_DIR)
+    parser.add_argument("--report", help="save the throughput report as JSON")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    report = run(args)
+    print_report(report)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+        print(f"💾 Report saved to {args.report}")
+    if report["stages"]["extract"]["failed"]:
+        sys.exit(1)
+    print("\n🎯 Done!")
@@ -0,0 +1,67 @@
+# backend/lifecycle.py
+"""
+Startup warm-up and readiness.
+
+Importing the app is cheap: heavy components (embedding model, FAISS
+index, LangChain/Ollama clients) load on first use. At startup the app
+runs an explicit warm-up so the first student doesn't pay for it, and
+GET /ready reports not-ready (503) until the required steps are done.
+"""
+
+import asyncio
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend import metrics
+
+WARMUP_SECONDS = metrics.Gauge("warmup_step_seconds", "Duration of each startup warm-up step", ("step",))
+READY = metrics.Gauge("app_ready", "1 once startup warm-up has finished")
+
+
+class Lifecycle:
+    """Readiness state of this worker."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.ready_at: Optional[float] = None
+        self.steps: Dict[str, dict] = {}
+
+    async def warm_up(self, steps: List[Tuple[str, Callable[[], object], bool]]):
+        """Run (name, function, required) steps in order, off the event loop.
+
+        A failing optional step is recorded but doesn't block readiness;
+        a failing required step leaves the worker not-ready.
+        """
+        for name, step, required in steps:
+            self.steps[name] = {"status": "running", "required": required}
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(step)
+                self.steps[name]["status"] = "ok"
+            except Exception as e:
+                self.steps[name].update(status="failed", error=str(e))
+                print(f"WARNING: Warm-up step {name} failed: {e}")
+                if required:
+                    traceback.print_exc()
+            seconds = time.perf_counter() - start
+            self.steps[name]["seconds"] = round(seconds, 3)
+            WARMUP_SECONDS.set(seconds, step=name)
+
+        if all(s["status"] == "ok" for s in self.steps.values() if s["required"]):
+            self.mark_ready()
+
+    def mark_ready(self):
+        self.ready = True
+        self.ready_at = time.time()
+        READY.set(1)
+        print(f"✅ Ready in {self.ready_at - self.started_at:.1f}s")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "warmup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "steps": self.steps,
+        }
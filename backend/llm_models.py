@@ -0,0 +1,247 @@
+# backend/llm_models.py
+"""
+Ollama model selection, preloading and keep-alive.
+
+Ollama unloads a model after a few idle minutes, and the next request
+pays the load time (seconds for llama2-sized models on CPU). The backend
+picks the best installed model once, preloads it at startup and pins it
+with keep_alive (OLLAMA_KEEP_ALIVE). A background refresh re-reads
+/api/tags: if a better model appears, or the active one disappears, the
+new model is loaded *before* traffic moves to it and the old one is
+released. A model Ollama evicted anyway is reloaded in the background.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from backend import metrics
+
+# Smaller models first for speed, llama2 as the fallback
+MODEL_PRIORITY = [
+    "llama3.2:1b",      # Fastest, smallest (1.3GB) - Best for slow systems
+    "phi3:mini",        # Fast, small (2.3GB)
+    "tinyllama",        # Very fast, tiny (637MB) - Fastest option
+    "llama3.2:3b",      # Medium speed (2GB)
+    "llama2",           # Slower but good quality (3.8GB) - Fallback
+]
+DEFAULT_MODEL = "llama2"
+
+# Smallest to largest, for routing to a lighter or stronger model (see model_router.py)
+MODEL_SIZE_ORDER = ["tinyllama", "llama3.2:1b", "phi3:mini", "llama3.2:3b", "llama2"]
+
+# A request whose reply reports a longer load_duration hit a cold model
+COLD_LOAD_SECONDS = 0.5
+LOAD_TIMEOUT_SECONDS = 600
+
+MODEL_LOADS = metrics.Counter(
+    "llm_model_loads_total", "Model preloads sent to Ollama (reason: startup, profile, swap, evicted)",
+    ("model", "reason", "outcome"))
+MODEL_LOAD_SECONDS = metrics.Histogram(
+    "llm_model_load_seconds", "Time for Ollama to load a model into memory", ("model",))
+MODEL_SWAPS = metrics.Counter("llm_model_swaps_total", "Traffic moved to a different model", ("from_model", "to_model"))
+ACTIVE_MODEL = metrics.Gauge("llm_active_model", "1 for the model serving requests", ("model",))
+COLD_STARTS = metrics.Counter(
+    "llm_cold_starts_total", "Requests that waited for Ollama to load the model", ("model",))
+
+
+def choose_model(installed: List[str]) -> Optional[str]:
+    """Best entry of MODEL_PRIORITY among installed model names (e.g. "llama3.2:1b", "llama2:latest")."""
+    bases = {name.split(":")[0] for name in installed}
+    for model in MODEL_PRIORITY:
+        if model in installed:
+            return model
+        # A base name matches any variant (e.g. "llama3.2" matches "llama3.2:1b")
+        base = model.split(":")[0]
+        if base in bases:
+            for name in installed:
+                if name.startswith(base + ":"):
+                    return name
+            return base
+    return None
+
+
+def normalize_model(name: str) -> str:
+    """One spelling per model: Ollama reports an untagged model as "name:latest"."""
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+def size_rank(name: str) -> Optional[int]:
+    """Position of a model in MODEL_SIZE_ORDER (None for models not listed)."""
+    name = normalize_model(name)
+    return MODEL_SIZE_ORDER.index(name) if name in MODEL_SIZE_ORDER else None
+
+
+class ModelManager:
+    """The model this worker sends traffic to, kept loaded in Ollama."""
+
+    def __init__(self, base_url: str, keep_alive, refresh_seconds: float = 60):
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.refresh_seconds = refresh_seconds
+        self.active: Optional[str] = None
+        self._lock = threading.Lock()
+        # Per model, bumped whenever Ollama (re)loads it, which drops its KV cache (see chat_context.py)
+        self._epochs: Dict[str, int] = {}
+        self._loading = set()
+        # Models Ollama holds in memory, as of the last load or refresh (routing only picks these),
+        # named by normalize_model()
+        self._resident: List[str] = []
+        # Models still routed to by endpoint profiles, so never released on a swap (see pin())
+        self._pinned: Set[str] = set()
+
+    def installed_models(self) -> List[str]:
+        import requests
+        try:
+            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Could not connect to Ollama at {self.base_url}. Make sure Ollama is running. Error: {e}")
+        if response.status_code != 200:
+            raise Exception(f"Ollama API returned status {response.status_code}")
+        return [m.get("name", "") for m in response.json().get("models", [])]
+
+    def loaded_models(self) -> Optional[List[str]]:
+        """Models Ollama currently holds in memory, or None if the server can't say."""
+        import requests
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=2)
+            if response.status_code != 200:
+                return None
+            return [m.get("name", "") for m in response.json().get("models", [])]
+        except requests.exceptions.RequestException:
+            return None
+
+    def select(self) -> str:
+        """Best installed model (llama2 if none of MODEL_PRIORITY is installed)."""
+        model = choose_model(self.installed_models())
+        if model is None:
+            print(f"Warning: Using default model {DEFAULT_MODEL}. For faster responses, install a smaller model:")
+            print(f"  ollama pull llama3.2:1b  # Fastest (1.3GB)")
+            print(f"  ollama pull phi3:mini    # Fast (2.3GB)")
+            print(f"  ollama pull tinyllama    # Very fast (637MB)")
+            return DEFAULT_MODEL
+        return model
+
+    def current(self) -> str:
+        """Model to use for a request; only asks Ollama until a model has been chosen."""
+        if self.active is None:
+            with self._lock:
+                if self.active is None:
+                    self._activate(self.select())
+        return self.active
+
+    def load(self, model: str, reason: str) -> float:
+        """Have Ollama load a model and keep it resident; returns the load time."""
+        import requests
+        with self._lock:
+            if model in self._loading:
+                return 0.0
+            self._loading.add(model)
+        start = time.perf_counter()
+        try:
+            # An empty prompt only loads the model
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "prompt": "", "keep_alive": self.keep_alive, "stream": False},
+                timeout=LOAD_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            load_seconds = response.json().get("load_duration", 0) / 1e9
+        except Exception:
+            MODEL_LOADS.inc(model=model, reason=reason, outcome="failed")
+            raise
+        finally:
+            with self._lock:
+                self._loading.discard(model)
+        seconds = time.perf_counter() - start
+        if load_seconds > COLD_LOAD_SECONDS:
+            # Actually (re)loaded, not just already resident
+            self._bump(model)
+        with self._lock:
+            if normalize_model(model) not in self._resident:
+                self._resident.append(normalize_model(model))
+        MODEL_LOADS.inc(model=model, reason=reason, outcome="ok")
+        MODEL_LOAD_SECONDS.observe(seconds, model=model)
+        return seconds
+
+    def resident_models(self) -> List[str]:
+        with self._lock:
+            return list(self._resident)
+
+    def pin(self, models: List[str]):
+        """Keep these models loaded when traffic swaps away from them (models named by profiles)."""
+        with self._lock:
+            self._pinned = {normalize_model(m) for m in models}
+
+    def release(self, model: str):
+        """Let Ollama unload a model we no longer send traffic to (unless a profile still uses it)."""
+        import requests
+        with self._lock:
+            if normalize_model(model) in self._pinned:
+                return
+            if normalize_model(model) in self._resident:
+                self._resident.remove(normalize_model(model))
+        try:
+            requests.post(f"{self.base_url}/api/generate",
+                          json={"model": model, "prompt": "", "keep_alive": 0, "stream": False}, timeout=30)
+        except requests.exceptions.RequestException as e:
+            print(f"WARNING: Could not release model {model}: {e}")
+
+    def warm_up(self):
+        """Choose the model and load it (startup warm-up)."""
+        model = self.current()
+        seconds = self.load(model, "startup")
+        print(f"✅ Model {model} loaded in {seconds:.1f}s (keep_alive={self.keep_alive})")
+
+    def refresh(self):
+        """Warm a better (or replacement) model before swapping to it; reload an evicted one."""
+        best = self.select()
+        if best != self.active:
+            self.load(best, "swap")
+            with self._lock:
+                previous = self.active
+                self._activate(best)
+            if previous is not None:
+                MODEL_SWAPS.inc(from_model=previous, to_model=best)
+                self.release(previous)
+            return
+        loaded = self.loaded_models()
+        if loaded is None:
+            return
+        loaded = [normalize_model(m) for m in loaded]
+        with self._lock:
+            self._resident = loaded
+        if normalize_model(best) not in loaded:
+            self.load(best, "evicted")
+
+    async def refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"WARNING: Model refresh failed: {e}")
+
+    def record_response(self, model: str, load_seconds: Optional[float]):
+        """Count requests that paid for a model load (Ollama reports load_duration per reply)."""
+        if load_seconds is not None and load_seconds > COLD_LOAD_SECONDS:
+            self._bump(model)
+            COLD_STARTS.inc(model=model)
+
+    def epoch(self, model: str) -> int:
+        """Changes whenever Ollama reloads `model`; contexts from an earlier epoch are stale."""
+        with self._lock:
+            return self._epochs.get(normalize_model(model), 0)
+
+    def _bump(self, model: str):
+        with self._lock:
+            model = normalize_model(model)
+            self._epochs[model] = self._epochs.get(model, 0) + 1
+
+    def _activate(self, model: str):
+        if self.active is not None:
+            ACTIVE_MODEL.set(0, model=self.active)
+        self.active = model
+        ACTIVE_MODEL.set(1, model=model)
+        print(f"Using model: {model} for faster responses")
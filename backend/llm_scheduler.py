@@ -0,0 +1,129 @@
+# backend/llm_scheduler.py
+"""
+Priority scheduling of LLM generations.
+
+Ollama runs a few generations at a time (OLLAMA_NUM_PARALLEL) and queues
+the rest in arrival order, so a batch of hundreds of quiz topics would
+sit in front of every student's chat turn. Generations now take a slot
+from this scheduler first: at most LLM_CONCURRENCY run at once per
+worker, and waiting generations are started by priority (INTERACTIVE
+before BATCH), then in arrival order.
+
+    text = await llm_scheduler.run(generate, llm, prompt, priority=BATCH, timeout=90)
+
+run() calls the function in a worker thread with a `cancelled` event and
+keeps the slot until that thread has returned. A caller that times out
+or goes away sets the event (the generation stops at its next token and
+closes its stream) but doesn't free the slot early, so abandoned
+generations still count against LLM_CONCURRENCY.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+from backend import metrics
+
+# Lower runs first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+QUEUE_DEPTH = metrics.Gauge("llm_scheduler_queued", "Generations waiting for a slot", ("priority",))
+RUNNING = metrics.Gauge("llm_scheduler_running", "Generations holding a slot")
+WAIT_SECONDS = metrics.Histogram(
+    "llm_scheduler_wait_seconds", "Time a generation waited for a slot", ("priority",))
+ABANDONED = metrics.Counter(
+    "llm_scheduler_abandoned_total", "Generations the caller stopped waiting for (timeout or disconnect)")
+
+
+class LLMScheduler:
+    """Bounded concurrency for LLM calls, with waiting calls started by priority."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._running = 0
+        self._waiters: List[list] = []  # heap of [priority, sequence, future]
+        self._waiting: Dict[int, int] = {}
+        self._sequence = itertools.count()
+
+    def queue_depth(self, priority=None) -> int:
+        """Generations waiting for a slot (at one priority, or in total)."""
+        if priority is not None:
+            return self._waiting.get(priority, 0)
+        return sum(self._waiting.values())
+
+    def free_slots(self) -> int:
+        return self.max_concurrency - self._running
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def run(self, func: Callable, *args, priority: int = INTERACTIVE, timeout: Optional[float] = None):
+        """func(*args, cancelled=event) in a thread, holding a slot until the thread returns.
+
+        Raises asyncio.TimeoutError after `timeout` seconds; the thread is
+        then asked to stop, and its slot is released once it has.
+        """
+        await self._acquire(priority)
+        cancelled = threading.Event()
+        try:
+            task = asyncio.ensure_future(asyncio.to_thread(func, *args, cancelled=cancelled))
+        except BaseException:
+            self._release()
+            raise
+        task.add_done_callback(self._thread_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            cancelled.set()
+            ABANDONED.inc()
+            raise
+
+    def _thread_done(self, task: asyncio.Future):
+        if not task.cancelled():
+            task.exception()  # retrieved here when nobody awaits it any more
+        self._release()
+
+    async def _acquire(self, priority: int):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        if self._running < self.max_concurrency and not self.queue_depth():
+            self._running += 1
+            RUNNING.set(self._running)
+            WAIT_SECONDS.observe(0, priority=name)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self._waiting[priority] = self._waiting.get(priority, 0) + 1
+        QUEUE_DEPTH.inc(priority=name)
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self._release()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+            QUEUE_DEPTH.dec(priority=name)
+            WAIT_SECONDS.observe(time.perf_counter() - start, priority=name)
+
+    def _release(self):
+        # Hand the slot straight to the next waiter, skipping ones that were cancelled
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+        RUNNING.set(self._running)
@@ -0,0 +1,165 @@
+# backend/memory_budget.py
+"""
+One memory budget for models, indexes and caches.
+
+A worker holds the embedding model, the mapped FAISS index and docstore,
+the mapped chunk files and several per-worker caches (cached sessions,
+Ollama chat contexts, prefetched context). Each cache was bounded by an
+entry count only, so a few long conversations could still push a small
+node into the OOM killer. Every one of them now registers with a
+MemoryGovernor:
+
+    governor.register("session_cache", store.nbytes, store.evict, priority=1)
+    governor.register("embedding_model", loaded_model_bytes)        # pinned
+
+`size()` returns the component's current size in bytes (cheap - caches
+keep a running total). Components with an `evict(nbytes)` callback can
+drop their least recently used entries and return how much they freed;
+the rest are pinned. Every MEMORY_CHECK_SECONDS, when the tracked total
+passes HIGH_WATER of MEMORY_BUDGET_MB, the governor evicts from the lowest
+priority component first until the total is back under LOW_WATER. Pinned
+components still count, so the budget left for caches is what the model
+and index don't use. If the pinned part alone is over budget nothing can
+be done here, and memory_budget_overruns_total says so.
+
+The budget is enforced on tracked bytes, not RSS: Python rarely returns
+freed memory to the OS, so evicting on RSS would empty the caches without
+shrinking the process. GET /admin/memory shows the breakdown next to the
+process RSS. With MEMORY_BUDGET_MB=0 sizes are tracked and reported but
+nothing is evicted.
+"""
+
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from backend import metrics
+
+# Start evicting above HIGH_WATER of the budget, stop below LOW_WATER
+HIGH_WATER = 0.9
+LOW_WATER = 0.8
+
+COMPONENT_BYTES = metrics.Gauge("memory_component_bytes", "Tracked size of each component", ("component",))
+EVICTED_BYTES = metrics.Counter(
+    "memory_evicted_bytes_total", "Bytes evicted to stay within MEMORY_BUDGET_MB", ("component",))
+OVERRUNS = metrics.Counter(
+    "memory_budget_overruns_total", "Checks that ended over budget with nothing left to evict")
+
+
+def approx_size(obj, _seen: Optional[set] = None) -> int:
+    """Rough deep size of plain data (containers, strings, numbers, dataclasses, simple objects)."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(approx_size(k, _seen) + approx_size(v, _seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(approx_size(item, _seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        return size + approx_size(vars(obj), _seen)
+    return size
+
+
+def process_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux), else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class Component:
+    name: str
+    size: Callable[[], int]
+    evict: Optional[Callable[[int], int]]  # free at least n bytes (oldest first), return bytes freed
+    priority: int                          # lower is evicted first
+
+
+class MemoryGovernor:
+    """Tracks registered components against one byte budget and evicts the least important first."""
+
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes
+        self._components: List[Component] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, size: Callable[[], int], evict: Optional[Callable[[int], int]] = None,
+                 priority: int = 0):
+        self._components.append(Component(name, size, evict, priority))
+
+    def _sizes(self) -> dict:
+        sizes = {}
+        for component in self._components:
+            try:
+                sizes[component.name] = int(component.size())
+            except Exception as e:
+                print(f"WARNING: Could not size {component.name}: {e}")
+                sizes[component.name] = 0
+            COMPONENT_BYTES.set(sizes[component.name], component=component.name)
+        return sizes
+
+    def enforce(self) -> int:
+        """Evict until under LOW_WATER if over HIGH_WATER; returns the bytes freed."""
+        if self.budget_bytes <= 0:
+            self._sizes()
+            return 0
+        with self._lock:
+            total = sum(self._sizes().values())
+            if total <= self.budget_bytes * HIGH_WATER:
+                return 0
+            needed = total - int(self.budget_bytes * LOW_WATER)
+            freed = 0
+            for component in sorted(self._components, key=lambda c: c.priority):
+                if component.evict is None:
+                    continue
+                released = component.evict(needed - freed)
+                if released:
+                    EVICTED_BYTES.inc(released, component=component.name)
+                    freed += released
+                if freed >= needed:
+                    break
+            if total - freed > self.budget_bytes:
+                OVERRUNS.inc()
+            return freed
+
+    async def run(self, interval_seconds: float):
+        """Background task: check the budget every interval_seconds."""
+        import asyncio
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                freed = await asyncio.to_thread(self.enforce)
+                if freed:
+                    print(f"Memory budget: evicted {freed / 1e6:.1f} MB from caches")
+            except Exception as e:
+                print(f"WARNING: Memory budget check failed: {e}")
+
+    def breakdown(self) -> dict:
+        sizes = self._sizes()
+        tracked = sum(sizes.values())
+        rss = process_rss()
+        return {
+            "budget_bytes": self.budget_bytes,
+            "high_water_bytes": int(self.budget_bytes * HIGH_WATER),
+            "low_water_bytes": int(self.budget_bytes * LOW_WATER),
+            "tracked_bytes": tracked,
+            "rss_bytes": rss,
+            "untracked_bytes": max(0, rss - tracked) if rss is not None else None,
+            "components": sorted(
+                (
+                    {"name": c.name, "bytes": sizes[c.name], "evictable": c.evict is not None,
+                     "priority": c.priority if c.evict is not None else None}
+                    for c in self._components
+                ),
+                key=lambda c: c["bytes"], reverse=True,
+            ),
+        }
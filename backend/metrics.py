@@ -0,0 +1,244 @@
+# backend/metrics.py
+"""
+Request-scoped timing spans and Prometheus-style metrics (no extra dependency).
+
+    with span("retrieval"):
+        docs = retrieve(...)
+
+records the stage duration in stage_duration_seconds{endpoint, stage} and in
+the current request's timing, which can be returned as a Server-Timing
+header. GET /metrics renders every metric in the Prometheus text format.
+Each worker process exports its own metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds - from cache hits to slow local generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# --- Metrics ---------------------------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "End-to-end request latency", ("endpoint", "method", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", ("endpoint",))
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in each stage of a request", ("endpoint", "stage"))
+RETRIEVAL_LATENCY = Histogram(
+    "retrieval_duration_seconds", "Vector search latency (embedding the query included)", ("endpoint",))
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt size sent to the LLM", ("endpoint",), buckets=TOKEN_BUCKETS)
+PROMPT_TOKENS_EVALUATED = Histogram(
+    "llm_prompt_tokens_evaluated", "Prompt tokens the LLM had to evaluate", ("endpoint",), buckets=TOKEN_BUCKETS)
+PROMPT_TOKENS_REUSED = Histogram(
+    "llm_prompt_tokens_reused", "Prompt tokens served from the LLM's cache (session context)", ("endpoint",),
+    buckets=TOKEN_BUCKETS)
+COMPLETION_TOKENS = Histogram(
+    "llm_completion_tokens", "Tokens generated by the LLM", ("endpoint",), buckets=TOKEN_BUCKETS)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time until the LLM streamed its first token", ("endpoint",))
+GENERATION_RATE = Histogram(
+    "llm_generation_tokens_per_second", "LLM decode speed", ("endpoint",), buckets=RATE_BUCKETS)
+QUIZ_PARSE_OUTCOMES = Counter(
+    "quiz_parse_outcomes_total",
+    "How quiz JSON from the LLM was recovered (parsed, repaired, regex_fallback, last_resort, failed)",
+    ("outcome",))
+INGEST_PAGES = Counter("ingest_pages_total", "PDF pages ingested")
+INGEST_CHUNKS = Counter("ingest_chunks_total", "Chunks embedded and indexed")
+INGEST_RATE = Histogram(
+    "ingest_pages_per_second", "Ingestion throughput per upload", buckets=RATE_BUCKETS)
+
+
+# --- Request-scoped spans --------------------------------------------------
+
+class RequestTiming:
+    """Stage timings of one request (shared with worker threads via contextvars)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans.append((stage, seconds))
+
+    def spans_snapshot(self) -> List[Tuple[str, float]]:
+        """(stage, seconds) pairs recorded so far (safe while worker threads still add spans)."""
+        with self._lock:
+            return list(self.spans)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)."""
+        spans = self.spans_snapshot()
+        spans.append(("total", time.perf_counter() - self.start))
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def start_request(endpoint: str) -> RequestTiming:
+    timing = RequestTiming(endpoint)
+    _current.set(timing)
+    return timing
+
+
+def current_endpoint() -> str:
+    timing = _current.get()
+    return timing.endpoint if timing else "none"
+
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage timed by hand (for code that doesn't fit a with block)."""
+    timing = _current.get()
+    STAGE_LATENCY.observe(seconds, endpoint=timing.endpoint if timing else "none", stage=stage)
+    if timing is not None:
+        timing.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_generation(prompt_tokens: int, completion_tokens: int,
+                      first_token_seconds: Optional[float], tokens_per_second: Optional[float],
+                      evaluated_tokens: Optional[int] = None, reused_tokens: Optional[int] = None):
+    """Record one LLM call. evaluated/reused are only known when Ollama reports them."""
+    endpoint = current_endpoint()
+    PROMPT_TOKENS.observe(prompt_tokens, endpoint=endpoint)
+    if evaluated_tokens is not None:
+        PROMPT_TOKENS_EVALUATED.observe(evaluated_tokens, endpoint=endpoint)
+    if reused_tokens is not None:
+        PROMPT_TOKENS_REUSED.observe(reused_tokens, endpoint=endpoint)
+    COMPLETION_TOKENS.observe(completion_tokens, endpoint=endpoint)
+    if first_token_seconds is not None:
+        TIME_TO_FIRST_TOKEN.observe(first_token_seconds, endpoint=endpoint)
+    if tokens_per_second:
+        GENERATION_RATE.observe(tokens_per_second, endpoint=endpoint)
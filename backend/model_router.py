@@ -0,0 +1,174 @@
+# backend/model_router.py
+"""
+Per-endpoint model profiles and load-aware routing.
+
+Every endpoint used to get the active model with the same settings
+(num_ctx 2048, num_predict 256) - enough for a chat answer, too little
+for a five-question quiz. Each endpoint now has a profile (model,
+num_ctx, num_predict, temperature, latency SLO), and each request is
+routed:
+
+- to a smaller model when the LLM scheduler's queue is deep, or when the
+  prompt is simple (a short chat question);
+- to a larger model when nothing is queued and slots are free;
+- otherwise to the profile's model (the active model by default).
+
+Automatic routing only picks models Ollama already holds in memory (or
+that a profile names - those are preloaded), so a routing decision never
+costs a model load. A chat session stays on the model its conversation
+context belongs to unless the queue is deep.
+
+Decisions are counted in llm_route_decisions_total, their latency in
+llm_route_latency_seconds (against the profile's SLO), and the recent
+ones are listed at GET /routing. Profiles can be overridden with
+MODEL_PROFILES, e.g. '{"quiz": {"model": "llama3.2:3b", "num_predict": 1536}}'.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from backend import metrics
+from backend.llm_models import normalize_model, size_rank
+
+ROUTE_DECISIONS = metrics.Counter(
+    "llm_route_decisions_total", "Requests routed per endpoint profile, model and reason",
+    ("endpoint", "model", "reason"))
+ROUTE_LATENCY = metrics.Histogram(
+    "llm_route_latency_seconds", "Time from routing to answer", ("endpoint", "model", "reason"))
+SLO_MISSES = metrics.Counter(
+    "llm_route_slo_misses_total", "Routed requests slower than their profile's SLO", ("endpoint", "model"))
+
+
+@dataclass
+class ModelProfile:
+    num_ctx: int = 2048
+    num_predict: int = 256
+    temperature: float = 0.7
+    model: Optional[str] = None          # None = the active model (see llm_models.py)
+    fast_model: Optional[str] = None     # used under load; default: next smaller resident model
+    strong_model: Optional[str] = None   # used with spare capacity; default: next larger resident model
+    simple_tokens: int = 0               # prompts up to this many tokens count as simple (0 = never)
+    slo_seconds: float = 30.0
+
+    def options(self) -> dict:
+        return {"temperature": self.temperature, "num_ctx": self.num_ctx, "num_predict": self.num_predict}
+
+
+DEFAULT_PROFILES = {
+    # One-paragraph answers; a one-line question can go to a smaller model
+    "chat": ModelProfile(simple_tokens=24, slo_seconds=15.0),
+    # Five questions of JSON don't fit in 256 tokens
+    "quiz": ModelProfile(num_predict=1024, slo_seconds=60.0),
+    # Five retrieved passages plus a structured summary
+    "summary": ModelProfile(num_ctx=4096, num_predict=512, slo_seconds=60.0),
+}
+
+
+def load_profiles(overrides: str = "") -> Dict[str, ModelProfile]:
+    """DEFAULT_PROFILES with MODEL_PROFILES (JSON: {endpoint: {field: value}}) applied."""
+    profiles = dict(DEFAULT_PROFILES)
+    for endpoint, values in (json.loads(overrides) if overrides else {}).items():
+        profiles[endpoint] = replace(profiles.get(endpoint, ModelProfile()), **values)
+    return profiles
+
+
+@dataclass
+class Route:
+    endpoint: str
+    model: str
+    options: dict
+    reason: str
+    queue_depth: int
+    prompt_tokens: int
+    started: float = field(default_factory=time.perf_counter)
+
+
+class ModelRouter:
+    """Chooses the model and generation options for each request."""
+
+    def __init__(self, model_manager, scheduler, profiles: Dict[str, ModelProfile],
+                 queue_threshold: int = 4, history: int = 200):
+        self.model_manager = model_manager
+        self.scheduler = scheduler
+        self.profiles = profiles
+        self.queue_threshold = queue_threshold
+        self._recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def profile_models(self) -> List[str]:
+        """Models named by profiles (preloaded at startup)."""
+        models = set()
+        for profile in self.profiles.values():
+            models.update(m for m in (profile.model, profile.fast_model, profile.strong_model) if m)
+        return sorted(models)
+
+    def _neighbour(self, model: str, smaller: bool) -> Optional[str]:
+        """Nearest smaller/larger model that Ollama already holds in memory."""
+        rank = size_rank(model)
+        if rank is None:
+            return None
+        candidates = []
+        for name in self.model_manager.resident_models():
+            other = size_rank(name)
+            if other is not None and (other < rank if smaller else other > rank):
+                candidates.append((other, name))
+        if not candidates:
+            return None
+        return max(candidates)[1] if smaller else min(candidates)[1]
+
+    def route(self, endpoint: str, prompt_tokens: int = 0, sticky_model: Optional[str] = None) -> Route:
+        profile = self.profiles.get(endpoint, ModelProfile())
+        base = profile.model or self.model_manager.current()
+        depth = self.scheduler.queue_depth()
+        model, reason = base, "default"
+        if depth >= self.queue_threshold:
+            fast = profile.fast_model or self._neighbour(base, smaller=True)
+            if fast:
+                model, reason = fast, "queue_deep"
+        elif sticky_model and normalize_model(sticky_model) in {
+                normalize_model(m) for m in self.model_manager.resident_models() + self.profile_models()}:
+            model, reason = sticky_model, "session_context"
+        elif profile.simple_tokens and prompt_tokens <= profile.simple_tokens:
+            fast = profile.fast_model or self._neighbour(base, smaller=True)
+            if fast:
+                model, reason = fast, "simple_prompt"
+        elif depth == 0 and self.scheduler.free_slots() > self.scheduler.max_concurrency // 2:
+            strong = profile.strong_model or self._neighbour(base, smaller=False)
+            if strong:
+                model, reason = strong, "spare_capacity"
+        ROUTE_DECISIONS.inc(endpoint=endpoint, model=model, reason=reason)
+        return Route(endpoint, model, profile.options(), reason, depth, prompt_tokens)
+
+    def complete(self, route: Route, ok: bool = True):
+        """Record how a routed request went."""
+        elapsed = time.perf_counter() - route.started
+        slo = self.profiles.get(route.endpoint, ModelProfile()).slo_seconds
+        ROUTE_LATENCY.observe(elapsed, endpoint=route.endpoint, model=route.model, reason=route.reason)
+        if elapsed > slo:
+            SLO_MISSES.inc(endpoint=route.endpoint, model=route.model)
+        record = {k: v for k, v in asdict(route).items() if k != "started"}
+        record.update(timestamp=datetime.now().isoformat(), seconds=round(elapsed, 3),
+                      within_slo=elapsed <= slo, ok=ok)
+        with self._lock:
+            self._recent.append(record)
+
+    @contextmanager
+    def measure(self, route: Route):
+        """Record the routed request's outcome when the block exits."""
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.complete(route, ok)
+
+    def recent(self) -> List[dict]:
+        """Latest decisions, newest first."""
+        with self._lock:
+            return list(reversed(self._recent))
@@ -0,0 +1,226 @@
+# backend/onnx_embeddings.py
+"""
+ONNX Runtime backend for the sentence-transformers embedder.
+
+The PyTorch backend loads torch (several hundred MB resident) to run a
+22M-parameter model. EMBEDDING_BACKEND=onnx runs the same network with
+ONNX Runtime, and onnx-int8 runs a dynamically quantized copy (int8
+weights, about a quarter of the size, faster matmuls on CPU). Neither
+imports torch at serving time - only onnxruntime, tokenizers and numpy.
+
+The models are exported once, into EMBEDDING_ONNX_DIR:
+
+    python backend/onnx_embeddings.py export
+
+Query vectors must stay comparable with the vectors already in the index,
+so check each backend against PyTorch on a sample of the indexed chunks
+before switching to it:
+
+    python backend/onnx_embeddings.py parity onnx-int8
+
+The result is saved to parity.json next to the model; get_embeddings()
+warns when the configured backend has no passing check.
+"""
+
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+ONNX_BACKENDS = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+CONFIG_FILE = "onnx_config.json"
+PARITY_FILE = "parity.json"
+
+# Every chunk's vector must point the same way as PyTorch's to within this
+PARITY_MIN_COSINE = 0.98
+PARITY_SAMPLE = 500
+
+
+class OnnxEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalised sentence embeddings from an exported ONNX model."""
+
+    def __init__(self, model_dir, backend: str = "onnx", batch_size: int = 32, threads: int = 0):
+        import numpy as np
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self._np = np
+        self.model_dir = Path(model_dir)
+        self.backend = backend
+        self.batch_size = batch_size
+        model_path = self.model_dir / ONNX_BACKENDS[backend]
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"{model_path} not found. Export it with: python backend/onnx_embeddings.py export"
+            )
+        config = json.loads((self.model_dir / CONFIG_FILE).read_text())
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_id"], pad_token=config["pad_token"])
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+        weights = mask[:, :, None].astype(hidden.dtype)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Batch texts of similar length together so little time goes on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def export(model_name: str, model_dir, quantize: bool = True) -> List[Path]:
+    """Export a sentence-transformers model to ONNX (and an int8 copy). Needs torch and onnx."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = st[1].get_config_dict() if len(st) > 1 else {}
+    if not pooling.get("pooling_mode_mean_tokens", False):
+        raise ValueError(f"{model_name} does not use mean pooling, which is all the ONNX backend implements")
+    transformer = st[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+
+    sample = tokenizer(["export the embedding model"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    fp32_path = model_dir / ONNX_BACKENDS["onnx"]
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            tuple(sample[n] for n in names),
+            str(fp32_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names},
+                          "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(str(model_dir))
+    (model_dir / CONFIG_FILE).write_text(json.dumps({
+        "model": model_name,
+        "max_length": st.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_id": tokenizer.pad_token_id,
+    }, indent=2))
+    written = [fp32_path]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = model_dir / ONNX_BACKENDS["onnx-int8"]
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        written.append(int8_path)
+    return written
+
+
+def check_parity(candidate, reference, texts: List[str], min_cosine: float = PARITY_MIN_COSINE) -> dict:
+    """Cosine similarity between the two backends' vectors for each text, plus encoding speed."""
+    import numpy as np
+
+    timings = {}
+    vectors = {}
+    for name, embeddings in (("reference", reference), ("candidate", candidate)):
+        embeddings.embed_documents(texts[:8])  # warm up
+        start = time.perf_counter()
+        vectors[name] = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        timings[name] = time.perf_counter() - start
+    a, b = vectors["reference"], vectors["candidate"]
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosines.min()), 5),
+        "p1_cosine": round(float(np.percentile(cosines, 1)), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "threshold": min_cosine,
+        "passed": bool(cosines.min() >= min_cosine),
+        "reference_chunks_per_second": round(len(texts) / timings["reference"], 1),
+        "candidate_chunks_per_second": round(len(texts) / timings["candidate"], 1),
+    }
+
+
+def parity_status(model_dir, backend: str) -> Optional[dict]:
+    """The saved parity check for a backend, if it has been run."""
+    path = Path(model_dir) / PARITY_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text()).get(backend)
+
+
+def _save_parity(model_dir, backend: str, result: dict):
+    path = Path(model_dir) / PARITY_FILE
+    saved = json.loads(path.read_text()) if path.exists() else {}
+    saved[backend] = {**result, "checked_at": datetime.now().isoformat()}
+    path.write_text(json.dumps(saved, indent=2))
+
+
+if __name__ == "__main__":
+    # Allow running as `python backend/onnx_embeddings.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from backend.chunk_store import ChunkStore
+    from backend.config import CHUNK_STORE_DIR, EMBEDDING_MODEL, EMBEDDING_ONNX_DIR
+    from backend.embeddings import load_embeddings
+
+    commands = ("export", "parity")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python backend/onnx_embeddings.py export")
+        print(f"       python backend/onnx_embeddings.py parity [onnx|onnx-int8] [sample size, default {PARITY_SAMPLE}]")
+        sys.exit(1)
+
+    if sys.argv[1] == "export":
+        print(f"Exporting {EMBEDDING_MODEL} to {EMBEDDING_ONNX_DIR}...")
+        for path in export(EMBEDDING_MODEL, EMBEDDING_ONNX_DIR):
+            print(f"✅ {path} ({path.stat().st_size / 1e6:.1f} MB)")
+        print("Check the vectors match before switching: python backend/onnx_embeddings.py parity onnx-int8")
+        sys.exit(0)
+
+    backend = sys.argv[2] if len(sys.argv) > 2 else "onnx-int8"
+    if backend not in ONNX_BACKENDS:
+        print(f"Unknown backend {backend}; choose from {', '.join(ONNX_BACKENDS)}")
+        sys.exit(1)
+    sample = int(sys.argv[3]) if len(sys.argv) > 3 else PARITY_SAMPLE
+    texts = [chunk.text for chunk in islice(ChunkStore(CHUNK_STORE_DIR).iter_chunks(), sample)]
+    if not texts:
+        print(f"No chunks found in {CHUNK_STORE_DIR}. Run ingest.py first (--chunk-only is enough).")
+        sys.exit(1)
+    result = check_parity(load_embeddings(backend), load_embeddings("torch"), texts)
+    _save_parity(EMBEDDING_ONNX_DIR, backend, result)
+    print(json.dumps(result, indent=2))
+    if result["passed"]:
+        print(f"✅ {backend} matches PyTorch on {len(texts)} chunks - safe to set EMBEDDING_BACKEND={backend}")
+    else:
+        print(f"❌ {backend} vectors drift from PyTorch (min cosine {result['min_cosine']} < {result['threshold']}); "
+              f"keep the current backend or re-index after switching")
+        sys.exit(1)
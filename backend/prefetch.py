@@ -0,0 +1,143 @@
+# backend/prefetch.py
+"""
+Speculative retrieval while a student is typing.
+
+ChatBox calls POST /query/prefetch (debounced) with the partial question.
+The backend retrieves the context for it in the retrieval batcher's
+background lane - it only fills spare room in batches, or runs when no
+real query is waiting - and keeps the result for the session. When the
+question is sent, /query takes that context instead of retrieving again,
+provided the index hasn't changed, the scope is the same and the sent text
+is close enough to what was prefetched (word-set overlap of at least
+PREFETCH_MATCH_THRESHOLD; 1.0 means identical words only).
+
+Prefetches are token-bucket limited per session (PREFETCH_RATE_PER_SECOND,
+PREFETCH_BURST), skipped while generations are queued, and never generate
+anything. Outcomes are counted in prefetch_requests_total and
+prefetch_lookups_total.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import FrozenSet, Optional, Tuple
+
+from backend import metrics
+from backend.memory_budget import approx_size
+
+# Partial questions shorter than this aren't worth retrieving for
+MIN_WORDS = 3
+
+_WORD_RE = re.compile(r"\w+")
+
+PREFETCH_REQUESTS = metrics.Counter(
+    "prefetch_requests_total", "Prefetch requests by outcome (prefetched, too_short, rate_limited, busy, "
+    "no_documents, no_session)", ("outcome",))
+PREFETCH_LOOKUPS = metrics.Counter(
+    "prefetch_lookups_total", "Queries served from a prefetch (exact, close) or retrieved again (miss, stale)",
+    ("match",))
+
+
+def words(text: str) -> FrozenSet[str]:
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard overlap of two word sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class RateLimiter:
+    """Token bucket per key: `rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+@dataclass
+class Prefetched:
+    query: str
+    words: FrozenSet[str]
+    scope: tuple
+    version: object
+    docs: list
+    nbytes: int = 0
+    created: float = field(default_factory=time.monotonic)
+
+
+class PrefetchCache:
+    """The latest prefetched context per session, taken (at most once) by the matching /query."""
+
+    def __init__(self, ttl_seconds: float = 30.0, match_threshold: float = 0.8, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.match_threshold = match_threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Prefetched]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key: str) -> Optional[Prefetched]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+        return entry
+
+    def put(self, key: str, query: str, scope: tuple, version, docs: list):
+        entry = Prefetched(query, words(query), scope, version, docs, approx_size(docs))
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+
+    def nbytes(self) -> int:
+        """Approximate size of the kept context (see memory_budget.py)."""
+        return self._bytes
+
+    def evict(self, nbytes: int) -> int:
+        """Drop the oldest prefetches until nbytes are freed; returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            while self._entries and freed < nbytes:
+                freed += self._pop(next(iter(self._entries))).nbytes
+        return freed
+
+    def take(self, key: str, query: str, scope: tuple, version) -> Optional[list]:
+        """The prefetched docs if they fit this query, else None."""
+        with self._lock:
+            entry = self._pop(key)
+        if entry is None:
+            PREFETCH_LOOKUPS.inc(match="miss")
+            return None
+        if time.monotonic() - entry.created > self.ttl_seconds or entry.scope != scope or entry.version != version:
+            PREFETCH_LOOKUPS.inc(match="stale")
+            return None
+        query_words = words(query)
+        if query_words == entry.words:
+            PREFETCH_LOOKUPS.inc(match="exact")
+            return entry.docs
+        if similarity(query_words, entry.words) >= self.match_threshold:
+            PREFETCH_LOOKUPS.inc(match="close")
+            return entry.docs
+        PREFETCH_LOOKUPS.inc(match="miss")
+        return None
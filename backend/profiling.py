@@ -0,0 +1,210 @@
+# backend/profiling.py
+"""
+On-demand request profiling.
+
+When one /generate-quiz takes 40 seconds, the stage histograms in
+/metrics say "parse" or "generate" was slow but not which code. A request
+is profiled when it carries an `X-Profile` header with the ADMIN_TOKEN as
+its value (header profiling is off while no token is set) or is picked by
+PROFILE_SAMPLE_RATE. While it
+runs, a sampling thread records the Python stacks of every busy thread
+every PROFILE_INTERVAL_MS. Afterwards the samples, the request's stage
+breakdown (the same spans as Server-Timing) and the hottest functions are
+saved as one JSON file in PROFILE_DIR, keeping the newest
+PROFILE_MAX_FILES. The profile id is returned in an X-Profile-Id header.
+
+    GET /admin/profiles                          list stored profiles
+    GET /admin/profiles/{id}                     the full profile (JSON)
+    GET /admin/profiles/{id}?format=collapsed    stacks for flamegraph.pl / speedscope
+
+Streamed responses (the /batch endpoints) are profiled until their last
+line is sent, so the id header arrives before the profile is written. The
+sampler sees the whole process, so other requests running at the same
+time show up too (each stack starts with its thread's name). Only one
+request is profiled at a time. With no header and a sample rate of 0 the
+only cost per request is one header lookup.
+"""
+
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from backend import metrics
+
+PROFILE_HEADER = "x-profile"
+
+# Unique stacks kept per profile (the rest are folded into "(other)")
+MAX_STACKS = 2000
+TOP_FUNCTIONS = 25
+
+# Innermost Python frames of threads that are blocked, not working
+_IDLE_FRAMES = {
+    ("select", "selectors.py"),
+    ("wait", "threading.py"),
+    ("_worker", "thread.py"),
+    ("_wait_for_tstate_lock", "threading.py"),
+}
+
+_PROFILE_ID_RE = re.compile(r"[0-9]+-[0-9a-f]+")
+
+PROFILES_TAKEN = metrics.Counter("profiles_taken_total", "Requests profiled", ("endpoint", "trigger"))
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the collapsed stacks of all busy threads, sampled on a background thread."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self.leaves: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if (code.co_name, Path(code.co_filename).name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.leaves[stack[0]] += 1
+                self.stacks[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+            self.samples += 1
+
+
+@dataclass
+class ActiveProfile:
+    id: str
+    trigger: str
+    sampler: StackSampler
+
+
+class Profiler:
+    """Decides which requests to profile and stores the results."""
+
+    def __init__(self, directory, sample_rate: float = 0.0, interval_ms: float = 5.0,
+                 max_files: int = 100, token: str = ""):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_ms / 1000
+        self.max_files = max_files
+        self.token = token
+        self._active = False
+
+    def trigger(self, headers) -> Optional[str]:
+        """"header" or "sampled" if this request should be profiled, else None."""
+        requested = headers.get(PROFILE_HEADER)
+        if self._active:
+            return None
+        if requested and self.token and secrets.compare_digest(requested, self.token):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def start(self, trigger: str) -> ActiveProfile:
+        self._active = True
+        sampler = StackSampler(self.interval_seconds)
+        sampler.start()
+        return ActiveProfile(f"{int(time.time() * 1000)}-{secrets.token_hex(3)}", trigger, sampler)
+
+    def finish(self, profile: ActiveProfile, timing, method: str, path: str, status: int) -> dict:
+        """Stop sampling and build the profile record (save it with save(), off the event loop)."""
+        try:
+            profile.sampler.stop()
+        finally:
+            self._active = False
+        sampler = profile.sampler
+        wall = time.perf_counter() - timing.start
+        PROFILES_TAKEN.inc(endpoint=timing.endpoint, trigger=profile.trigger)
+        stacks = dict(sampler.stacks.most_common(MAX_STACKS))
+        folded = sum(sampler.stacks.values()) - sum(stacks.values())
+        if folded:
+            stacks["(other)"] = folded
+        busy = sum(sampler.leaves.values()) or 1
+        spans = timing.spans_snapshot()
+        return {
+            "id": profile.id,
+            "endpoint": timing.endpoint,
+            "method": method,
+            "path": path,
+            "status": status,
+            "trigger": profile.trigger,
+            "started_at": datetime.fromtimestamp(time.time() - wall).isoformat(),
+            "wall_ms": round(wall * 1000, 1),
+            "stages": [{"stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in spans],
+            "interval_ms": round(self.interval_seconds * 1000, 2),
+            "samples": sampler.samples,
+            "top_functions": [
+                {"function": name, "samples": count, "percent": round(100 * count / busy, 1)}
+                for name, count in sampler.leaves.most_common(TOP_FUNCTIONS)
+            ],
+            "stacks": stacks,
+        }
+
+    def save(self, record: dict):
+        """Write a profile atomically and drop the oldest beyond max_files."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".{record['id']}.json.tmp"
+        tmp_path.write_text(json.dumps(record))
+        os.replace(tmp_path, self.directory / f"{record['id']}.json")
+        self._prune()
+
+    def _prune(self):
+        files = sorted(self.directory.glob("*.json"))
+        for path in files[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first (without their stacks)."""
+        summaries = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                record = json.loads(path.read_text())
+            except (OSError, json.JSONDecodeError):
+                continue  # pruned while listing
+            record.pop("stacks", None)
+            record.pop("top_functions", None)
+            summaries.append(record)
+        return summaries
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not _PROFILE_ID_RE.fullmatch(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.json"
+        return path if path.exists() else None
+
+
+def collapsed(record: dict) -> str:
+    """Brendan Gregg's collapsed-stack format: one "frame;frame;frame count" line per stack."""
+    return "".join(f"{stack} {count}\n" for stack, count in record["stacks"].items())
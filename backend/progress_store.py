@@ -0,0 +1,233 @@
+# backend/progress_store.py
+"""
+Per-session progress rollups.
+
+Progress entries used to be appended to the session, so the session grew
+without bound, every POST /progress rewrote it, and ProgressTracker
+downloaded the whole session (chat included) to count activities in the
+browser. Progress now goes to {PROGRESS_DIR}/progress.sqlite, which keeps
+rollups that are updated incrementally as entries arrive:
+
+    progress_totals   per session and activity: count, score sum/count
+    progress_topics   per session and topic: activities, scored attempts,
+                      best and average score, last activity
+    progress_recent   the last RECENT_LIMIT entries per session
+
+so GET /progress/{session_id}/summary costs the same however long the
+history is. ProgressWriter queues entries and writes them in batches
+(one transaction per flush) from a background task. Like sessions.sqlite,
+the file is shared by all workers on the host.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend import metrics
+
+PROGRESS_DB = "progress.sqlite"
+RECENT_LIMIT = 20
+TOPIC_LIMIT = 50
+
+FLUSH_BATCH = metrics.Histogram(
+    "progress_flush_entries", "Progress entries written per batched flush", buckets=(1, 2, 5, 10, 20, 50, 100, 500))
+PENDING = metrics.Gauge("progress_pending_entries", "Progress entries queued for the next flush")
+
+
+class ProgressStore:
+    """Incrementally maintained progress rollups in SQLite."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress_totals ("
+            " session_id TEXT NOT NULL, activity TEXT NOT NULL, count INTEGER NOT NULL,"
+            " score_sum REAL NOT NULL DEFAULT 0, score_count INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (session_id, activity))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress_topics ("
+            " session_id TEXT NOT NULL, topic TEXT NOT NULL, activities INTEGER NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, best_score REAL, score_sum REAL NOT NULL DEFAULT 0,"
+            " last_activity TEXT, PRIMARY KEY (session_id, topic))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress_recent ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, entry TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS progress_recent_session ON progress_recent (session_id, id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def record_many(self, entries: List[Tuple[str, dict]]):
+        """Apply (session_id, entry) pairs to the rollups in one transaction."""
+        if not entries:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for session_id, entry in entries:
+                score = entry.get("score")
+                scored = 1 if score is not None else 0
+                conn.execute(
+                    "INSERT INTO progress_totals (session_id, activity, count, score_sum, score_count)"
+                    " VALUES (?, ?, 1, ?, ?) ON CONFLICT (session_id, activity) DO UPDATE SET"
+                    " count = count + 1, score_sum = score_sum + excluded.score_sum,"
+                    " score_count = score_count + excluded.score_count",
+                    (session_id, entry.get("activity", ""), score or 0, scored),
+                )
+                if entry.get("topic"):
+                    conn.execute(
+                        "INSERT INTO progress_topics"
+                        " (session_id, topic, activities, attempts, best_score, score_sum, last_activity)"
+                        " VALUES (?, ?, 1, ?, ?, ?, ?) ON CONFLICT (session_id, topic) DO UPDATE SET"
+                        " activities = activities + 1, attempts = attempts + excluded.attempts,"
+                        " best_score = CASE WHEN excluded.best_score IS NULL THEN best_score"
+                        "   WHEN best_score IS NULL OR excluded.best_score > best_score THEN excluded.best_score"
+                        "   ELSE best_score END,"
+                        " score_sum = score_sum + excluded.score_sum, last_activity = excluded.last_activity",
+                        (session_id, entry["topic"], scored, score, score or 0, entry.get("timestamp")),
+                    )
+                conn.execute("INSERT INTO progress_recent (session_id, entry) VALUES (?, ?)",
+                             (session_id, json.dumps(entry)))
+            for session_id in {session_id for session_id, _ in entries}:
+                conn.execute(
+                    "DELETE FROM progress_recent WHERE session_id = ? AND id <= ("
+                    " SELECT id FROM progress_recent WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, RECENT_LIMIT),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def recent(self, session_id: str) -> List[dict]:
+        """The last RECENT_LIMIT entries, oldest first."""
+        rows = self._conn().execute(
+            "SELECT entry FROM progress_recent WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, RECENT_LIMIT),
+        ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def total_activities(self, session_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Activity count per session (all sessions if none are given)."""
+        query = "SELECT session_id, SUM(count) FROM progress_totals"
+        params: tuple = ()
+        if session_ids is not None:
+            query += f" WHERE session_id IN ({','.join('?' * len(session_ids))})"
+            params = tuple(session_ids)
+        return dict(self._conn().execute(query + " GROUP BY session_id", params).fetchall())
+
+    def summary(self, session_id: str) -> dict:
+        conn = self._conn()
+        conn.execute("BEGIN")  # one snapshot of all three tables
+        try:
+            totals = conn.execute(
+                "SELECT activity, count, score_sum, score_count FROM progress_totals WHERE session_id = ?",
+                (session_id,),
+            ).fetchall()
+            topics = conn.execute(
+                "SELECT topic, activities, attempts, best_score, score_sum, last_activity FROM progress_topics"
+                " WHERE session_id = ? ORDER BY last_activity DESC LIMIT ?",
+                (session_id, TOPIC_LIMIT),
+            ).fetchall()
+            recent = self.recent(session_id)
+        finally:
+            conn.execute("COMMIT")
+        score_sum = sum(t[2] for t in totals)
+        score_count = sum(t[3] for t in totals)
+        return {
+            "session_id": session_id,
+            "total_activities": sum(t[1] for t in totals),
+            "activity_counts": {t[0]: t[1] for t in totals},
+            "average_score": round(score_sum / score_count, 1) if score_count else None,
+            "scored_attempts": score_count,
+            "topics": [
+                {
+                    "topic": t[0],
+                    "activities": t[1],
+                    "attempts": t[2],
+                    "best_score": t[3],
+                    "average_score": round(t[4] / t[2], 1) if t[2] else None,
+                    "last_activity": t[5],
+                }
+                for t in topics
+            ],
+            "recent_activity": list(reversed(recent)),  # newest first
+        }
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("progress_totals", "progress_topics", "progress_recent"):
+                conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class ProgressWriter:
+    """Queues progress entries and writes them to the store in batches."""
+
+    def __init__(self, store: ProgressStore, flush_seconds: float = 0.5):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self._pending: List[Tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        self._flushing = asyncio.Lock()
+
+    def submit(self, session_id: str, entry: dict):
+        with self._lock:
+            self._pending.append((session_id, entry))
+            PENDING.set(len(self._pending))
+
+    async def flush(self):
+        """Write everything queued so far (also used before reads, so a worker sees its own writes)."""
+        async with self._flushing:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                PENDING.set(0)
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self.store.record_many, batch)
+            except Exception:
+                with self._lock:
+                    self._pending = batch + self._pending  # retried on the next flush
+                    PENDING.set(len(self._pending))
+                raise
+            FLUSH_BATCH.observe(len(batch))
+
+    async def delete(self, session_id: str):
+        """Drop a session's queued entries and its rollups.
+
+        Holds off flushes meanwhile, so none can re-insert the session's entries afterwards.
+        """
+        async with self._flushing:
+            with self._lock:
+                self._pending = [(sid, entry) for sid, entry in self._pending if sid != session_id]
+                PENDING.set(len(self._pending))
+            await asyncio.to_thread(self.store.delete, session_id)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"WARNING: Progress flush failed: {e}")
@@ -1,34 +1,34 @@
 # backend/query_demo.py
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import sys
+from pathlib import Path
+
+# Allow running as `python backend/query_demo.py` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from pathlib import Path
 import os
 
-VECTOR_STORE_PATH = Path("backend/data/faiss_index")
+from backend.config import VECTOR_STORE_PATH
+from backend.embeddings import get_embeddings
+from backend.index_store import load_index, similarity_search
 
 def load_vector_store():
     """Load the FAISS vector store."""
     if not VECTOR_STORE_PATH.exists():
-        raise FileNotFoundError(f"Vector store not found at {VECTOR_STORE_PATH}. Please run embed_and_index.py first.")
+        raise FileNotFoundError(f"Vector store not found at {VECTOR_STORE_PATH}. Please run ingest.py first.")
     
-    # Use the same local embeddings model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    vectorstore = FAISS.load_local(str(VECTOR_STORE_PATH), embeddings, allow_dangerous_deserialization=True)
+    # Use the same local embeddings model (memory-mapped index, no pickle)
+    vectorstore = load_index(VECTOR_STORE_PATH, get_embeddings())
     return vectorstore
 
 def query_documents(query: str, k: int = 3):
     """Query the vector store and return relevant documents."""
     vectorstore = load_vector_store()
-    docs = vectorstore.similarity_search(query, k=k)
+    docs = similarity_search(vectorstore, query, k=k)
     return docs
 
 def query_with_llm(query: str, chat_history: list = None):
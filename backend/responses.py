@@ -0,0 +1,133 @@
+# backend/responses.py
+"""
+Response serialization and compression.
+
+FastJSONResponse renders with orjson when it is installed (several times
+faster than json.dumps on chat histories), falling back to compact
+json.dumps. Endpoints that return large, already JSON-shaped payloads
+(sessions) return it directly, skipping FastAPI's jsonable_encoder pass.
+
+CompressionMiddleware compresses responses of at least
+COMPRESSION_MIN_BYTES with brotli (if the brotli package is installed)
+or gzip, whichever the client accepts. Streamed responses (the NDJSON
+batch endpoints) are passed through so each line still reaches the
+client as soon as it is written.
+
+Serialization and compression time are recorded as request stages
+("serialize", "compress"); response sizes by encoding in
+http_response_bytes.
+"""
+
+import gzip
+import json
+import time
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from backend import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+RESPONSE_BYTES = metrics.Histogram(
+    "http_response_bytes", "Response body size as sent", ("endpoint", "encoding"),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (if installed), timed as the "serialize" stage."""
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = dumps(content)
+        metrics.record_stage("serialize", time.perf_counter() - start)
+        return body
+
+
+def choose_encoding(accept_encoding: str):
+    """br or gzip, as accepted by the client (q=0 means refused), preferring br."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)  # quality 4: close to gzip's speed, smaller output
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip for complete (non-streamed) responses above a size threshold."""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (message.get("more_body", False) or encoding is None or len(body) < self.minimum_size
+                    or "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                # Streamed, small, already encoded or not worth it: send as is
+                passthrough = True
+                if not message.get("more_body", False):
+                    RESPONSE_BYTES.observe(len(body), endpoint=metrics.current_endpoint(), encoding="identity")
+                await send(start_message)
+                await send(message)
+                return
+            start = time.perf_counter()
+            body = compress(body, encoding)
+            metrics.record_stage("compress", time.perf_counter() - start)
+            RESPONSE_BYTES.observe(len(body), endpoint=metrics.current_endpoint(), encoding=encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
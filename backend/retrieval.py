@@ -0,0 +1,163 @@
+# backend/retrieval.py
+"""
+Micro-batched retrieval off the event loop.
+
+/generate-quiz and /generate-summary called similarity_search straight
+from their async handlers, so the MiniLM forward pass and the FAISS scan
+ran on the event loop and stalled every other request; concurrent /query
+calls each encoded their one query in a thread of their own. Retrievals
+now go through a RetrievalBatcher:
+
+    docs = await retriever.search(vectorstore, query, k, documents, collections)
+
+Queries arriving within RETRIEVAL_BATCH_WINDOW_MS of each other (or while
+the previous batch is still running) are encoded in one embedding call and
+searched together - one FAISS search per distinct scope - on a dedicated
+thread, and each awaiting handler gets its own top-k back. A lone query
+waits at most the window; under load batches grow up to
+RETRIEVAL_MAX_BATCH, and the per-query cost drops.
+
+With a retrieval service (RETRIEVAL_SERVICE_URL), a batch is one call to it
+instead (see retrieval_client.py).
+
+Background queries (prefetch.py) only take spare room in a batch, or run
+when no real query is waiting, so speculative work never delays a student.
+
+Batch sizes are recorded in retrieval_batch_queries, the time queries wait
+for their batch in retrieval_batch_wait_seconds.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from backend import metrics
+from backend.index_store import search_vectors
+from backend.retrieval_client import RemoteIndex
+
+BATCH_QUERIES = metrics.Histogram(
+    "retrieval_batch_queries", "Queries encoded and searched together", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_WAIT = metrics.Histogram(
+    "retrieval_batch_wait_seconds", "Time a query waited for its retrieval batch to start",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+@dataclass
+class _Query:
+    vectorstore: object
+    text: str
+    k: int
+    scope: tuple
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class RetrievalBatcher:
+    """Collects concurrent retrievals and runs them as batches on one dedicated thread."""
+
+    def __init__(self, window_seconds: float = 0.002, max_batch: int = 64):
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self._pending: List[_Query] = []
+        self._background: List[_Query] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval")
+
+    async def search(self, vectorstore, query: str, k: int,
+                     documents: Optional[List[str]] = None, collections: Optional[List[str]] = None,
+                     background: bool = False) -> List:
+        loop = asyncio.get_running_loop()
+        scope = (tuple(sorted(documents or ())), tuple(sorted(collections or ())))
+        item = _Query(vectorstore, query, k, scope, loop.create_future())
+        (self._background if background else self._pending).append(item)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None and not self._running:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await item.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Queries that arrive while a batch runs go in the next one, started when it finishes
+        if self._running:
+            return
+        batch = [q for q in self._pending[:self.max_batch] if not q.future.cancelled()]
+        del self._pending[:self.max_batch]
+        # Background queries fill whatever room is left
+        room = self.max_batch - len(batch)
+        batch += [q for q in self._background[:room] if not q.future.cancelled()]
+        del self._background[:room]
+        if not batch:
+            if self._pending or self._background:
+                self._flush()
+            return
+        self._running = True
+        now = time.perf_counter()
+        for q in batch:
+            BATCH_WAIT.observe(now - q.enqueued)
+        BATCH_QUERIES.observe(len(batch))
+        task = asyncio.get_running_loop().run_in_executor(self._executor, _run_batch, batch)
+        task.add_done_callback(lambda done: self._finished(batch, done))
+
+    def _finished(self, batch: List[_Query], done: asyncio.Future):
+        self._running = False
+        error = done.exception()
+        for q, result in zip(batch, [error] * len(batch) if error else done.result()):
+            if q.future.done():
+                continue  # the handler went away
+            if isinstance(result, Exception):
+                q.future.set_exception(result)
+            else:
+                q.future.set_result(result)
+        if self._pending or self._background:
+            self._flush()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_batch(batch: List[_Query]) -> list:
+    """One embedding call per index, one FAISS search per scope; a result (or error) per query."""
+    results: list = [None] * len(batch)
+    by_index: Dict[int, List[int]] = {}
+    for i, q in enumerate(batch):
+        by_index.setdefault(id(q.vectorstore), []).append(i)
+    for positions in by_index.values():
+        vectorstore = batch[positions[0]].vectorstore
+        if isinstance(vectorstore, RemoteIndex):
+            # The retrieval service embeds and searches all of them (every scope) in one call
+            try:
+                found = vectorstore.search_many([
+                    (batch[i].text, batch[i].k, list(batch[i].scope[0]) or None, list(batch[i].scope[1]) or None)
+                    for i in positions
+                ])
+            except Exception as e:
+                found = [e] * len(positions)
+            for i, docs in zip(positions, found):
+                results[i] = docs
+            continue
+        try:
+            vectors = vectorstore.embedding_function.embed_documents([batch[i].text for i in positions])
+        except Exception as e:
+            for i in positions:
+                results[i] = e
+            continue
+        by_scope: Dict[tuple, List[int]] = {}
+        for position, i in enumerate(positions):
+            by_scope.setdefault(batch[i].scope, []).append(position)
+        for (documents, collections), members in by_scope.items():
+            k = max(batch[positions[p]].k for p in members)
+            try:
+                found = search_vectors(vectorstore, [vectors[p] for p in members], k,
+                                       list(documents) or None, list(collections) or None)
+            except Exception as e:
+                found = [e] * len(members)
+            for p, docs in zip(members, found):
+                i = positions[p]
+                results[i] = docs if isinstance(docs, Exception) else docs[:batch[i].k]
+    return results
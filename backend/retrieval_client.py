@@ -0,0 +1,182 @@
+# backend/retrieval_client.py
+"""
+Client side of the retrieval service (see retrieval_service.py).
+
+RetrievalClient keeps a pool of keep-alive HTTP connections
+(RETRIEVAL_POOL_SIZE) to the service, so each call costs one round trip
+rather than a new TCP connection. RemoteIndex wraps it in the parts of the
+vector store interface the API uses - `docstore.partitions()`,
+`docstore.source_for_hash()`, `embedding_function` and a version for
+cache keys - so app.py treats a remote index like the local one:
+
+    remote_index = RemoteIndex(RetrievalClient(RETRIEVAL_SERVICE_URL))
+    vectorstore = remote_index.get()     # None while nothing is indexed
+    docs = vectorstore.search_many([(query, 3, documents, collections), ...])
+
+The retrieval batcher sends all queries of a batch in one /search call.
+The service's status (version, row count) is refreshed by a background
+task every STATUS_REFRESH_SECONDS; get() and version() only read the last
+known status, so a slow or unreachable service never blocks the event loop.
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from backend import metrics
+
+# How often the service's version and row count are re-read
+STATUS_REFRESH_SECONDS = 1.0
+
+RPC_LATENCY = metrics.Histogram(
+    "retrieval_rpc_seconds", "Round trips to the retrieval service", ("call",), buckets=metrics.LATENCY_BUCKETS)
+RPC_ERRORS = metrics.Counter("retrieval_rpc_errors_total", "Failed calls to the retrieval service", ("call",))
+
+
+class RetrievalClient:
+    """JSON-over-HTTP calls to the retrieval service over pooled keep-alive connections."""
+
+    def __init__(self, base_url: str, pool_size: int = 16, timeout: float = 10.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _call(self, call: str, method: str, path: str, **kwargs) -> dict:
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            if response.status_code != 200:
+                raise Exception(f"Retrieval service returned status {response.status_code}: {response.text[:200]}")
+            return response.json()
+        except Exception:
+            RPC_ERRORS.inc(call=call)
+            raise
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - start, call=call)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embed", "POST", "/embed", json={"texts": list(texts)})["vectors"]
+
+    def search(self, queries: List[dict]) -> dict:
+        """{"results": [[hit, ...] per query], "version": ...} for {"text", "k", "documents", "collections"} queries."""
+        return self._call("search", "POST", "/search", json={"queries": queries})
+
+    def fetch(self, chunks: List[dict]) -> List[Optional[dict]]:
+        return self._call("fetch", "POST", "/fetch", json={"chunks": chunks})["chunks"]
+
+    def documents(self, content_hash: Optional[str] = None) -> List[dict]:
+        params = {"content_hash": content_hash} if content_hash else None
+        return self._call("documents", "GET", "/documents", params=params)["documents"]
+
+    def health(self) -> dict:
+        return self._call("health", "GET", "/health")
+
+    def close(self):
+        self.session.close()
+
+
+class RemoteEmbeddings:
+    """Embeddings computed by the retrieval service (same model as the index)."""
+
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed([text])[0]
+
+
+class RemoteDocstore:
+    """The document listing calls of SQLiteDocstore, answered across all shards."""
+
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+
+    def partitions(self) -> List[dict]:
+        return self.client.documents()
+
+    def source_for_hash(self, content_hash: str) -> Optional[str]:
+        documents = self.client.documents(content_hash)
+        return documents[0]["document"] if documents else None
+
+
+def _to_documents(hits: List[dict]) -> List:
+    from langchain_core.documents import Document
+
+    return [Document(page_content=hit["page_content"], metadata=hit["metadata"]) for hit in hits]
+
+
+class RemoteIndex:
+    """Stands in for the local vector store when retrieval runs in the retrieval service."""
+
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+        self.embedding_function = RemoteEmbeddings(client)
+        self.docstore = RemoteDocstore(client)
+        self._status: Optional[dict] = None
+        self._reachable = True
+
+    def refresh(self) -> dict:
+        """Re-read the service's status (blocking - run it off the event loop)."""
+        self._status = self.client.health()
+        return self._status
+
+    async def refresh_periodically(self, interval_seconds: float = STATUS_REFRESH_SECONDS):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+                if not self._reachable:
+                    print("✅ Retrieval service reachable again")
+                self._reachable = True
+            except Exception as e:
+                if self._reachable:
+                    print(f"WARNING: Retrieval service unreachable (serving its last known status): {e}")
+                self._reachable = False
+            await asyncio.sleep(interval_seconds)
+
+    def get(self) -> Optional["RemoteIndex"]:
+        """This index, or None if the service last reported no rows in any shard.
+
+        Before the first status arrives it is assumed to have some, so searches
+        fail with the service's error rather than claiming nothing is indexed.
+        """
+        status = self._status
+        return None if status is not None and not status["rows"] else self
+
+    def shard_name(self, index_dir) -> Optional[str]:
+        """Name under which the service serves index_dir (None if it doesn't)."""
+        status = self._status or self.refresh()
+        target = Path(index_dir).resolve()
+        for shard in status["shards"]:
+            if Path(shard["path"]).resolve() == target:
+                return shard["name"]
+        return None
+
+    def version(self):
+        """The last known version (None until the first status arrives)."""
+        status = self._status
+        return status["version"] if status is not None else None
+
+    def search_many(self, queries: List[Tuple[str, int, Optional[List[str]], Optional[List[str]]]]) -> List[List]:
+        """Top-k documents for (text, k, documents, collections) queries, in one call."""
+        if not queries:
+            return []
+        response = self.client.search([
+            {"text": text, "k": k, "documents": documents, "collections": collections}
+            for text, k, documents, collections in queries
+        ])
+        return [_to_documents(hits) for hits in response["results"]]
+
+    def search_batch(self, queries: List[str], k: int = 4, documents: Optional[List[str]] = None,
+                     collections: Optional[List[str]] = None) -> List[List]:
+        """similarity_search_batch against the service."""
+        return self.search_many([(query, k, documents, collections) for query in queries])
@@ -0,0 +1,278 @@
+# backend/retrieval_service.py
+"""
+Retrieval as its own process, over one or more index shards.
+
+Every API worker used to load the embedding model and map the whole
+index, so adding workers added model memory, and one index had to fit on
+one machine. This service holds the model and the indexes instead; API
+workers with RETRIEVAL_SERVICE_URL set send it their (already batched)
+queries through a pooled HTTP client (retrieval_client.py) and load
+neither.
+
+    python backend/retrieval_service.py                     # serves RETRIEVAL_SHARDS on :8100
+    python backend/retrieval_service.py --shard data/faiss_index --shard courses=/mnt/courses_index
+
+Each shard is an index directory as written by the app and by
+`backend/ingest.py --index-dir`. Shards are re-mapped when a writer
+publishes a new version, so uploads to VECTOR_STORE_PATH (which should be
+one of the shards) show up without a restart. A search embeds all its
+queries once, runs them on every shard in parallel (one FAISS search per
+shard and scope), merges the per-shard top-k by score and only then reads
+the winning chunks from the shards' docstores.
+
+RPC (JSON over HTTP):
+
+    POST /embed      {"texts": [...]}                        -> {"vectors": [[...], ...]}
+    POST /search     {"queries": [{"text", "k", "documents", "collections"}, ...]}
+                     -> {"results": [[{"shard", "row", "score", "page_content", "metadata"}, ...], ...],
+                         "version": ...}
+    POST /fetch      {"chunks": [{"shard", "row"}, ...]}     -> {"chunks": [{"page_content", "metadata"} | null]}
+    GET  /documents  [?content_hash=...]                     -> {"documents": [...], "version": ...}
+    GET  /health                                             -> shards, rows, version
+    GET  /metrics
+
+Rows identify a chunk within a shard's current version; /fetch returns
+null for rows that have since been deleted.
+"""
+
+import argparse
+import hashlib
+import heapq
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+if __name__ == "__main__":
+    # Allow running as `python backend/retrieval_service.py` from the project root
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from backend import metrics
+from backend.config import RETRIEVAL_SERVICE_HOST, RETRIEVAL_SERVICE_PORT, RETRIEVAL_SHARDS
+from backend.embeddings import get_embeddings
+from backend.index_store import CachedIndex, search_rows
+
+SERVICE_STAGE = metrics.Histogram(
+    "retrieval_service_seconds", "Retrieval service time per stage (embed, search, merge, fetch)", ("stage",),
+    buckets=metrics.LATENCY_BUCKETS)
+SHARD_SEARCH = metrics.Histogram(
+    "retrieval_shard_search_seconds", "FAISS search time per shard and request", ("shard",),
+    buckets=metrics.LATENCY_BUCKETS)
+SEARCH_QUERIES = metrics.Counter("retrieval_service_queries_total", "Queries searched by the service")
+
+
+def parse_shards(specs: List[str]) -> Dict[str, Path]:
+    """"[name=]path" specs -> {name: path}; names default to the directory name."""
+    shards: Dict[str, Path] = {}
+    for spec in specs:
+        name, _, path = spec.rpartition("=")
+        path = Path(path)
+        name = name or path.name
+        if name in shards:
+            name = f"{name}-{len(shards)}"
+        shards[name] = path
+    return shards
+
+
+class ShardSet:
+    """The hosted index shards and scatter-gather search over them."""
+
+    def __init__(self, shards: Dict[str, Path], embeddings_factory=get_embeddings):
+        self.embeddings_factory = embeddings_factory
+        self.shards = {name: CachedIndex(path, embeddings_factory) for name, path in shards.items()}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.shards)), thread_name_prefix="shard")
+
+    def _open(self) -> Dict[str, object]:
+        """The current vector store of every shard that has an index."""
+        stores = {name: shard.get() for name, shard in self.shards.items()}
+        return {name: store for name, store in stores.items() if store is not None}
+
+    def version(self) -> str:
+        """Changes whenever any shard publishes a new version."""
+        versions = repr([(name, shard.version()) for name, shard in self.shards.items()])
+        return hashlib.sha1(versions.encode()).hexdigest()[:16]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = self.embeddings_factory().embed_documents(list(texts))
+        SERVICE_STAGE.observe(time.perf_counter() - start, stage="embed")
+        return vectors
+
+    def search(self, queries: List[dict]) -> List[List[dict]]:
+        """Top-k chunks per query ({"text", "k", "documents", "collections"}) across all shards."""
+        if not queries:
+            return []
+        SEARCH_QUERIES.inc(len(queries))
+        stores = self._open()
+        if not stores:
+            return [[] for _ in queries]
+        vectors = self.embed([q["text"] for q in queries])
+        # Queries with the same scope share one FAISS search per shard
+        by_scope: Dict[tuple, List[int]] = {}
+        for i, q in enumerate(queries):
+            scope = (tuple(sorted(q.get("documents") or ())), tuple(sorted(q.get("collections") or ())))
+            by_scope.setdefault(scope, []).append(i)
+
+        def search_shard(name: str) -> List[Tuple[float, str, int, int]]:
+            start = time.perf_counter()
+            hits = []
+            for (documents, collections), members in by_scope.items():
+                k = max(queries[i].get("k", 4) for i in members)
+                scores, rows = search_rows(stores[name], [vectors[i] for i in members], k,
+                                           list(documents) or None, list(collections) or None)
+                for i, query_scores, query_rows in zip(members, scores, rows):
+                    hits.extend((float(score), name, int(row), i)
+                                for score, row in zip(query_scores, query_rows) if row != -1)
+            SHARD_SEARCH.observe(time.perf_counter() - start, shard=name)
+            return hits
+
+        start = time.perf_counter()
+        candidates: List[List[Tuple[float, str, int]]] = [[] for _ in queries]
+        for hits in self._executor.map(search_shard, list(stores)):
+            for score, name, row, i in hits:
+                candidates[i].append((score, name, row))
+        SERVICE_STAGE.observe(time.perf_counter() - start, stage="search")
+
+        start = time.perf_counter()
+        results = []
+        for q, hits in zip(queries, candidates):
+            merged = []
+            for score, name, row in heapq.nlargest(q.get("k", 4), hits):
+                doc = stores[name].docstore.search(str(row))
+                if isinstance(doc, str):
+                    continue  # row without a stored document
+                merged.append({"shard": name, "row": row, "score": score,
+                               "page_content": doc.page_content, "metadata": doc.metadata})
+            results.append(merged)
+        SERVICE_STAGE.observe(time.perf_counter() - start, stage="merge")
+        return results
+
+    def fetch(self, chunks: List[dict]) -> List[Optional[dict]]:
+        """Chunks by (shard, row); None for unknown or deleted rows."""
+        import numpy as np
+
+        start = time.perf_counter()
+        stores = self._open()
+        found = []
+        for chunk in chunks:
+            store = stores.get(chunk["shard"])
+            row = int(chunk["row"])
+            deleted = store.docstore.deleted_rows() if store is not None else None
+            if store is None or np.isin(row, deleted):
+                found.append(None)
+                continue
+            doc = store.docstore.search(str(row))
+            found.append(None if isinstance(doc, str) else {"page_content": doc.page_content, "metadata": doc.metadata})
+        SERVICE_STAGE.observe(time.perf_counter() - start, stage="fetch")
+        return found
+
+    def documents(self, content_hash: Optional[str] = None) -> List[dict]:
+        """Indexed documents of every shard (each tagged with its shard)."""
+        documents = []
+        for name, store in self._open().items():
+            for partition in store.docstore.partitions():
+                if content_hash is None or partition["content_hash"] == content_hash:
+                    documents.append(dict(partition, shard=name))
+        return documents
+
+    def health(self) -> dict:
+        stores = self._open()
+        return {
+            "status": "ok",
+            "version": self.version(),
+            "shards": [
+                {"name": name, "path": str(shard.index_dir),
+                 "rows": stores[name].index.ntotal if name in stores else 0}
+                for name, shard in self.shards.items()
+            ],
+            "rows": sum(store.index.ntotal for store in stores.values()),
+        }
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class SearchQuery(BaseModel):
+    text: str
+    k: int = 4
+    documents: Optional[List[str]] = None
+    collections: Optional[List[str]] = None
+
+
+class SearchRequest(BaseModel):
+    queries: List[SearchQuery]
+
+
+class ChunkRef(BaseModel):
+    shard: str
+    row: int
+
+
+class FetchRequest(BaseModel):
+    chunks: List[ChunkRef]
+
+
+def create_app(shards: Dict[str, Path]) -> FastAPI:
+    shard_set = ShardSet(shards)
+    service = FastAPI(title="AI Mentor retrieval service")
+
+    # Plain (sync) handlers: FastAPI runs them on its thread pool, and FAISS releases the GIL
+
+    @service.post("/embed")
+    def embed(request: EmbedRequest):
+        return {"vectors": shard_set.embed(request.texts)}
+
+    @service.post("/search")
+    def search(request: SearchRequest):
+        try:
+            results = shard_set.search([q.model_dump() for q in request.queries])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
+        return {"results": results, "version": shard_set.version()}
+
+    @service.post("/fetch")
+    def fetch(request: FetchRequest):
+        return {"chunks": shard_set.fetch([c.model_dump() for c in request.chunks])}
+
+    @service.get("/documents")
+    def documents(content_hash: Optional[str] = None):
+        return {"documents": shard_set.documents(content_hash), "version": shard_set.version()}
+
+    @service.get("/health")
+    def health():
+        return shard_set.health()
+
+    @service.get("/metrics", response_class=PlainTextResponse)
+    def get_metrics():
+        return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @service.on_event("startup")
+    def warm_up():
+        # Load the model and map the shards before the first query
+        shard_set.embed(["warm up"])
+        print(f"🔎 Retrieval service ready: {shard_set.health()['shards']}")
+
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embedding + scatter-gather search over index shards.")
+    parser.add_argument("--shard", action="append", metavar="[NAME=]PATH",
+                        help="index directory to serve (repeatable; default: RETRIEVAL_SHARDS)")
+    parser.add_argument("--host", default=RETRIEVAL_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=RETRIEVAL_SERVICE_PORT)
+    args = parser.parse_args()
+
+    import uvicorn
+    # One process: it holds the model and the mapped shards; concurrency comes from its thread pool
+    uvicorn.run(create_app(parse_shards(args.shard or RETRIEVAL_SHARDS)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+# backend/session_store.py
+"""
+Shared session state (chat history + progress) for several workers and nodes.
+
+Sessions used to live in a per-process dict, mirrored to one JSON file
+per session that every save rewrote, so with `--workers N` a student's
+conversation lived in whichever worker they first hit. Sessions are now
+kept in a shared store:
+
+    SQLiteSessionStore  {SESSIONS_DIR}/sessions.sqlite - one row per message or
+                        progress entry, so appends don't rewrite the session.
+                        Safe for any number of workers on one host (SQLite
+                        locks the file); needs a shared filesystem across nodes.
+    KVSessionStore      a network key-value store (Redis, REDIS_URL) for
+                        several nodes; MemoryKV is the in-process stand-in
+                        used for tests and SESSION_BACKEND=memory.
+
+Every session carries a version that each append bumps. An append can
+name the version it was based on and fails with VersionConflict if
+another worker got there first (optimistic concurrency). CachedSessionStore
+uses that to keep a per-worker read-through cache coherent: a successful
+conditional append proves nobody else wrote in between, so the cached copy
+is updated in place; a conflict drops it and re-reads.
+
+Sessions saved as JSON files by earlier versions are imported at startup
+(import_json_sessions).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from backend.filelock import FileLock
+from backend.memory_budget import approx_size
+
+SESSIONS_DB = "sessions.sqlite"
+
+
+class VersionConflict(Exception):
+    """The session changed since the version an append was based on."""
+
+
+@dataclass
+class SessionRecord:
+    session_id: str
+    created_at: str
+    chat_history: List[dict] = field(default_factory=list)   # {"role": "user"|"assistant", "content", "timestamp"}
+    progress: List[dict] = field(default_factory=list)
+    version: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "message_count": len(self.chat_history),
+            "activity_count": len(self.progress),
+        }
+
+
+class SessionStore:
+    """Interface of the session backends."""
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        raise NotImplementedError
+
+    def create(self, session_id: str, created_at: Optional[str] = None) -> SessionRecord:
+        """Create the session if it doesn't exist; return it either way."""
+        raise NotImplementedError
+
+    def append(self, session_id: str, messages: List[dict] = (), progress: List[dict] = (),
+               expected_version: Optional[int] = None) -> int:
+        """Append chat messages and progress entries; returns the new version.
+
+        With expected_version, raises VersionConflict unless the session is at that version.
+        Appending to a missing session creates it.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def list(self) -> List[dict]:
+        """Summaries (session_id, created_at, message_count, activity_count), newest first."""
+        raise NotImplementedError
+
+
+# --- SQLite ----------------------------------------------------------------
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite database shared by all workers on the host."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0,"
+            " message_count INTEGER NOT NULL DEFAULT 0, activity_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_events ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite serialises writers across processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        conn = self._conn()
+        conn.execute("BEGIN")  # one snapshot for the session row and its events
+        try:
+            row = conn.execute(
+                "SELECT created_at, version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = SessionRecord(session_id, row[0], version=row[1])
+            for kind, data in conn.execute(
+                "SELECT kind, data FROM session_events WHERE session_id = ? ORDER BY seq", (session_id,)
+            ):
+                (record.chat_history if kind == "message" else record.progress).append(json.loads(data))
+            return record
+        finally:
+            conn.execute("COMMIT")
+
+    def create(self, session_id: str, created_at: Optional[str] = None) -> SessionRecord:
+        self._conn().execute(
+            "INSERT OR IGNORE INTO sessions (session_id, created_at) VALUES (?, ?)",
+            (session_id, created_at or datetime.now().isoformat()),
+        )
+        return self.get(session_id)
+
+    def append(self, session_id: str, messages: List[dict] = (), progress: List[dict] = (),
+               expected_version: Optional[int] = None) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, message_count + activity_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO sessions (session_id, created_at) VALUES (?, ?)",
+                             (session_id, datetime.now().isoformat()))
+                row = (0, 0)
+            version, seq = row
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"session {session_id} is at version {version}, not {expected_version}")
+            events = [("message", m) for m in messages] + [("progress", p) for p in progress]
+            conn.executemany(
+                "INSERT INTO session_events (session_id, seq, kind, data) VALUES (?, ?, ?, ?)",
+                [(session_id, seq + i, kind, json.dumps(data)) for i, (kind, data) in enumerate(events)],
+            )
+            conn.execute(
+                "UPDATE sessions SET version = version + 1, message_count = message_count + ?,"
+                " activity_count = activity_count + ? WHERE session_id = ?",
+                (len(messages), len(progress), session_id),
+            )
+            conn.execute("COMMIT")
+            return version + 1
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_events WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list(self) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT session_id, created_at, message_count, activity_count FROM sessions ORDER BY created_at DESC"
+        ).fetchall()
+        return [
+            {"session_id": r[0], "created_at": r[1], "message_count": r[2], "activity_count": r[3]} for r in rows
+        ]
+
+
+# --- Key-value -------------------------------------------------------------
+
+class MemoryKV:
+    """In-process stand-in for a network key-value store (same interface as RedisKV)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lists = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data.get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            return [self._data.get(key) for key in keys]
+
+    def compare_and_set(self, key: str, expected: Optional[str], value: str, push: Optional[dict] = None) -> bool:
+        """Set key to value only if it currently holds expected (None = absent).
+
+        In the same atomic step, append push's values to the end of its lists ({list_key: [value, ...]}).
+        """
+        with self._lock:
+            if self._data.get(key) != expected:
+                return False
+            self._data[key] = value
+            for list_key, values in (push or {}).items():
+                self._lists.setdefault(list_key, []).extend(values)
+            return True
+
+    def list_range(self, key: str, start: int, stop: int) -> List[str]:
+        """Items start..stop (inclusive, like LRANGE) of a list."""
+        with self._lock:
+            return list(self._lists.get(key, [])[start:stop + 1])
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._lists.pop(key, None)
+
+    def scan(self, prefix: str) -> Iterator[str]:
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+        return iter(keys)
+
+
+class RedisKV:
+    """Redis-backed key-value store (needs `pip install redis`)."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("SESSION_BACKEND=redis needs the redis package: pip install redis")
+        self._redis = redis
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return self._client.mget(keys) if keys else []
+
+    def compare_and_set(self, key: str, expected: Optional[str], value: str, push: Optional[dict] = None) -> bool:
+        with self._client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, value)
+                for list_key, values in (push or {}).items():
+                    if values:
+                        pipe.rpush(list_key, *values)
+                pipe.execute()
+                return True
+            except self._redis.WatchError:
+                return False
+
+    def list_range(self, key: str, start: int, stop: int) -> List[str]:
+        return self._client.lrange(key, start, stop)
+
+    def delete(self, *keys: str):
+        self._client.delete(*keys)
+
+    def scan(self, prefix: str) -> Iterator[str]:
+        return self._client.scan_iter(match=f"{prefix}*")
+
+
+class KVSessionStore(SessionStore):
+    """Sessions in a key-value store: a small meta value per session plus append-only lists.
+
+    The meta value ({"created_at", "version", "message_count",
+    "activity_count"}) is what compare-and-set guards; an append swaps it
+    and RPUSHes the new messages and progress entries in one transaction,
+    so a turn writes only what it adds. Reads take the first
+    message_count/activity_count list items, which keeps them consistent
+    with the meta value even while another worker appends. list() reads
+    only the meta values.
+    """
+
+    def __init__(self, kv, prefix: str = "ai-mentor:session:"):
+        self.kv = kv
+        self.meta_prefix = prefix + "meta:"
+        self.messages_prefix = prefix + "messages:"
+        self.progress_prefix = prefix + "progress:"
+
+    def _keys(self, session_id: str):
+        return (self.meta_prefix + session_id, self.messages_prefix + session_id,
+                self.progress_prefix + session_id)
+
+    @staticmethod
+    def _meta(created_at: str, version: int = 0, message_count: int = 0, activity_count: int = 0) -> dict:
+        return {"created_at": created_at, "version": version,
+                "message_count": message_count, "activity_count": activity_count}
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        meta_key, messages_key, progress_key = self._keys(session_id)
+        raw = self.kv.get(meta_key)
+        if raw is None:
+            return None
+        meta = json.loads(raw)
+        messages = self.kv.list_range(messages_key, 0, meta["message_count"] - 1) if meta["message_count"] else []
+        progress = self.kv.list_range(progress_key, 0, meta["activity_count"] - 1) if meta["activity_count"] else []
+        return SessionRecord(session_id, meta["created_at"], [json.loads(m) for m in messages],
+                             [json.loads(p) for p in progress], meta["version"])
+
+    def create(self, session_id: str, created_at: Optional[str] = None) -> SessionRecord:
+        meta = self._meta(created_at or datetime.now().isoformat())
+        self.kv.compare_and_set(self.meta_prefix + session_id, None, json.dumps(meta))
+        return self.get(session_id)
+
+    def append(self, session_id: str, messages: List[dict] = (), progress: List[dict] = (),
+               expected_version: Optional[int] = None) -> int:
+        meta_key, messages_key, progress_key = self._keys(session_id)
+        push = {messages_key: [json.dumps(m) for m in messages], progress_key: [json.dumps(p) for p in progress]}
+        while True:
+            raw = self.kv.get(meta_key)
+            meta = json.loads(raw) if raw is not None else self._meta(datetime.now().isoformat())
+            if expected_version is not None and meta["version"] != expected_version:
+                raise VersionConflict(f"session {session_id} is at version {meta['version']}, not {expected_version}")
+            updated = self._meta(meta["created_at"], meta["version"] + 1,
+                                 meta["message_count"] + len(messages), meta["activity_count"] + len(progress))
+            if self.kv.compare_and_set(meta_key, raw, json.dumps(updated), push):
+                return updated["version"]
+            # Someone else wrote between our read and write; unconditional appends just retry
+
+    def delete(self, session_id: str):
+        self.kv.delete(*self._keys(session_id))
+
+    def list(self) -> List[dict]:
+        keys = list(self.kv.scan(self.meta_prefix))
+        summaries = []
+        for key, raw in zip(keys, self.kv.get_many(keys)):
+            if raw is None:
+                continue  # deleted while listing
+            meta = json.loads(raw)
+            summaries.append({
+                "session_id": key[len(self.meta_prefix):],
+                "created_at": meta["created_at"],
+                "message_count": meta["message_count"],
+                "activity_count": meta["activity_count"],
+            })
+        return sorted(summaries, key=lambda s: s["created_at"], reverse=True)
+
+
+# --- Per-worker cache ------------------------------------------------------
+
+class CachedSessionStore(SessionStore):
+    """Read-through cache in front of a shared store.
+
+    Reads are served from this worker's copy for up to `ttl` seconds (so
+    another worker's append may take that long to show up in /session).
+    Appends are conditional on the cached version, so they never lose
+    another worker's writes; on a conflict the copy is re-read and the
+    append retried.
+    """
+
+    def __init__(self, store: SessionStore, ttl: float = 2.0, max_sessions: int = 10000):
+        self.store = store
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (record, fetched_at, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _cached(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                return None
+            return entry[0]
+
+    def _remember(self, record: SessionRecord, fetched_at: Optional[float] = None,
+                  nbytes: Optional[int] = None):
+        if nbytes is None:
+            nbytes = approx_size(record)
+        with self._lock:
+            self._drop(record.session_id)
+            self._cache[record.session_id] = (record, fetched_at or time.monotonic(), nbytes)
+            self._bytes += nbytes
+            while len(self._cache) > self.max_sessions:
+                self._drop(next(iter(self._cache)))
+
+    def _drop(self, session_id: str) -> int:
+        entry = self._cache.pop(session_id, None)
+        if entry is None:
+            return 0
+        self._bytes -= entry[2]
+        return entry[2]
+
+    def _forget(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def nbytes(self) -> int:
+        """Approximate size of the cached sessions (see memory_budget.py)."""
+        return self._bytes
+
+    def evict(self, nbytes: int) -> int:
+        """Drop least recently used sessions until nbytes are freed; returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            while self._cache and freed < nbytes:
+                freed += self._drop(next(iter(self._cache)))
+        return freed
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        record = self._cached(session_id)
+        if record is None:
+            record = self.store.get(session_id)
+            if record is not None:
+                self._remember(record)
+        return record
+
+    def create(self, session_id: str, created_at: Optional[str] = None) -> SessionRecord:
+        record = self.store.create(session_id, created_at)
+        self._remember(record)
+        return record
+
+    def append(self, session_id: str, messages: List[dict] = (), progress: List[dict] = (),
+               expected_version: Optional[int] = None) -> int:
+        if expected_version is not None:
+            self._forget(session_id)
+            return self.store.append(session_id, messages, progress, expected_version)
+        for _ in range(3):
+            record = self.get(session_id)
+            if record is None:
+                break
+            try:
+                version = self.store.append(session_id, messages, progress, record.version)
+            except VersionConflict:
+                self._forget(session_id)
+                continue
+            # Nobody else wrote in between: our copy plus these entries is the stored session.
+            # Its size grows by the new entries only - re-measuring the whole history every turn is O(history)
+            with self._lock:
+                entry = self._cache.get(session_id)
+            added = sum(approx_size(item) for item in list(messages) + list(progress))
+            fetched_at, nbytes = (entry[1], entry[2] + added) if entry is not None else (None, None)
+            self._remember(replace(record, chat_history=record.chat_history + list(messages),
+                                   progress=record.progress + list(progress), version=version), fetched_at, nbytes)
+            return version
+        # New session, or too much contention: append unconditionally and re-read next time
+        self._forget(session_id)
+        return self.store.append(session_id, messages, progress)
+
+    def delete(self, session_id: str):
+        self._forget(session_id)
+        self.store.delete(session_id)
+
+    def list(self) -> List[dict]:
+        return self.store.list()
+
+
+def open_session_store(backend: str, sessions_dir, redis_url: Optional[str] = None,
+                       cache_ttl: float = 2.0) -> SessionStore:
+    """The configured backend (sqlite, redis or memory) behind a per-worker cache."""
+    if backend == "sqlite":
+        store = SQLiteSessionStore(Path(sessions_dir) / SESSIONS_DB)
+    elif backend == "redis":
+        store = KVSessionStore(RedisKV(redis_url))
+    elif backend == "memory":
+        store = KVSessionStore(MemoryKV())
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r} (use sqlite, redis or memory)")
+    return CachedSessionStore(store, cache_ttl) if cache_ttl > 0 else store
+
+
+def import_json_sessions(store: SessionStore, sessions_dir, record_progress=None) -> int:
+    """Move sessions saved as {session_id}.json files into the store; returns how many.
+
+    Progress entries go to record_progress([(session_id, entry), ...]) if given
+    (see progress_store.py), otherwise into the session.
+    """
+    imported = 0
+    sessions_dir = Path(sessions_dir)
+    if not any(sessions_dir.glob("*.json")):
+        return 0
+    # Workers start together; only one may import a given file
+    with FileLock(sessions_dir / ".import.lock"):
+        for path in sorted(sessions_dir.glob("*.json")):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            session_id = path.stem
+            if store.get(session_id) is None:
+                store.create(session_id, data.get("created_at") or datetime.now().isoformat())
+                messages = [
+                    # Older files used human/ai for the roles
+                    {**m, "role": "user" if m.get("role") in ("user", "human") else "assistant"}
+                    for m in data.get("chat_history", [])
+                ]
+                progress = data.get("progress", [])
+                if record_progress is not None:
+                    record_progress([(session_id, entry) for entry in progress])
+                    progress = []
+                store.append(session_id, messages, progress)
+                imported += 1
+            path.rename(path.with_suffix(".json.imported"))
+    return imported
@@ -0,0 +1,68 @@
+# backend/singleflight.py
+"""
+Coalescing of identical in-flight requests.
+
+When a class is told to "ask the mentor about X", dozens of students send
+the same question within seconds. Concurrent calls with the same key share
+one computation (retrieval + generation) instead of each starting their
+own; the first caller runs it and the others wait for its result. Only
+the shared work goes through here - per-session bookkeeping stays with
+each caller. Coalescing is per worker process.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from backend import metrics
+from backend.metrics import span
+
+T = TypeVar("T")
+
+COALESCED = metrics.Counter(
+    "coalesced_requests_total",
+    "Requests that ran a shared computation (leader) or waited for an identical one (follower)",
+    ("endpoint", "role"))
+IN_FLIGHT = metrics.Gauge("coalesced_computations_in_flight", "Shared computations currently running", ("endpoint",))
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question or topic."""
+    return " ".join(text.lower().split())
+
+
+def scope_key(scope) -> Optional[tuple]:
+    """Hashable form of a DocumentScope (None for an unscoped request)."""
+    if scope is None:
+        return None
+    return tuple(sorted(scope.documents)), tuple(sorted(scope.collections))
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its result."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        endpoint = metrics.current_endpoint()
+        task = self._calls.get(key)
+        if task is not None:
+            COALESCED.inc(endpoint=endpoint, role="follower")
+            with span("coalesced_wait"):
+                # shield: a caller that goes away doesn't cancel the others' result
+                return await asyncio.shield(task)
+
+        COALESCED.inc(endpoint=endpoint, role="leader")
+        IN_FLIGHT.inc(endpoint=endpoint)
+        task = asyncio.ensure_future(compute())
+        self._calls[key] = task
+
+        def done(finished: asyncio.Task):
+            IN_FLIGHT.dec(endpoint=endpoint)
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            if not finished.cancelled():
+                finished.exception()  # retrieved here even if every caller has gone
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
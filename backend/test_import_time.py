@@ -0,0 +1,87 @@
+# Import-time budget check for the backend.
+#
+# Importing backend.app must stay cheap (uvicorn workers, tooling and tests
+# import it) - heavy libraries load at startup warm-up or on first use.
+# Run with `python backend/test_import_time.py` or under pytest.
+# IMPORT_TIME_BUDGET (seconds) overrides the default budget.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", 1.5))
+RUNS = 3
+
+# Must not be imported by `import backend.app`
+HEAVY_MODULES = [
+    "faiss", "numpy", "torch", "sentence_transformers", "PyPDF2",
+    "langchain_community", "langchain_ollama", "langchain_huggingface",
+]
+
+_MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.app
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _run(code: str, env_overrides: dict = None) -> subprocess.CompletedProcess:
+    env = dict(os.environ, **(env_overrides or {}))
+    return subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def measure_import() -> dict:
+    """Best of RUNS cold imports of backend.app, each in a fresh interpreter."""
+    results = []
+    for _ in range(RUNS):
+        proc = _run(_MEASURE)
+        assert proc.returncode == 0, f"import backend.app failed:\n{proc.stderr}"
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return min(results, key=lambda r: r["seconds"])
+
+
+def test_import_time_within_budget():
+    result = measure_import()
+    assert result["seconds"] <= IMPORT_TIME_BUDGET, (
+        f"import backend.app took {result['seconds']:.2f}s (budget {IMPORT_TIME_BUDGET}s)"
+    )
+
+
+def test_no_heavy_modules_on_import():
+    result = measure_import()
+    assert not result["heavy"], f"import backend.app loaded heavy modules: {result['heavy']}"
+
+
+def test_config_import_has_no_side_effects():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        proc = _run("import backend.config", {"DATA_DIR": str(data_dir),
+                                              "SESSIONS_DIR": str(Path(tmp) / "sessions"),
+                                              "PROGRESS_DIR": str(Path(tmp) / "progress")})
+        assert proc.returncode == 0, proc.stderr
+        assert proc.stdout == "", f"config printed on import: {proc.stdout!r}"
+        assert not any(Path(tmp).iterdir()), "config created directories on import"
+
+
+if __name__ == "__main__":
+    print(f"Measuring `import backend.app` (best of {RUNS}, budget {IMPORT_TIME_BUDGET}s)...")
+    failed = False
+    for test in (test_import_time_within_budget, test_no_heavy_modules_on_import,
+                 test_config_import_has_no_side_effects):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed = True
+            print(f"❌ {test.__name__}: {e}")
+    result = measure_import() if not failed else None
+    if result:
+        print(f"\nimport backend.app: {result['seconds'] * 1000:.0f} ms")
+    sys.exit(1 if failed else 0)
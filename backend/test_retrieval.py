@@ -1,5 +1,11 @@
 # Simple test script to verify document retrieval works
-from query_demo import query_documents
+import sys
+from pathlib import Path
+
+# Works from the project root or from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.query_demo import query_documents
 
 print("Testing document retrieval (no LLM needed)...")
 print("=" * 50)
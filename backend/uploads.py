@@ -0,0 +1,148 @@
+# backend/uploads.py
+"""
+Streaming receipt of uploaded files.
+
+/upload-pdf used to `await file.read()` the whole PDF into memory, hash
+it, write it to disk and reopen it for PyPDF2 - a few concurrent 100 MB
+uploads could exhaust a worker. Uploads are now copied to a temporary
+file next to their destination in fixed-size blocks and hashed as they
+go, so memory per upload is one block however large the file is.
+
+Starlette's multipart parser has already spooled the request body to its
+own temporary file by the time the handler runs, so the size limit is
+enforced on the request itself: UploadLimitMiddleware answers 413 before
+reading anything when Content-Length is over MAX_UPLOAD_MB, and stops
+reading a chunked body as soon as it passes the limit. (The copy out of
+Starlette's spool file means an accepted upload is still written twice.) Once the upload is accepted the temporary file is
+renamed into place (os.replace - atomic on the same filesystem), so
+readers never see a half-written PDF; rejected or failed uploads leave
+nothing behind.
+
+    upload = await receive_upload(file, DATA_DIR, MAX_UPLOAD_BYTES)
+    try:
+        ...                                         # parse / index from upload.path
+        upload.commit(DATA_DIR / file.filename)     # only once indexing succeeded
+    finally:
+        upload.discard()
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from backend import metrics
+
+# Bytes read from the request and written to disk at a time
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+UPLOAD_BYTES = metrics.Histogram(
+    "upload_bytes", "Size of received uploads",
+    buckets=(1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 2.5e8, 5e8))
+UPLOADS_REJECTED = metrics.Counter("uploads_rejected_total", "Uploads refused before processing", ("reason",))
+
+# Room for the multipart boundaries and form fields around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit")
+        self.max_bytes = max_bytes
+
+
+class ReceivedUpload:
+    """An upload spooled to a temporary file, with its SHA-256 and size."""
+
+    def __init__(self, path: Path, content_hash: str, size: int):
+        self.path: Optional[Path] = path
+        self.content_hash = content_hash
+        self.size = size
+
+    def commit(self, destination: Path) -> Path:
+        """Atomically move the upload to its final name (replacing any previous version)."""
+        os.replace(self.path, destination)
+        self.path = None
+        return destination
+
+    def discard(self):
+        """Remove the temporary file if it was not committed."""
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+
+async def receive_upload(file, directory: Path, max_bytes: int,
+                         block_size: int = UPLOAD_BLOCK_SIZE) -> ReceivedUpload:
+    """Copy an UploadFile to a temporary file in `directory`, hashing it on the way.
+
+    Raises UploadTooLarge (and removes the partial file) once more than max_bytes arrive.
+    """
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > max_bytes:
+        UPLOADS_REJECTED.inc(reason="too_large")
+        raise UploadTooLarge(max_bytes)
+    # Same directory as the destination, so the final rename never crosses filesystems
+    fd, name = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=directory)
+    path = Path(name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(block_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    UPLOADS_REJECTED.inc(reason="too_large")
+                    raise UploadTooLarge(max_bytes)
+                digest.update(block)
+                await asyncio.to_thread(out.write, block)
+            await asyncio.to_thread(os.fsync, out.fileno())
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    UPLOAD_BYTES.observe(size)
+    return ReceivedUpload(path, digest.hexdigest(), size)
+
+
+class UploadLimitMiddleware:
+    """413 for request bodies to `paths` larger than max_bytes, before (or while) they are read."""
+
+    def __init__(self, app, paths, max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        from fastapi import HTTPException
+        from starlette.datastructures import Headers
+        from starlette.responses import JSONResponse
+
+        length = Headers(scope=scope).get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            UPLOADS_REJECTED.inc(reason="too_large")
+            response = JSONResponse({"detail": str(UploadTooLarge(self.max_bytes))}, status_code=413)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Raised inside body parsing, so the route answers it like any HTTPException
+                    UPLOADS_REJECTED.inc(reason="too_large")
+                    raise HTTPException(status_code=413, detail=str(UploadTooLarge(self.max_bytes)))
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -1,6 +1,10 @@
 // Premium ChatBox component with modern design, streaming support, and intuitive UX
 import { useState, useEffect, useRef, useCallback, useMemo } from 'react';
 import { Send, Bot, User, Loader2, History, Sparkles, MessageSquare } from 'lucide-react';
+import { useDebounce } from '../hooks/useDebounce';
+
+// Words typed before the backend starts retrieving context for the question
+const PREFETCH_MIN_WORDS = 3;
 
 const ChatBox = ({ sessionId, onLoadSessionInfo, onResetSession, onSessionChange, onOpenSessionHistory }) => {
   const [messages, setMessages] = useState([]);
@@ -11,6 +15,8 @@ const ChatBox = ({ sessionId, onLoadSessionInfo, onResetSession, onSessionChange
   const messagesEndRef = useRef(null);
   const abortControllerRef = useRef(null);
   const textareaRef = useRef(null);
+  const prefetchControllerRef = useRef(null);
+  const debouncedInput = useDebounce(inputValue, 400);
 
   // Load messages from session
   const loadSessionMessages = useCallback(async (sid) => {
@@ -69,9 +75,28 @@ const ChatBox = ({ sessionId, onLoadSessionInfo, onResetSession, onSessionChange
       if (abortControllerRef.current) {
         abortControllerRef.current.abort();
       }
+      prefetchControllerRef.current?.abort();
     };
   }, []);
 
+  // Once typing pauses, let the backend retrieve context for the question so sending it is faster.
+  // Best effort: rate-limited or failed prefetches are ignored. Only sessions prefetch
+  // (the backend keeps prefetched context per session).
+  useEffect(() => {
+    const partial = debouncedInput.trim();
+    if (isLoading || !sessionId || partial.split(/\s+/).length < PREFETCH_MIN_WORDS) return;
+
+    prefetchControllerRef.current?.abort();
+    const controller = new AbortController();
+    prefetchControllerRef.current = controller;
+    fetch('http://localhost:8000/query/prefetch', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ query: partial, session_id: sessionId }),
+      signal: controller.signal
+    }).catch(() => {});
+  }, [debouncedInput, isLoading, sessionId]);
+
   // Example suggestions for users
   const exampleQuestions = useMemo(() => [
     "Based on your uploads, how do machine learning algorithms work?",
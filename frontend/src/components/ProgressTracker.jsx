@@ -17,11 +17,12 @@ const ProgressTracker = ({ sessionId }) => {
     
     setIsLoading(true);
     try {
-      const response = await fetch(`http://localhost:8000/session/${sessionId}`);
+      // Rollups are computed by the backend; only recent activity is sent
+      const response = await fetch(`http://localhost:8000/progress/${sessionId}/summary`);
       if (response.ok) {
         const data = await response.json();
-        setProgress(data.progress || []);
-        calculateStats(data.progress || []);
+        setProgress(data.recent_activity || []);
+        calculateStats(data);
       }
     } catch (error) {
       console.error('Error loading progress:', error);
@@ -34,26 +35,20 @@ const ProgressTracker = ({ sessionId }) => {
     loadProgress();
   }, [loadProgress]);
 
-  const calculateStats = useCallback((progressData) => {
-    const queries = progressData.filter(p => p.activity === 'query').length;
-    const quizzes = progressData.filter(p => p.activity === 'quiz_completed');
-    const summaries = progressData.filter(p => p.activity === 'summary_generated').length;
-    
-    const avgScore = quizzes.length > 0
-      ? quizzes.reduce((sum, q) => sum + (q.score || 0), 0) / quizzes.length
-      : 0;
+  const calculateStats = useCallback((summary) => {
+    const counts = summary.activity_counts || {};
 
     setStats({
-      totalQueries: queries,
-      quizzesCompleted: quizzes.length,
-      summariesGenerated: summaries,
-      averageScore: avgScore.toFixed(1)
+      totalQueries: counts.query || 0,
+      quizzesCompleted: counts.quiz_completed || 0,
+      summariesGenerated: counts.summary_generated || 0,
+      averageScore: (summary.average_score || 0).toFixed(1)
     });
   }, []);
 
   // Memoize activity items for performance
   const activityItems = useMemo(() => {
-    return progress.slice().reverse().map((item, index) => {
+    return progress.map((item, index) => {
       const getActivityIcon = () => {
         switch (item.activity) {
           case 'query': return <MessageSquare className="w-5 h-5 text-blue-600" />;
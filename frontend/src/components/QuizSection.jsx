@@ -81,46 +81,16 @@ const QuizSection = ({ sessionId }) => {
 
       const data = await response.json();
       console.log('Quiz data received:', data);
-      console.log('Quiz data type:', typeof data.quiz);
-      console.log('Quiz data value (first 500 chars):', typeof data.quiz === 'string' ? data.quiz.substring(0, 500) : data.quiz);
       
-      // Parse the quiz response - extract JSON from text if needed
+      // The backend returns the questions as a JSON array (already parsed by response.json())
       try {
-        let quizData = data.quiz;
+        const quizData = data.quiz;
         
         // If quiz is missing or null
         if (!quizData) {
           throw new Error('Quiz data is missing from backend response');
         }
         
-        // If it's a string, try to extract JSON array from it
-        if (typeof quizData === 'string') {
-          // Remove markdown code blocks if present
-          quizData = quizData.replace(/```(?:json)?\s*\n?/g, '').replace(/```\s*$/gm, '').trim();
-          
-          // Try to find JSON array in the string (might have extra text)
-          const jsonMatch = quizData.match(/\[[\s\S]*\]/);
-          if (jsonMatch) {
-            try {
-              quizData = JSON.parse(jsonMatch[0]);
-              console.log('Parsed quiz from JSON match:', quizData);
-            } catch (e) {
-              console.error('Failed to parse JSON match, trying full string:', e);
-              // If that fails, try parsing the whole string
-              quizData = JSON.parse(quizData);
-            }
-          } else {
-            // Try parsing the whole string
-            try {
-              quizData = JSON.parse(quizData);
-              console.log('Parsed quiz from full string:', quizData);
-            } catch (e) {
-              console.error('Failed to parse quiz string:', e);
-              throw new Error(`Failed to parse quiz JSON: ${e.message}`);
-            }
-          }
-        }
-        
         // Ensure it's an array
         const parsedQuiz = Array.isArray(quizData) ? quizData : [quizData];
         console.log('Parsed quiz array length:', parsedQuiz.length);